@@ -162,8 +162,26 @@ def _validate_config_on_startup(logger):
     logger.info("✅ 配置检查完成")
 
 
+def _resume_pending_tasks(logger):
+    """恢复上次进程退出时未完成的图片生成任务"""
+    import os
+
+    # 调试模式下 reloader 会启动两个进程，只在实际提供服务的子进程中恢复
+    if Config.DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+
+    try:
+        from backend.services.task_queue import get_task_queue
+        resumed = get_task_queue().resume_pending()
+        if resumed:
+            logger.info(f"♻️  已恢复 {resumed} 个未完成的图片生成任务")
+    except Exception as e:
+        logger.error(f"❌ 恢复未完成任务失败: {e}")
+
+
 if __name__ == '__main__':
     app = create_app()
+    _resume_pending_tasks(logging.getLogger(__name__))
     app.run(
         host=Config.HOST,
         port=Config.PORT,
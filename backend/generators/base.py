@@ -1,8 +1,22 @@
 """图片生成器抽象基类"""
+import threading
 from abc import ABC, abstractmethod
 from typing import Dict, Any, Optional
 
 
+class ImageProviderError(Exception):
+    """
+    服务商接口返回非成功状态码
+
+    携带状态码和响应头，供并发控制器识别限流（429）和服务端错误（5xx）
+    """
+
+    def __init__(self, message: str, status_code: int = None, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = dict(headers) if headers else {}
+
+
 class ImageGeneratorBase(ABC):
     """图片生成器抽象基类"""
 
@@ -16,6 +30,8 @@ class ImageGeneratorBase(ABC):
         self.config = config
         self.api_key = config.get('api_key')
         self.base_url = config.get('base_url')
+        # 最近一次成功响应的响应头（按线程隔离，用于读取 x-ratelimit-* 限流信号）
+        self._response_state = threading.local()
 
     @abstractmethod
     def generate_image(
@@ -45,6 +61,19 @@ class ImageGeneratorBase(ABC):
         """
         pass
 
+    def _record_response_headers(self, headers) -> None:
+        """记录当前线程最近一次响应的响应头"""
+        self._response_state.headers = dict(headers) if headers else None
+
+    def pop_response_headers(self) -> Optional[Dict[str, str]]:
+        """取出并清空当前线程最近一次响应的响应头"""
+        state = getattr(self, '_response_state', None)
+        if state is None:
+            return None
+        headers = getattr(state, 'headers', None)
+        state.headers = None
+        return headers
+
     def get_supported_sizes(self) -> list:
         """
         获取支持的图片尺寸
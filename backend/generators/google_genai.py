@@ -5,7 +5,7 @@ from typing import Dict, Any, Optional
 from google import genai
 from google.genai import types
 from .base import ImageGeneratorBase
-from ..utils.image_compressor import compress_image
+from ..utils.reference_store import ReferenceInput, as_prepared_reference
 
 logger = logging.getLogger(__name__)
 
@@ -332,7 +332,7 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
         aspect_ratio: str = "3:4",
         temperature: float = 1.0,
         model: str = "gemini-3-pro-image-preview",
-        reference_image: Optional[bytes] = None,
+        reference_image: Optional[ReferenceInput] = None,
         **kwargs
     ) -> bytes:
         """
@@ -343,7 +343,7 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
             aspect_ratio: 宽高比 (如 "3:4", "1:1", "16:9")
             temperature: 温度
             model: 模型名称
-            reference_image: 参考图片二进制数据（用于保持风格一致）
+            reference_image: 参考图片二进制数据或 PreparedReference（用于保持风格一致）
             **kwargs: 其他参数
 
         Returns:
@@ -357,15 +357,14 @@ class GoogleGenAIGenerator(ImageGeneratorBase):
 
         # 如果有参考图，先添加参考图和说明
         if reference_image:
-            logger.debug(f"  添加参考图片 ({len(reference_image)} bytes)")
-            # 压缩参考图到 200KB 以内
-            compressed_ref = compress_image(reference_image, max_size_kb=200)
-            logger.debug(f"  参考图压缩后: {len(compressed_ref)} bytes")
+            # 压缩参考图到 200KB 以内（已预处理的参考图直接复用）
+            prepared_ref = as_prepared_reference(reference_image)
+            logger.debug(f"  添加参考图片 ({len(prepared_ref)} bytes)")
             # 添加参考图
             parts.append(types.Part(
                 inline_data=types.Blob(
-                    mime_type="image/png",
-                    data=compressed_ref
+                    mime_type=prepared_ref.mime_type,
+                    data=prepared_ref.data
                 )
             ))
             # 添加带参考说明的提示词
@@ -3,8 +3,9 @@ import logging
 import base64
 import requests
 from typing import Dict, Any, Optional, List, Union
-from .base import ImageGeneratorBase
-from ..utils.image_compressor import compress_image
+from .base import ImageGeneratorBase, ImageProviderError
+from ..utils.http_pool import get_http_session, http_timeout
+from ..utils.reference_store import PreparedReference, ReferenceInput, as_prepared_reference
 
 logger = logging.getLogger(__name__)
 
@@ -58,8 +59,8 @@ class ImageApiGenerator(ImageGeneratorBase):
         aspect_ratio: str = None,
         temperature: float = 1.0,
         model: str = None,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None,
+        reference_image: Optional[ReferenceInput] = None,
+        reference_images: Optional[List[ReferenceInput]] = None,
         **kwargs
     ) -> bytes:
         """
@@ -72,6 +73,7 @@ class ImageApiGenerator(ImageGeneratorBase):
             model: 模型名称
             reference_image: 单张参考图片数据（向后兼容）
             reference_images: 多张参考图片数据列表
+                （bytes 或 PreparedReference，后者直接复用已压缩和编码的结果）
 
         Returns:
             生成的图片二进制数据
@@ -92,13 +94,26 @@ class ImageApiGenerator(ImageGeneratorBase):
         else:
             return self._generate_via_images_api(prompt, aspect_ratio, model, reference_image, reference_images)
 
+    def _collect_references(
+        self,
+        reference_image: Optional[ReferenceInput],
+        reference_images: Optional[List[ReferenceInput]]
+    ) -> List[PreparedReference]:
+        """合并参考图并统一为 PreparedReference（按内容去重）"""
+        all_reference_images = []
+        for img in (reference_images or []) + ([reference_image] if reference_image else []):
+            ref = as_prepared_reference(img)
+            if ref is not None and ref not in all_reference_images:
+                all_reference_images.append(ref)
+        return all_reference_images
+
     def _generate_via_images_api(
         self,
         prompt: str,
         aspect_ratio: str,
         model: str,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None
+        reference_image: Optional[ReferenceInput] = None,
+        reference_images: Optional[List[ReferenceInput]] = None
     ) -> bytes:
         """通过 /v1/images/generations 端点生成图片"""
         headers = {
@@ -115,22 +130,15 @@ class ImageApiGenerator(ImageGeneratorBase):
         }
 
         # 收集所有参考图片
-        all_reference_images = []
-        if reference_images and len(reference_images) > 0:
-            all_reference_images.extend(reference_images)
-        if reference_image and reference_image not in all_reference_images:
-            all_reference_images.append(reference_image)
+        all_reference_images = self._collect_references(reference_image, reference_images)
 
         # 如果有参考图片，添加到 image 数组
         if all_reference_images:
             logger.debug(f"  添加 {len(all_reference_images)} 张参考图片")
             image_uris = []
-            for idx, img_data in enumerate(all_reference_images):
-                compressed_img = compress_image(img_data, max_size_kb=200)
-                logger.debug(f"  参考图 {idx}: {len(img_data)} -> {len(compressed_img)} bytes")
-                base64_image = base64.b64encode(compressed_img).decode('utf-8')
-                data_uri = f"data:image/png;base64,{base64_image}"
-                image_uris.append(data_uri)
+            for idx, ref in enumerate(all_reference_images):
+                logger.debug(f"  参考图 {idx}: {len(ref)} bytes")
+                image_uris.append(ref.data_uri)
 
             payload["image"] = image_uris
 
@@ -148,12 +156,12 @@ class ImageApiGenerator(ImageGeneratorBase):
 
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.debug(f"  发送请求到: {api_url}")
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = get_http_session(api_url).post(api_url, headers=headers, json=payload, timeout=http_timeout(300, self.config))
 
         if response.status_code != 200:
             error_detail = response.text[:500]
             logger.error(f"Image API 请求失败: status={response.status_code}, error={error_detail}")
-            raise Exception(
+            raise ImageProviderError(
                 f"Image API 请求失败 (状态码: {response.status_code})\n"
                 f"错误详情: {error_detail}\n"
                 f"请求地址: {api_url}\n"
@@ -162,9 +170,13 @@ class ImageApiGenerator(ImageGeneratorBase):
                 "2. 请求参数不符合API要求\n"
                 "3. API服务端错误\n"
                 "4. Base URL配置错误\n"
-                "建议：检查API密钥和base_url配置"
+                "建议：检查API密钥和base_url配置",
+                status_code=response.status_code,
+                headers=response.headers
             )
 
+        self._record_response_headers(response.headers)
+
         result = response.json()
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
@@ -197,8 +209,8 @@ class ImageApiGenerator(ImageGeneratorBase):
         prompt: str,
         aspect_ratio: str,
         model: str,
-        reference_image: Optional[bytes] = None,
-        reference_images: Optional[List[bytes]] = None
+        reference_image: Optional[ReferenceInput] = None,
+        reference_images: Optional[List[ReferenceInput]] = None
     ) -> bytes:
         """通过 /v1/chat/completions 端点生成图片（如即梦 API）"""
         import re
@@ -212,24 +224,18 @@ class ImageApiGenerator(ImageGeneratorBase):
         user_content: Any = prompt
 
         # 收集所有参考图片
-        all_reference_images = []
-        if reference_images and len(reference_images) > 0:
-            all_reference_images.extend(reference_images)
-        if reference_image and reference_image not in all_reference_images:
-            all_reference_images.append(reference_image)
+        all_reference_images = self._collect_references(reference_image, reference_images)
 
         # 如果有参考图片，构建多模态消息
         if all_reference_images:
             logger.debug(f"  添加 {len(all_reference_images)} 张参考图片到 chat 消息")
             content_parts = [{"type": "text", "text": prompt}]
 
-            for idx, img_data in enumerate(all_reference_images):
-                compressed_img = compress_image(img_data, max_size_kb=200)
-                logger.debug(f"  参考图 {idx}: {len(img_data)} -> {len(compressed_img)} bytes")
-                base64_image = base64.b64encode(compressed_img).decode('utf-8')
+            for idx, ref in enumerate(all_reference_images):
+                logger.debug(f"  参考图 {idx}: {len(ref)} bytes")
                 content_parts.append({
                     "type": "image_url",
-                    "image_url": {"url": f"data:image/png;base64,{base64_image}"}
+                    "image_url": {"url": ref.data_uri}
                 })
 
             user_content = content_parts
@@ -244,36 +250,44 @@ class ImageApiGenerator(ImageGeneratorBase):
         api_url = f"{self.base_url}{self.endpoint_type}"
         logger.info(f"Chat API 生成图片: {api_url}, model={model}")
 
-        response = requests.post(api_url, headers=headers, json=payload, timeout=300)
+        response = get_http_session(api_url).post(api_url, headers=headers, json=payload, timeout=http_timeout(300, self.config))
 
         if response.status_code != 200:
             error_detail = response.text[:500]
             status_code = response.status_code
 
             if status_code == 401:
-                raise Exception(
+                raise ImageProviderError(
                     "❌ API Key 认证失败\n\n"
                     "【可能原因】\n"
                     "1. API Key 无效或已过期\n"
                     "2. API Key 格式错误\n\n"
                     "【解决方案】\n"
-                    "在系统设置页面检查 API Key 是否正确"
+                    "在系统设置页面检查 API Key 是否正确",
+                    status_code=status_code,
+                    headers=response.headers
                 )
             elif status_code == 429:
-                raise Exception(
+                raise ImageProviderError(
                     "⏳ API 配额或速率限制\n\n"
                     "【解决方案】\n"
                     "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
+                    "2. 检查 API 配额使用情况",
+                    status_code=status_code,
+                    headers=response.headers
                 )
             else:
-                raise Exception(
+                raise ImageProviderError(
                     f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
                     f"【错误详情】\n{error_detail[:300]}\n\n"
                     f"【请求地址】{api_url}\n"
-                    f"【模型】{model}"
+                    f"【模型】{model}",
+                    status_code=status_code,
+                    headers=response.headers
                 )
 
+        self._record_response_headers(response.headers)
+
         result = response.json()
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
@@ -326,7 +340,7 @@ class ImageApiGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = get_http_session(url).get(url, timeout=http_timeout(60, self.config))
             if response.status_code == 200:
                 logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
                 return response.content
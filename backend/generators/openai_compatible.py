@@ -3,7 +3,8 @@ import logging
 import base64
 from typing import Dict, Any
 import requests
-from .base import ImageGeneratorBase
+from .base import ImageGeneratorBase, ImageProviderError
+from ..utils.http_pool import get_http_session, http_timeout
 
 logger = logging.getLogger(__name__)
 
@@ -113,12 +114,12 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         if quality and model.startswith('dall-e'):
             payload["quality"] = quality
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = get_http_session(url).post(url, headers=headers, json=payload, timeout=http_timeout(300, self.config))
 
         if response.status_code != 200:
             error_detail = response.text[:500]
             logger.error(f"OpenAI Images API 请求失败: status={response.status_code}, error={error_detail}")
-            raise Exception(
+            raise ImageProviderError(
                 f"OpenAI Images API 请求失败 (状态码: {response.status_code})\n"
                 f"错误详情: {error_detail}\n"
                 f"请求地址: {url}\n"
@@ -129,9 +130,13 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
                 "3. 请求参数不符合要求\n"
                 "4. API配额已用尽\n"
                 "5. Base URL配置错误\n"
-                "建议：检查API密钥、base_url和模型名称配置"
+                "建议：检查API密钥、base_url和模型名称配置",
+                status_code=response.status_code,
+                headers=response.headers
             )
 
+        self._record_response_headers(response.headers)
+
         result = response.json()
         logger.debug(f"  API 响应: data 长度={len(result.get('data', []))}")
 
@@ -158,7 +163,8 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         # 处理URL格式
         elif "url" in image_data:
             logger.debug(f"  下载图片 URL...")
-            img_response = requests.get(image_data["url"], timeout=60)
+            image_url = image_data["url"]
+            img_response = get_http_session(image_url).get(image_url, timeout=http_timeout(60, self.config))
             if img_response.status_code == 200:
                 logger.info(f"✅ OpenAI Images API 图片生成成功: {len(img_response.content)} bytes")
                 return img_response.content
@@ -213,7 +219,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
             "temperature": 1.0
         }
 
-        response = requests.post(url, headers=headers, json=payload, timeout=300)
+        response = get_http_session(url).post(url, headers=headers, json=payload, timeout=http_timeout(300, self.config))
 
         if response.status_code != 200:
             error_detail = response.text[:500]
@@ -221,29 +227,37 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
 
             # 详细的错误信息
             if status_code == 401:
-                raise Exception(
+                raise ImageProviderError(
                     "❌ API Key 认证失败\n\n"
                     "【可能原因】\n"
                     "1. API Key 无效或已过期\n"
                     "2. API Key 格式错误\n\n"
                     "【解决方案】\n"
-                    "在系统设置页面检查 API Key 是否正确"
+                    "在系统设置页面检查 API Key 是否正确",
+                    status_code=status_code,
+                    headers=response.headers
                 )
             elif status_code == 429:
-                raise Exception(
+                raise ImageProviderError(
                     "⏳ API 配额或速率限制\n\n"
                     "【解决方案】\n"
                     "1. 稍后再试\n"
-                    "2. 检查 API 配额使用情况"
+                    "2. 检查 API 配额使用情况",
+                    status_code=status_code,
+                    headers=response.headers
                 )
             else:
-                raise Exception(
+                raise ImageProviderError(
                     f"❌ Chat API 请求失败 (状态码: {status_code})\n\n"
                     f"【错误详情】\n{error_detail[:300]}\n\n"
                     f"【请求地址】{url}\n"
-                    f"【模型】{model}"
+                    f"【模型】{model}",
+                    status_code=status_code,
+                    headers=response.headers
                 )
 
+        self._record_response_headers(response.headers)
+
         result = response.json()
         logger.debug(f"Chat API 响应: {str(result)[:500]}")
 
@@ -301,7 +315,7 @@ class OpenAICompatibleGenerator(ImageGeneratorBase):
         """下载图片并返回二进制数据"""
         logger.info(f"下载图片: {url[:100]}...")
         try:
-            response = requests.get(url, timeout=60)
+            response = get_http_session(url).get(url, timeout=http_timeout(60, self.config))
             if response.status_code == 200:
                 logger.info(f"✅ 图片下载成功: {len(response.content)} bytes")
                 return response.content
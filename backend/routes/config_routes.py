@@ -228,6 +228,13 @@ def _clear_config_cache():
     try:
         from backend.config import Config
         Config._image_providers_config = None
+        Config._text_providers_config = None
+    except Exception:
+        pass
+
+    try:
+        from backend.services.registry import invalidate_services
+        invalidate_services()
     except Exception:
         pass
 
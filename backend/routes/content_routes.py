@@ -3,13 +3,16 @@
 
 包含功能：
 - 生成标题、文案、标签
+- 流式生成标题、文案、标签（SSE）
+- 文本生成缓存状态
 """
 
 import time
 import logging
 from flask import Blueprint, request, jsonify
 from backend.services.content import get_content_service
-from .utils import log_request, log_error
+from backend.utils.text_cache import get_text_cache
+from .utils import log_request, log_error, sse_response, get_use_cache_flag
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +29,7 @@ def create_content_blueprint():
         请求格式（application/json）：
         - topic: 主题文本
         - outline: 大纲内容
+        - use_cache: 是否复用文本生成缓存（可选，默认 true）
 
         返回：
         - success: 是否成功
@@ -60,7 +64,7 @@ def create_content_blueprint():
             # 调用内容生成服务
             logger.info(f"🔄 开始生成内容，主题: {topic[:50]}...")
             content_service = get_content_service()
-            result = content_service.generate_content(topic, outline)
+            result = content_service.generate_content(topic, outline, use_cache=get_use_cache_flag())
 
             # 记录结果
             elapsed = time.time() - start_time
@@ -79,4 +83,76 @@ def create_content_blueprint():
                 "error": f"内容生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
             }), 500
 
+    @content_bp.route('/content/stream', methods=['POST'])
+    def generate_content_stream():
+        """
+        流式生成标题、文案、标签（SSE）
+
+        请求格式同 /content。
+
+        SSE 事件：
+        - token: 模型新输出的文本片段 {text}
+        - complete: 全部完成，数据同 /content 的返回值
+        - error: 生成失败 {message}
+        """
+        try:
+            data = request.get_json()
+            topic = data.get('topic', '')
+            outline = data.get('outline', '')
+
+            log_request('/content/stream', {'topic': topic[:50] if topic else '', 'outline_length': len(outline)})
+
+            if not topic:
+                logger.warning("内容生成请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供主题内容。"
+                }), 400
+
+            if not outline:
+                logger.warning("内容生成请求缺少 outline 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：outline 不能为空。\n请先生成大纲。"
+                }), 400
+
+            logger.info(f"🔄 开始流式生成内容，主题: {topic[:50]}...")
+            content_service = get_content_service()
+            return sse_response(content_service.generate_content_stream(
+                topic, outline, use_cache=get_use_cache_flag()
+            ))
+
+        except Exception as e:
+            log_error('/content/stream', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"内容生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
+            }), 500
+
+    @content_bp.route('/text-cache', methods=['GET'])
+    def get_text_cache_stats():
+        """
+        获取大纲、文案生成结果缓存的状态
+
+        返回：
+        - success: 是否成功
+        - enabled: 是否启用（TEXT_CACHE_ENABLED）
+        - stats: 命中/未命中次数、内存和磁盘占用（未启用时为 null）
+        """
+        try:
+            cache = get_text_cache()
+            return jsonify({
+                "success": True,
+                "enabled": cache is not None,
+                "stats": cache.stats() if cache is not None else None
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取文本缓存状态失败。\n错误详情: {error_msg}"
+            }), 500
+
     return content_bp
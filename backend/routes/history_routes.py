@@ -15,9 +15,13 @@ import zipfile
 import logging
 from flask import Blueprint, request, jsonify, send_file
 from backend.services.history import get_history_service
+from .utils import make_etag, parse_timestamp, with_cache_headers, not_modified_response, get_list_param
 
 logger = logging.getLogger(__name__)
 
+# 批量获取单次最多的记录数
+MAX_BATCH_SIZE = 100
+
 
 def create_history_blueprint():
     """创建历史记录路由蓝图（工厂函数，支持多次调用）"""
@@ -96,25 +100,51 @@ def create_history_blueprint():
         - page: 页码（默认 1）
         - page_size: 每页数量（默认 20）
         - status: 状态过滤（可选：all/completed/draft）
+        - cursor: 游标分页（可选）。带上该参数（第一页传空值）时按最近更新倒序，
+          返回 next_cursor / has_more，忽略 page
 
         返回：
         - success: 是否成功
         - records: 记录列表
-        - total: 总数
-        - total_pages: 总页数
+        - total: 总数（页码分页）
+        - total_pages: 总页数（页码分页）
+        - next_cursor: 下一页游标（游标分页，没有下一页时为 null）
+        - has_more: 是否还有下一页（游标分页）
+
+        响应带 ETag / Last-Modified，请求头 If-None-Match 与当前版本一致时返回 304。
         """
         try:
             page = int(request.args.get('page', 1))
             page_size = int(request.args.get('page_size', 20))
             status = request.args.get('status')
+            cursor = request.args.get('cursor')
 
             history_service = get_history_service()
-            result = history_service.list_records(page, page_size, status)
 
-            return jsonify({
+            # 列表没有变化时直接返回 304，不再分页和序列化
+            # （删除记录不会改变最近更新时间，因此只按 ETag 判断）
+            version = history_service.get_list_version()
+            etag = make_etag(version["version"], request.query_string.decode("utf-8", "replace"))
+            cached = not_modified_response(etag)
+            if cached is not None:
+                return cached
+
+            if cursor is not None:
+                result = history_service.list_records_after(cursor or None, page_size, status)
+            else:
+                result = history_service.list_records(page, page_size, status)
+
+            response = jsonify({
                 "success": True,
                 **result
-            }), 200
+            })
+            return with_cache_headers(response, etag, parse_timestamp(version["updated_at"])), 200
+
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": f"参数错误：{str(e)}"
+            }), 400
 
         except Exception as e:
             error_msg = str(e)
@@ -123,6 +153,56 @@ def create_history_blueprint():
                 "error": f"获取历史记录列表失败。\n错误详情: {error_msg}"
             }), 500
 
+    @history_bp.route('/history/batch', methods=['GET', 'POST'])
+    def get_history_batch():
+        """
+        批量获取历史记录
+
+        一次请求返回多条记录，存储层并行读取，替代逐条请求详情。
+
+        参数（查询参数逗号分隔，或 POST JSON 请求体）：
+        - ids: 记录 ID 列表（必填，最多 100 个）
+        - fields: 只返回指定字段（可选，同详情接口）
+
+        返回：
+        - success: 是否成功
+        - records: 记录列表（按 ids 顺序）
+        - missing: 不存在的记录 ID
+        """
+        try:
+            record_ids = list(dict.fromkeys(get_list_param('ids')))
+            fields = get_list_param('fields')
+
+            if not record_ids:
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：ids 不能为空。\n请提供要获取的记录 ID（逗号分隔或 JSON 列表）。"
+                }), 400
+
+            if len(record_ids) > MAX_BATCH_SIZE:
+                return jsonify({
+                    "success": False,
+                    "error": f"参数错误：一次最多获取 {MAX_BATCH_SIZE} 条记录，当前 {len(record_ids)} 条。\n"
+                             "解决方案：分多次请求"
+                }), 400
+
+            history_service = get_history_service()
+            records = history_service.get_records(record_ids, fields or None)
+
+            found = {record.get("id") for record in records}
+            return jsonify({
+                "success": True,
+                "records": records,
+                "missing": [record_id for record_id in record_ids if record_id not in found]
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"批量获取历史记录失败。\n错误详情: {error_msg}"
+            }), 500
+
     @history_bp.route('/history/<record_id>', methods=['GET'])
     def get_history(record_id):
         """
@@ -131,13 +211,32 @@ def create_history_blueprint():
         路径参数：
         - record_id: 记录 ID
 
+        查询参数：
+        - fields: 只返回指定字段（可选，逗号分隔，支持 images.generated 这样的嵌套字段；
+          只取 title/status/thumbnail 等列表字段时不读取记录文件）
+
         返回：
         - success: 是否成功
-        - record: 完整的记录数据
+        - record: 记录数据（未指定 fields 时为完整记录）
+
+        响应带 ETag / Last-Modified（来自记录的 updated_at），
+        请求头 If-None-Match 与当前版本一致时返回 304，不读取记录文件。
         """
         try:
             history_service = get_history_service()
-            record = history_service.get_record(record_id)
+            fields = get_list_param('fields')
+
+            version = history_service.get_record_version(record_id)
+            if version is not None:
+                cached = not_modified_response(make_etag(record_id, version, fields), parse_timestamp(version))
+                if cached is not None:
+                    return cached
+
+            if fields:
+                records = history_service.get_records([record_id], fields)
+                record = records[0] if records else None
+            else:
+                record = history_service.get_record(record_id)
 
             if not record:
                 return jsonify({
@@ -145,10 +244,16 @@ def create_history_blueprint():
                     "error": f"历史记录不存在：{record_id}\n可能原因：记录已被删除或ID错误"
                 }), 404
 
-            return jsonify({
+            # 读取期间记录可能又被更新，ETag 取读取前的版本：客户端下次验证时会拿到新内容
+            if version is None:
+                version = record.get("updated_at") or ""
+            etag, last_modified = make_etag(record_id, version, fields), parse_timestamp(version)
+
+            response = jsonify({
                 "success": True,
                 "record": record
-            }), 200
+            })
+            return with_cache_headers(response, etag, last_modified), 200
 
         except Exception as e:
             error_msg = str(e)
@@ -301,17 +406,27 @@ def create_history_blueprint():
     @history_bp.route('/history/search', methods=['GET'])
     def search_history():
         """
-        搜索历史记录
+        全文搜索历史记录
+
+        搜索标题、原始输入、大纲、文案和标签，按相关度排序。
 
         查询参数：
-        - keyword: 搜索关键词（必填）
+        - keyword: 搜索关键词（必填，多个词需全部命中）
+        - page: 页码（默认 1）
+        - page_size: 每页数量（默认 20）
 
         返回：
         - success: 是否成功
-        - records: 匹配的记录列表
+        - records: 当前页的记录列表（带 score 相关度）
+        - total: 匹配总数
+        - page: 当前页码
+        - page_size: 每页数量
+        - total_pages: 总页数
         """
         try:
             keyword = request.args.get('keyword', '')
+            page = int(request.args.get('page', 1))
+            page_size = int(request.args.get('page_size', 20))
 
             if not keyword:
                 return jsonify({
@@ -320,11 +435,11 @@ def create_history_blueprint():
                 }), 400
 
             history_service = get_history_service()
-            results = history_service.search_records(keyword)
+            result = history_service.search(keyword, page, page_size)
 
             return jsonify({
                 "success": True,
-                "records": results
+                **result
             }), 200
 
         except Exception as e:
@@ -395,16 +510,24 @@ def create_history_blueprint():
         """
         扫描所有任务并同步图片列表
 
+        只扫描上次扫描后有变化的任务目录。
+
+        查询参数：
+        - full: 为 true 时忽略扫描清单，重新扫描全部任务（可选）
+
         返回：
         - success: 是否成功
         - total_tasks: 扫描的任务总数
         - synced: 成功同步的任务数
+        - unchanged: 未变化而跳过的任务数
         - failed: 失败的任务数
         - orphan_tasks: 孤立任务列表（有图片但无记录）
         """
         try:
+            full = request.args.get('full', 'false').lower() == 'true'
+
             history_service = get_history_service()
-            result = history_service.scan_all_tasks()
+            result = history_service.scan_all_tasks(full=full)
 
             if not result.get("success"):
                 return jsonify(result), 500
@@ -7,15 +7,17 @@
 - 重试/重新生成单张图片
 - 批量重试失败图片
 - 获取任务状态
+- 查看服务商自适应并发状态
 """
 
 import os
-import json
 import base64
 import logging
-from flask import Blueprint, request, jsonify, Response, send_file
+from flask import Blueprint, request, jsonify, send_file
 from backend.services.image import get_image_service
-from .utils import log_request, log_error
+from backend.services.task_queue import get_task_queue
+from backend.utils.concurrency import get_concurrency_snapshots
+from .utils import log_request, log_error, sse_response, get_last_event_id
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +39,18 @@ def create_image_blueprint():
         - full_outline: 完整大纲文本
         - user_topic: 用户原始输入主题
         - user_images: base64 编码的用户参考图片列表
+        - detach: 为 true 时只提交任务并立即返回 task_id（可选）
+
+        任务由后台队列执行，客户端断开后生成不会中断，
+        可通过 GET /api/tasks/<task_id>/events 重新接入事件流，
+        并用 Last-Event-ID 只补发错过的事件。
 
         返回：
         SSE 事件流，包含以下事件类型：
         - image: 单张图片生成完成
         - error: 生成错误
         - complete: 全部完成
+        - thumbnail_ready: 缩略图生成完成（在对应页面的 complete 之后异步到达）
         """
         try:
             data = request.get_json()
@@ -68,31 +76,29 @@ def create_image_blueprint():
                     "error": "参数错误：pages 不能为空。\n请提供要生成的页面列表数据。"
                 }), 400
 
-            logger.info(f"🖼️  开始图片生成任务: {task_id}, 共 {len(pages)} 页")
-            image_service = get_image_service()
+            # 提前初始化服务，配置错误时直接返回错误信息
+            get_image_service()
 
-            def generate():
-                """SSE 事件生成器"""
-                for event in image_service.generate_images(
-                    pages, task_id, full_outline,
-                    user_images=user_images if user_images else None,
-                    user_topic=user_topic
-                ):
-                    event_type = event["event"]
-                    event_data = event["data"]
-
-                    # 格式化为 SSE 格式
-                    yield f"event: {event_type}\n"
-                    yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-
-            return Response(
-                generate(),
-                mimetype='text/event-stream',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'X-Accel-Buffering': 'no',
-                }
+            # 提交到后台任务队列，客户端断开不会中断生成
+            task_queue = get_task_queue()
+            task_id, created = task_queue.submit(
+                pages, task_id, full_outline,
+                user_images=user_images if user_images else None,
+                user_topic=user_topic
             )
+            if created:
+                logger.info(f"🖼️  图片生成任务已提交: {task_id}, 共 {len(pages)} 页")
+
+            # 只提交任务，不订阅事件流（之后通过 /tasks/<task_id>/events 接入）
+            if data.get('detach'):
+                job = task_queue.get_job(task_id)
+                return jsonify({
+                    "success": True,
+                    "task_id": task_id,
+                    "status": job.get("status") if job else None
+                }), 202
+
+            return sse_response(task_queue.stream(task_id, last_event_id=get_last_event_id()))
 
         except Exception as e:
             log_error('/generate', e)
@@ -223,7 +229,7 @@ def create_image_blueprint():
         - pages: 要重试的页面列表（必填）
 
         返回：
-        SSE 事件流
+        SSE 事件流（事件带 id，可通过 GET /api/tasks/<task_id>/events 续传）
         """
         try:
             data = request.get_json()
@@ -243,25 +249,12 @@ def create_image_blueprint():
                 }), 400
 
             logger.info(f"🔄 批量重试失败图片: task={task_id}, 共 {len(pages)} 页")
-            image_service = get_image_service()
+            get_image_service()
 
-            def generate():
-                """SSE 事件生成器"""
-                for event in image_service.retry_failed_images(task_id, pages):
-                    event_type = event["event"]
-                    event_data = event["data"]
-
-                    yield f"event: {event_type}\n"
-                    yield f"data: {json.dumps(event_data, ensure_ascii=False)}\n\n"
-
-            return Response(
-                generate(),
-                mimetype='text/event-stream',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'X-Accel-Buffering': 'no',
-                }
-            )
+            # 与批量生成共用任务事件通道，断线后可通过 Last-Event-ID 续传
+            task_queue = get_task_queue()
+            task_queue.submit_retry(task_id, pages)
+            return sse_response(task_queue.stream(task_id, last_event_id=get_last_event_id()))
 
         except Exception as e:
             log_error('/retry-failed', e)
@@ -282,6 +275,7 @@ def create_image_blueprint():
         - use_reference: 是否使用参考图（默认 true）
         - full_outline: 完整大纲文本（用于上下文）
         - user_topic: 用户原始输入主题
+        - use_cache: 是否复用生成结果缓存（默认 false，总是调用服务商生成新图片）
 
         返回：
         - success: 是否成功
@@ -294,6 +288,7 @@ def create_image_blueprint():
             use_reference = data.get('use_reference', True)
             full_outline = data.get('full_outline', '')
             user_topic = data.get('user_topic', '')
+            use_cache = data.get('use_cache', False)
 
             log_request('/regenerate', {
                 'task_id': task_id,
@@ -312,7 +307,8 @@ def create_image_blueprint():
             result = image_service.regenerate_image(
                 task_id, page, use_reference,
                 full_outline=full_outline,
-                user_topic=user_topic
+                user_topic=user_topic,
+                use_cache=use_cache
             )
 
             if result["success"]:
@@ -376,6 +372,35 @@ def create_image_blueprint():
                 "error": f"获取任务状态失败。\n错误详情: {error_msg}"
             }), 500
 
+    # ==================== 并发状态 ====================
+
+    @image_bp.route('/concurrency', methods=['GET'])
+    def get_concurrency():
+        """
+        获取各图片服务商当前的自适应并发状态
+
+        返回：
+        - success: 是否成功
+        - providers: 服务商并发状态列表
+          - provider: 服务商名称
+          - limit: 当前并发上限
+          - in_flight: 正在进行的调用数
+          - cooldown_seconds: 剩余冷却时间（Retry-After）
+          - throttles / server_errors: 限流和服务端错误次数
+        """
+        try:
+            return jsonify({
+                "success": True,
+                "providers": get_concurrency_snapshots()
+            }), 200
+
+        except Exception as e:
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"获取并发状态失败。\n错误详情: {error_msg}"
+            }), 500
+
     # ==================== 健康检查 ====================
 
     @image_bp.route('/health', methods=['GET'])
@@ -3,6 +3,7 @@
 
 包含功能：
 - 生成大纲（支持图片上传）
+- 流式生成大纲（SSE）
 """
 
 import time
@@ -10,7 +11,7 @@ import base64
 import logging
 from flask import Blueprint, request, jsonify
 from backend.services.outline import get_outline_service
-from .utils import log_request, log_error
+from .utils import log_request, log_error, sse_response, get_use_cache_flag
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,9 @@ def create_outline_blueprint():
            - topic: 主题文本
            - images: base64 编码的图片数组（可选）
 
+        两种格式都支持 use_cache（默认 true），为 false 或请求头
+        Cache-Control: no-cache 时跳过文本生成缓存，重新生成大纲。
+
         返回：
         - success: 是否成功
         - outline: 原始大纲文本
@@ -57,7 +61,9 @@ def create_outline_blueprint():
             # 调用大纲生成服务
             logger.info(f"🔄 开始生成大纲，主题: {topic[:50]}...")
             outline_service = get_outline_service()
-            result = outline_service.generate_outline(topic, images if images else None)
+            result = outline_service.generate_outline(
+                topic, images if images else None, use_cache=get_use_cache_flag()
+            )
 
             # 记录结果
             elapsed = time.time() - start_time
@@ -86,6 +92,67 @@ def create_outline_blueprint():
                 "error": f"大纲生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
             }), 500
 
+    @outline_bp.route('/outline/stream', methods=['POST'])
+    def generate_outline_stream():
+        """
+        流式生成大纲（SSE）
+
+        请求格式同 /outline。
+
+        SSE 事件：
+        - token: 模型新输出的文本片段 {text}
+        - topic: 自动生成的主题 {topic}
+        - page: 一个页面解析完成 {index, type, content}
+        - complete: 全部完成，数据同 /outline 的返回值
+        - error: 生成失败 {message}
+        """
+        try:
+            topic, images = _parse_outline_request()
+
+            log_request('/outline/stream', {'topic': topic, 'images': images})
+
+            if not topic:
+                logger.warning("大纲生成请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            logger.info(f"🔄 开始流式生成大纲，主题: {topic[:50]}...")
+            outline_service = get_outline_service()
+
+            use_cache = get_use_cache_flag()
+
+            def events():
+                start_time = time.time()
+                for event in outline_service.generate_outline_stream(
+                    topic, images if images else None, use_cache=use_cache
+                ):
+                    if event["event"] == "complete":
+                        result = event["data"]
+                        logger.info(f"✅ 大纲生成成功，耗时 {time.time() - start_time:.2f}s，共 {len(result['pages'])} 页")
+                        event = {
+                            "event": "complete",
+                            "data": {
+                                **result,
+                                "topic": result.get("derived_topic") or topic,
+                                "original_topic": topic
+                            }
+                        }
+                    elif event["event"] == "error":
+                        logger.error(f"❌ 大纲生成失败: {event['data'].get('message', '未知错误')}")
+                    yield event
+
+            return sse_response(events())
+
+        except Exception as e:
+            log_error('/outline/stream', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"大纲生成异常。\n错误详情: {error_msg}\n建议：检查后端日志获取更多信息"
+            }), 500
+
     return outline_bp
 
 
@@ -0,0 +1,157 @@
+"""
+流水线相关 API 路由
+
+包含功能：
+- 大纲流式生成的同时生成图片（SSE）
+- 一键生成图文：大纲 → 文案 ∥ 图片，并保存历史记录（SSE）
+"""
+
+import logging
+from flask import Blueprint, request, jsonify
+from backend.services.outline import get_outline_service
+from backend.services.image import get_image_service
+from backend.services.post import get_post_service
+from .outline_routes import _parse_outline_request
+from backend.services.task_queue import get_task_queue
+from .utils import log_request, log_error, sse_response, get_use_cache_flag, get_last_event_id
+
+logger = logging.getLogger(__name__)
+
+
+def create_pipeline_blueprint():
+    """创建流水线路由蓝图（工厂函数，支持多次调用）"""
+    pipeline_bp = Blueprint('pipeline', __name__)
+
+    @pipeline_bp.route('/pipeline', methods=['POST'])
+    def run_pipeline():
+        """
+        大纲 → 图片流水线（SSE）
+
+        大纲以流式生成，封面页解析完成即开始生成封面，
+        内容页解析出来后在封面参考图就绪时排队生成。
+
+        任务由后台队列执行，客户端断开后生成不会中断，
+        可通过 GET /api/tasks/<task_id>/events 重新接入事件流，
+        并用 Last-Event-ID 只补发错过的事件。
+
+        请求格式同 /outline（topic + 可选的参考图片、use_cache），另支持：
+        - task_id: 任务 ID（可选）
+        - detach: 为 true 时只提交任务并立即返回 task_id（可选）
+
+        SSE 事件：
+        - outline_token / outline_topic / outline_page / outline_complete / outline_error: 大纲进度
+        - progress / complete / error / thumbnail_ready / finish: 图片进度（同 /generate），
+          大纲解析完成后的 progress 事件带 total（总页数）
+        """
+        try:
+            topic, images = _parse_outline_request()
+
+            log_request('/pipeline', {'topic': topic, 'images': images})
+
+            if not topic:
+                logger.warning("流水线请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            # 提前初始化服务，配置错误时直接返回错误信息
+            get_outline_service()
+            get_image_service()
+
+            # 提交到后台任务队列，客户端断开不会中断生成
+            task_queue = get_task_queue()
+            task_id, created = task_queue.submit_pipeline(
+                topic,
+                task_id=_get_task_id(),
+                user_images=images if images else None,
+                use_cache=get_use_cache_flag()
+            )
+            if created:
+                logger.info(f"🔄 流水线任务已提交: {task_id}, 主题: {topic[:50]}...")
+
+            # 只提交任务，不订阅事件流（之后通过 /tasks/<task_id>/events 接入）
+            if _get_detach_flag():
+                job = task_queue.get_job(task_id)
+                return jsonify({
+                    "success": True,
+                    "task_id": task_id,
+                    "status": job.get("status") if job else None
+                }), 202
+
+            return sse_response(task_queue.stream(task_id, last_event_id=get_last_event_id()))
+
+        except Exception as e:
+            log_error('/pipeline', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"流水线生成异常。\n错误详情: {error_msg}\n建议：检查文本和图片生成服务配置"
+            }), 500
+
+    @pipeline_bp.route('/post', methods=['POST'])
+    def create_post():
+        """
+        一键生成图文（SSE）
+
+        服务端依次完成：流式大纲 → 标题文案与图片并行生成 → 保存历史记录。
+        客户端断开后后台仍会完成生成并保存。
+
+        请求格式同 /outline（topic + 可选的参考图片、use_cache），另支持：
+        - task_id: 图片任务 ID（可选）
+
+        SSE 事件：
+        - outline_*: 大纲进度（同 /pipeline）
+        - history_created: 历史记录已创建 {record_id}
+        - content_complete / content_error: 标题、文案、标签生成结果
+        - progress / complete / error / thumbnail_ready / finish: 图片进度（同 /generate）
+        - post_complete: 全部完成 {success, record_id, task_id, status, content, images}
+        - post_error: 流程异常
+        """
+        try:
+            topic, images = _parse_outline_request()
+
+            log_request('/post', {'topic': topic, 'images': images})
+
+            if not topic:
+                logger.warning("一键生成请求缺少 topic 参数")
+                return jsonify({
+                    "success": False,
+                    "error": "参数错误：topic 不能为空。\n请提供要生成图文的主题内容。"
+                }), 400
+
+            logger.info(f"🔄 开始一键生成图文，主题: {topic[:50]}...")
+            # 服务在 create_post 调用时立即获取，配置错误在这里以 JSON 形式返回
+            events = get_post_service().create_post(
+                topic,
+                images=images if images else None,
+                task_id=_get_task_id(),
+                use_cache=get_use_cache_flag()
+            )
+            return sse_response(events)
+
+        except Exception as e:
+            log_error('/post', e)
+            error_msg = str(e)
+            return jsonify({
+                "success": False,
+                "error": f"一键生成异常。\n错误详情: {error_msg}\n建议：检查文本和图片生成服务配置"
+            }), 500
+
+    return pipeline_bp
+
+
+def _get_task_id():
+    """读取可选的 task_id（表单或 JSON）"""
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        return request.form.get('task_id') or None
+    data = request.get_json(silent=True) or {}
+    return data.get('task_id') or None
+
+
+def _get_detach_flag() -> bool:
+    """读取可选的 detach 参数（表单或 JSON）"""
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        return request.form.get('detach', '').lower() in ('1', 'true', 'yes')
+    data = request.get_json(silent=True) or {}
+    return bool(data.get('detach'))
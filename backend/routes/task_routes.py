@@ -0,0 +1,106 @@
+"""
+后台任务相关 API 路由
+
+包含功能：
+- 查询后台图片生成任务状态
+- 接入/重新接入任务事件流（SSE）
+"""
+
+import logging
+from flask import Blueprint, jsonify
+from backend.services.task_queue import get_task_queue
+from .utils import log_error, sse_response, get_last_event_id
+
+logger = logging.getLogger(__name__)
+
+
+def create_task_blueprint():
+    """创建任务路由蓝图（工厂函数，支持多次调用）"""
+    task_bp = Blueprint('task', __name__)
+
+    @task_bp.route('/tasks/<task_id>', methods=['GET'])
+    def get_task(task_id):
+        """
+        获取后台任务状态
+
+        路径参数：
+        - task_id: 任务 ID
+
+        返回：
+        - success: 是否成功
+        - task: 任务信息
+          - status: queued/running/completed/error
+          - total: 总页数
+          - generated: 已生成的页面 {index: filename}
+          - failed: 失败的页面 {index: error}
+        """
+        try:
+            job = get_task_queue().get_job(task_id)
+
+            if job is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"任务不存在：{task_id}\n可能原因：任务ID错误或任务目录已被删除"
+                }), 404
+
+            return jsonify({
+                "success": True,
+                "task": {
+                    "task_id": job["task_id"],
+                    "status": job.get("status"),
+                    "created_at": job.get("created_at"),
+                    "updated_at": job.get("updated_at"),
+                    "total": len(job.get("pages", [])),
+                    "generated": job.get("generated", {}),
+                    "failed": job.get("failed", {}),
+                    "error": job.get("error")
+                }
+            }), 200
+
+        except Exception as e:
+            log_error(f'/tasks/{task_id}', e)
+            return jsonify({
+                "success": False,
+                "error": f"获取任务状态失败。\n错误详情: {str(e)}"
+            }), 500
+
+    @task_bp.route('/tasks/<task_id>/events', methods=['GET'])
+    def stream_task_events(task_id):
+        """
+        接入任务事件流（SSE 流式返回）
+
+        可以在任务执行期间随时接入、断开、重新接入。
+        每个事件都带有递增的 id，重连时通过 Last-Event-ID 请求头
+        （或 last_event_id 查询参数）只补发错过的事件；
+        不带时回放本轮运行已产生的全部事件。
+        错过的事件已超出保留范围时，先下发 resync 快照事件。
+
+        路径参数：
+        - task_id: 任务 ID
+
+        请求头：
+        - Last-Event-ID: 最后收到的事件 id（可选）
+
+        返回：
+        SSE 事件流，事件类型与 POST /api/generate 相同，另有：
+        - resync: 任务快照（generated/failed），用于整体校正页面状态
+        """
+        try:
+            events = get_task_queue().stream(task_id, last_event_id=get_last_event_id())
+
+            if events is None:
+                return jsonify({
+                    "success": False,
+                    "error": f"任务不存在：{task_id}\n可能原因：任务ID错误或任务目录已被删除"
+                }), 404
+
+            return sse_response(events)
+
+        except Exception as e:
+            log_error(f'/tasks/{task_id}/events', e)
+            return jsonify({
+                "success": False,
+                "error": f"接入任务事件流失败。\n错误详情: {str(e)}"
+            }), 500
+
+    return task_bp
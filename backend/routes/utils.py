@@ -4,8 +4,14 @@ API 路由工具函数
 包含通用的日志记录、错误处理等辅助函数
 """
 
+import json
+import hashlib
 import logging
 import traceback
+from datetime import datetime, timezone
+from typing import Optional
+from flask import Response, request
+from werkzeug.http import is_resource_modified
 
 logger = logging.getLogger(__name__)
 
@@ -95,3 +101,180 @@ def prepare_providers_for_response(providers: dict) -> dict:
         result[name] = provider_copy
 
     return result
+
+
+def format_sse_event(event: dict) -> str:
+    """
+    将事件字典格式化为 SSE 文本
+
+    带序号的事件会附加 id 行（放在最后，兼容只解析前两行的客户端），
+    客户端重连时通过 Last-Event-ID 请求头带回。
+
+    Args:
+        event: 事件字典，包含 event 和 data 字段，可选 id 字段
+
+    Returns:
+        str: SSE 格式的文本
+    """
+    text = (
+        f"event: {event['event']}\n"
+        f"data: {json.dumps(event['data'], ensure_ascii=False)}\n"
+    )
+    if event.get('id') is not None:
+        text += f"id: {event['id']}\n"
+    return text + "\n"
+
+
+def get_last_event_id():
+    """
+    读取客户端最后收到的事件序号
+
+    优先读取 Last-Event-ID 请求头（EventSource 自动重连），
+    其次读取 last_event_id 查询参数（fetch 手动重连）。
+
+    Returns:
+        Optional[int]: 事件序号，未提供或格式错误时返回 None
+    """
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def get_use_cache_flag() -> bool:
+    """
+    读取是否复用文本生成缓存
+
+    请求体（JSON 或表单）中的 use_cache 为 false，
+    或请求头 Cache-Control 包含 no-cache 时跳过缓存读取。
+
+    Returns:
+        bool: 是否复用缓存（默认 True）
+    """
+    if 'no-cache' in (request.headers.get('Cache-Control') or '').lower():
+        return False
+
+    if request.content_type and 'multipart/form-data' in request.content_type:
+        value = request.form.get('use_cache')
+    else:
+        value = (request.get_json(silent=True) or {}).get('use_cache')
+
+    if value is None:
+        return True
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', 'off')
+    return bool(value)
+
+
+def get_list_param(name: str) -> list:
+    """
+    读取列表参数
+
+    查询参数支持逗号分隔或重复传入（?ids=a,b&ids=c），
+    JSON 请求体支持列表或逗号分隔的字符串。
+
+    Args:
+        name: 参数名
+
+    Returns:
+        list: 去掉空白后的非空字符串列表
+    """
+    values = []
+    for value in request.args.getlist(name):
+        values.extend(value.split(','))
+
+    body_value = (request.get_json(silent=True) or {}).get(name) if request.is_json else None
+    if isinstance(body_value, str):
+        values.extend(body_value.split(','))
+    elif isinstance(body_value, list):
+        values.extend(str(item) for item in body_value)
+
+    return [value.strip() for value in values if value and value.strip()]
+
+
+def sse_response(events) -> Response:
+    """
+    将事件生成器包装为 SSE 响应
+
+    Args:
+        events: 事件字典的可迭代对象
+
+    Returns:
+        Response: text/event-stream 响应
+    """
+    def generate():
+        for event in events:
+            yield format_sse_event(event)
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        }
+    )
+
+
+def make_etag(*parts) -> str:
+    """
+    由版本信息生成 ETag（不含引号）
+
+    Args:
+        *parts: 决定响应内容的版本信息（记录版本、查询参数等）
+
+    Returns:
+        str: ETag 值
+    """
+    raw = "\x1f".join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """
+    把记录中的 ISO 时间（本地时间）转换为 Last-Modified 使用的 UTC 时间
+
+    Returns:
+        Optional[datetime]: UTC 时间，为空或格式错误时返回 None
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+def with_cache_headers(response: Response, etag: str, last_modified: Optional[datetime] = None) -> Response:
+    """
+    设置条件请求相关的响应头
+
+    Cache-Control: no-cache 要求客户端每次都带上 If-None-Match 重新验证，
+    内容未变化时由 not_modified_response 返回 304。
+    """
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Optional[Response]:
+    """
+    客户端缓存仍然有效时返回 304 响应
+
+    优先比较 If-None-Match；只有 If-Modified-Since 时才比较 last_modified。
+
+    Args:
+        etag: 当前版本的 ETag
+        last_modified: 当前版本的修改时间（不传则忽略 If-Modified-Since）
+
+    Returns:
+        Optional[Response]: 304 响应，缓存已失效时返回 None
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return with_cache_headers(Response(status=304), etag, last_modified)
@@ -10,8 +10,10 @@ import os
 import re
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Generator, List, Any, Optional
 from backend.utils.text_client import get_text_chat_client
+from backend.utils.text_cache import get_text_cache, text_cache_key
+from backend.services.registry import get_service_registry, text_service_fingerprint
 
 logger = logging.getLogger(__name__)
 
@@ -150,10 +152,103 @@ class ContentService:
         logger.error(f"无法解析 JSON 响应: {response_text[:200]}...")
         raise ValueError("AI 返回的内容格式不正确，无法解析")
 
+    def _get_provider_config(self) -> Dict[str, Any]:
+        """当前服务商配置"""
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        return self.text_config.get('providers', {}).get(active_provider, {})
+
+    def _get_generation_params(self) -> Dict[str, Any]:
+        """从配置中获取模型参数"""
+        provider_config = self._get_provider_config()
+
+        return {
+            "model": provider_config.get('model', 'gemini-2.0-flash-exp'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "max_output_tokens": provider_config.get('max_output_tokens', 4000)
+        }
+
+    def _build_result(self, response_text: str) -> Dict[str, Any]:
+        """解析 AI 返回的文本，整理为 titles / copywriting / tags"""
+        content_data = self._parse_json_response(response_text)
+
+        # 验证必要字段
+        titles = content_data.get('titles', [])
+        copywriting = content_data.get('copywriting', '')
+        tags = content_data.get('tags', [])
+
+        # 确保 titles 是列表
+        if isinstance(titles, str):
+            titles = [titles]
+
+        # 确保 tags 是列表
+        if isinstance(tags, str):
+            tags = [t.strip() for t in tags.split(',')]
+
+        logger.info(f"内容生成完成: {len(titles)} 个标题, {len(tags)} 个标签")
+
+        return {
+            "success": True,
+            "titles": titles,
+            "copywriting": copywriting,
+            "tags": tags
+        }
+
+    def _format_error(self, error_msg: str) -> str:
+        """根据错误类型提供更详细的错误信息"""
+        if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+            detailed_error = (
+                f"API 认证失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：API Key 无效或已过期\n"
+                "解决方案：在系统设置页面检查并更新 API Key"
+            )
+        elif "model" in error_msg.lower() or "404" in error_msg:
+            detailed_error = (
+                f"模型访问失败。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：在系统设置页面检查模型名称配置"
+            )
+        elif "timeout" in error_msg.lower() or "连接" in error_msg:
+            detailed_error = (
+                f"网络连接失败。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：检查网络连接，稍后重试"
+            )
+        elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+            detailed_error = (
+                f"API 配额限制。\n"
+                f"错误详情: {error_msg}\n"
+                "解决方案：等待配额重置，或升级 API 套餐"
+            )
+        else:
+            detailed_error = (
+                f"内容生成失败。\n"
+                f"错误详情: {error_msg}\n"
+                "建议：检查配置文件 text_providers.yaml"
+            )
+
+        return detailed_error
+
+    def _cache_key(self, prompt: str, params: Dict[str, Any]) -> str:
+        return text_cache_key("content", self._get_provider_config(), params, prompt)
+
+    def _generate_text(self, prompt: str, params: Dict[str, Any], use_cache: bool = True) -> str:
+        """调用文本生成 API，启用文本缓存时复用相同请求的结果（无法解析的结果不缓存）"""
+        def generate() -> str:
+            response_text = self.client.generate_text(prompt=prompt, **params)
+            self._parse_json_response(response_text)
+            return response_text
+
+        cache = get_text_cache()
+        if cache is None:
+            return self.client.generate_text(prompt=prompt, **params)
+        return cache.get_or_generate(self._cache_key(prompt, params), generate, use_cache=use_cache)
+
     def generate_content(
         self,
         topic: str,
-        outline: str
+        outline: str,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         生成标题、文案和标签
@@ -161,6 +256,7 @@ class ContentService:
         参数：
             topic: 用户输入的主题
             outline: 大纲内容
+            use_cache: 是否复用文本生成缓存（启用 TEXT_CACHE_ENABLED 时有效）
 
         返回：
             包含 titles, copywriting, tags 的字典
@@ -173,97 +269,89 @@ class ContentService:
                 topic=topic,
                 outline=outline
             )
+            params = self._get_generation_params()
 
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 4000)
-
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
-            response_text = self.client.generate_text(
-                prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens
-            )
+            logger.info(f"调用文本生成 API: model={params['model']}, temperature={params['temperature']}")
+            response_text = self._generate_text(prompt, params, use_cache=use_cache)
 
             logger.debug(f"API 返回文本长度: {len(response_text)} 字符")
 
-            # 解析 JSON 响应
-            content_data = self._parse_json_response(response_text)
+            return self._build_result(response_text)
 
-            # 验证必要字段
-            titles = content_data.get('titles', [])
-            copywriting = content_data.get('copywriting', '')
-            tags = content_data.get('tags', [])
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"内容生成失败: {error_msg}")
+
+            return {
+                "success": False,
+                "error": self._format_error(error_msg)
+            }
 
-            # 确保 titles 是列表
-            if isinstance(titles, str):
-                titles = [titles]
+    def generate_content_stream(
+        self,
+        topic: str,
+        outline: str,
+        use_cache: bool = True
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式生成标题、文案和标签
 
-            # 确保 tags 是列表
-            if isinstance(tags, str):
-                tags = [t.strip() for t in tags.split(',')]
+        启用文本缓存且命中时，缓存的结果作为一个 token 事件一次性输出；
+        同时进行中的相同请求合并为一次服务商调用，后到的请求回放同一份输出。
 
-            logger.info(f"内容生成完成: {len(titles)} 个标题, {len(tags)} 个标签")
+        Yields:
+            - token: 模型新输出的文本片段
+            - complete: 全部完成，数据同 generate_content 的返回值
+            - error: 生成或解析失败
+        """
+        try:
+            logger.info(f"开始流式生成内容: topic={topic[:50]}...")
 
-            return {
-                "success": True,
-                "titles": titles,
-                "copywriting": copywriting,
-                "tags": tags
-            }
+            prompt = self.prompt_template.format(
+                topic=topic,
+                outline=outline
+            )
+            params = self._get_generation_params()
 
-        except Exception as e:
-            error_msg = str(e)
-            logger.error(f"内容生成失败: {error_msg}")
+            def generate_stream():
+                logger.info(f"调用文本生成 API（流式）: model={params['model']}, temperature={params['temperature']}")
+                return self.client.generate_text_stream(prompt=prompt, **params)
 
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：API Key 无效或已过期\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
+            # 启用文本缓存时，命中直接输出，同时进行中的相同请求只调用一次服务商；
+            # 只缓存能解析的结果
+            cache = get_text_cache()
+            if cache is None:
+                stream = generate_stream()
             else:
-                detailed_error = (
-                    f"内容生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "建议：检查配置文件 text_providers.yaml"
+                stream = cache.stream_or_generate(
+                    self._cache_key(prompt, params), generate_stream,
+                    use_cache=use_cache, validate=self._build_result
                 )
 
-            return {
-                "success": False,
-                "error": detailed_error
-            }
+            chunks = []
+            for text in stream:
+                chunks.append(text)
+                yield {"event": "token", "data": {"text": text}}
 
+            response_text = "".join(chunks)
+            logger.debug(f"API 返回文本长度: {len(response_text)} 字符")
+
+            result = self._build_result(response_text)
+            yield {"event": "complete", "data": result}
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"内容生成失败: {error_msg}")
+            yield {
+                "event": "error",
+                "data": {"message": self._format_error(error_msg)}
+            }
 
 def get_content_service() -> ContentService:
     """
     获取内容生成服务实例
-    每次调用都创建新实例以确保配置是最新的
+    按配置指纹缓存，配置文件、提示词模板或环境变量变化时自动重建
     """
-    return ContentService()
+    return get_service_registry().get(
+        "content", ContentService, text_service_fingerprint("content_prompt.txt")
+    )
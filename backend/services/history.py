@@ -8,11 +8,23 @@
 import os
 import json
 import uuid
+import base64
+import atexit
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 from enum import Enum
 
+from backend.utils.file_lock import FileLock, atomic_write_json
+from backend.services.history_index import HistoryIndexCache
+from backend.services.history_search import HistorySearchIndex
+
+logger = logging.getLogger(__name__)
+
 
 class RecordStatus:
     """历史记录状态常量"""
@@ -23,22 +35,129 @@ class RecordStatus:
     ERROR = "error"          # 错误：生成过程中出现错误
 
 
+# 列表条目包含的字段（index.json 条目与 SQLite 摘要列共用）：只投影这些字段时不需要读取记录文件
+SUMMARY_FIELDS = ("id", "title", "created_at", "updated_at", "status", "thumbnail", "page_count", "task_id")
+
+
+def project_record(record: Dict, fields: Optional[List[str]]) -> Dict:
+    """
+    按字段列表裁剪记录（字段投影）
+
+    用点号选择嵌套字段（如 images.generated、content.titles）；id 总是保留，不存在的字段忽略。
+
+    Args:
+        record: 完整记录
+        fields: 需要的字段，为空时返回原记录
+
+    Returns:
+        Dict: 只包含所需字段的记录
+    """
+    if not fields:
+        return record
+
+    result: Dict[str, Any] = {"id": record.get("id")}
+    for field in fields:
+        parts = field.split(".")
+        value: Any = record
+        for part in parts:
+            if not isinstance(value, dict) or part not in value:
+                break
+            value = value[part]
+        else:
+            target = result
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+                if not isinstance(target, dict):
+                    break
+            else:
+                target[parts[-1]] = value
+    return result
+
+
+def encode_cursor(updated_at: str, record_id: str) -> str:
+    """把 (updated_at, id) 编码为游标分页的不透明游标"""
+    raw = json.dumps([updated_at, record_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解码游标
+
+    Raises:
+        ValueError: 游标格式错误
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, record_id = json.loads(raw.decode("utf-8"))
+        if not isinstance(updated_at, str) or not isinstance(record_id, str):
+            raise TypeError
+    except Exception:
+        raise ValueError(
+            f"分页游标无效: {cursor}\n"
+            "解决方案：不带 cursor 参数重新加载第一页"
+        )
+    return updated_at, record_id
+
+
 class HistoryService:
-    def __init__(self):
+    """
+    历史记录服务（JSON 文件存储：index.json + 每条记录一个 JSON 文件）
+
+    多线程、多 worker 进程同时写入时：
+    - 所有读-改-写都在跨进程文件锁（history/.history.lock）内完成，不会丢失索引更新
+    - 文件先写临时文件再原子替换，读者不会读到写了一半的 JSON
+    - 生成过程中频繁的进度更新（只含 images / thumbnail，status 为空或 generating）
+      先合并在内存中，每 HISTORY_FLUSH_INTERVAL 秒（默认 0.5）批量写一次磁盘；
+      大纲和文案编辑、其他状态的更新、列表查询和删除会立即写入
+
+    索引解析后常驻内存（HistoryIndexCache），index.json 被其他进程修改时自动重新加载。
+    全文搜索使用进程内倒排索引（HistorySearchIndex），首次搜索时建立，之后随写入增量更新。
+    """
+
+    # 延迟写入的状态和字段：只有生成进度（图片列表、缩略图）会被合并，
+    # 丢失最后一次也可由下一次更新或扫描补齐；大纲、文案等用户编辑始终立即写入
+    DEFERRED_STATUSES = (None, RecordStatus.GENERATING)
+    DEFERRED_FIELDS = frozenset({"images", "thumbnail", "status"})
+
+    def __init__(self, history_dir: Optional[str] = None):
         """
         初始化历史记录服务
 
         创建历史记录存储目录和索引文件
+
+        Args:
+            history_dir: 历史记录目录（默认为项目根目录/history），任务图片也保存在这里
         """
-        # 历史记录存储目录（项目根目录/history）
-        self.history_dir = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-            "history"
-        )
+        if history_dir is None:
+            history_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+        self.history_dir = history_dir
         os.makedirs(self.history_dir, exist_ok=True)
 
         # 索引文件路径
         self.index_file = os.path.join(self.history_dir, "index.json")
+
+        # 跨进程写锁
+        self._lock = FileLock(os.path.join(self.history_dir, ".history.lock"))
+
+        # 索引的进程内缓存
+        self._index = HistoryIndexCache(self.index_file)
+
+        # 延迟写入：记录 ID -> {"fields": 待写入字段, "updated_at": 最后更新时间}
+        self.flush_interval = float(os.getenv('HISTORY_FLUSH_INTERVAL', 0.5))
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        atexit.register(self.flush)
+
+        # 全文搜索索引（首次搜索时建立）
+        self._search_index = HistorySearchIndex()
+        self._search_sync_lock = threading.Lock()
+        self._search_synced_reloads: Optional[int] = None
+
         self._init_index()
 
     def _init_index(self) -> None:
@@ -47,32 +166,95 @@ class HistoryService:
 
         如果索引文件不存在，则创建一个空索引
         """
-        if not os.path.exists(self.index_file):
-            with open(self.index_file, "w", encoding="utf-8") as f:
-                json.dump({"records": []}, f, ensure_ascii=False, indent=2)
+        with self._lock:
+            if not os.path.exists(self.index_file):
+                self._save_index({"records": []})
 
     def _load_index(self) -> Dict:
         """
         加载索引文件
 
+        索引损坏时根据记录文件重建（而不是返回空索引，避免下一次写入把索引清空）
+
         Returns:
             Dict: 索引数据，包含 records 列表
         """
         try:
             with open(self.index_file, "r", encoding="utf-8") as f:
                 return json.load(f)
-        except Exception:
+        except FileNotFoundError:
             return {"records": []}
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ 索引文件损坏，从记录文件重建: {self.index_file}, {e}")
+            return self._rebuild_index()
+
+    def _rebuild_index(self) -> Dict:
+        """扫描记录文件重建索引（按创建时间倒序）"""
+        entries = []
+        for filename in os.listdir(self.history_dir):
+            # 跳过索引本身和隐藏文件（如扫描清单）
+            if not filename.endswith(".json") or filename.startswith(".") or filename == os.path.basename(self.index_file):
+                continue
+            record = self._read_record(filename[:-len(".json")])
+            if record and record.get("id"):
+                entries.append(self._index_entry(record))
+        entries.sort(key=lambda r: r.get("created_at") or "", reverse=True)
+        return {"records": entries}
 
     def _save_index(self, index: Dict) -> None:
         """
-        保存索引文件
+        保存索引文件（原子替换，调用方需持有写锁）
 
         Args:
             index: 索引数据
         """
-        with open(self.index_file, "w", encoding="utf-8") as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+        atomic_write_json(self.index_file, index, indent=2)
+
+    def _refresh_index(self) -> HistoryIndexCache:
+        """确保内存中的索引与 index.json 一致（其他进程写入后重新加载）"""
+        self._index.refresh(self._load_index)
+        return self._index
+
+    def _commit_index(self) -> None:
+        """把内存中的索引写入 index.json（调用方需持有写锁）"""
+        self._save_index(self._index.to_index())
+        self._index.mark_saved()
+
+    @staticmethod
+    def _index_entry(record: Dict) -> Dict:
+        """从完整记录生成索引条目"""
+        return {
+            "id": record["id"],
+            "title": record.get("title"),
+            "created_at": record.get("created_at"),
+            "updated_at": record.get("updated_at"),
+            "status": record.get("status", RecordStatus.DRAFT),
+            "thumbnail": record.get("thumbnail"),
+            "page_count": len((record.get("outline") or {}).get("pages", [])),
+            "task_id": (record.get("images") or {}).get("task_id")
+        }
+
+    @staticmethod
+    def _update_index_entry(idx_record: Dict, now: str, fields: Dict[str, Any]) -> None:
+        """把一次更新同步到索引条目"""
+        idx_record["updated_at"] = now
+
+        # 更新状态
+        if fields.get("status"):
+            idx_record["status"] = fields["status"]
+
+        # 更新缩略图
+        if fields.get("thumbnail"):
+            idx_record["thumbnail"] = fields["thumbnail"]
+
+        # 更新页数（如果大纲被修改）
+        if fields.get("outline"):
+            idx_record["page_count"] = len(fields["outline"].get("pages", []))
+
+        # 更新任务 ID
+        images = fields.get("images")
+        if images is not None and images.get("task_id"):
+            idx_record["task_id"] = images.get("task_id")
 
     def _get_record_path(self, record_id: str) -> str:
         """
@@ -86,30 +268,18 @@ class HistoryService:
         """
         return os.path.join(self.history_dir, f"{record_id}.json")
 
-    def create_record(
+    def _new_record(
         self,
         topic: str,
         outline: Dict,
-        task_id: Optional[str] = None,
-        content: Optional[Dict] = None,
-        original_text: Optional[str] = None
-    ) -> str:
-        """
-        创建新的历史记录
-        Args:
-            topic: 绘本主题/标题（可能是自动摘要后的）
-            outline: 大纲内容
-            task_id: 关联的生成任务 ID
-            content: 生成的内容
-            original_text: 用户原始输入文本
-        """
-        # 生成唯一记录 ID
-        record_id = str(uuid.uuid4())
+        task_id: Optional[str],
+        content: Optional[Dict],
+        original_text: Optional[str]
+    ) -> Dict:
+        """构造新记录（草稿状态）"""
         now = datetime.now().isoformat()
-
-        # 创建完整的记录对象
-        record = {
-            "id": record_id,
+        return {
+            "id": str(uuid.uuid4()),
             "title": topic,
             "original_text": original_text,  # 保存用户原始输入
             "created_at": now,
@@ -128,26 +298,114 @@ class HistoryService:
             "thumbnail": None  # 初始无缩略图
         }
 
-        # 保存完整记录到独立文件
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
+    @staticmethod
+    def _apply_update(
+        record: Dict,
+        outline: Optional[Dict],
+        images: Optional[Dict],
+        status: Optional[str],
+        thumbnail: Optional[str],
+        content: Optional[Dict],
+        now: Optional[str] = None
+    ) -> str:
+        """把部分更新合并到记录中，返回新的 updated_at"""
+        # 更新时间戳
+        now = now or datetime.now().isoformat()
+        record["updated_at"] = now
 
-        # 更新索引（用于快速列表查询）
-        index = self._load_index()
-        index["records"].insert(0, {
-            "id": record_id,
-            "title": topic,
-            "created_at": now,
-            "updated_at": now,
-            "status": RecordStatus.DRAFT,  # 索引中也记录状态
-            "thumbnail": None,
-            "page_count": len(outline.get("pages", [])),  # 预期页数
-            "task_id": task_id
-        })
-        self._save_index(index)
+        # 更新大纲内容（支持修改大纲）
+        if outline is not None:
+            record["outline"] = outline
+
+        # 更新图片信息
+        if images is not None:
+            record["images"] = images
+
+        # 更新状态（状态流转）
+        if status is not None:
+            record["status"] = status
+
+        # 更新缩略图
+        if thumbnail is not None:
+            record["thumbnail"] = thumbnail
+
+        # 更新内容
+        if content is not None:
+            record["content"] = content
+
+        return now
+
+    def _remove_task_dir(self, record: Dict) -> None:
+        """删除记录关联的任务图片目录"""
+        task_id = (record.get("images") or {}).get("task_id")
+        if not task_id:
+            return
+        task_dir = os.path.join(self.history_dir, task_id)
+        if os.path.exists(task_dir) and os.path.isdir(task_dir):
+            try:
+                shutil.rmtree(task_dir)
+                logger.info(f"已删除任务目录: {task_dir}")
+            except Exception as e:
+                logger.warning(f"删除任务目录失败: {task_dir}, {e}")
+
+    def _read_record(self, record_id: str) -> Optional[Dict]:
+        """读取磁盘上的记录文件（不含尚未写入的延迟更新）"""
+        try:
+            with open(self._get_record_path(record_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"❌ 读取历史记录失败: {record_id}, {e}")
+            return None
+
+    def _write_record(self, record: Dict) -> None:
+        """原子写入记录文件（调用方需持有写锁）"""
+        atomic_write_json(self._get_record_path(record["id"]), record, indent=2)
+
+    def _find_record_id_by_task(self, task_id: str) -> Optional[str]:
+        """查找关联指定任务的记录 ID（task_id 反向索引）"""
+        self.flush()
+        return self._refresh_index().find_by_task(task_id)
+
+    def _record_updated_at(self, record_id: str) -> Optional[str]:
+        """记录的最后更新时间（来自索引，不读取记录文件）"""
+        entry = self._refresh_index().get(record_id)
+        return entry.get("updated_at") if entry else None
+
+    def create_record(
+        self,
+        topic: str,
+        outline: Dict,
+        task_id: Optional[str] = None,
+        content: Optional[Dict] = None,
+        original_text: Optional[str] = None
+    ) -> str:
+        """
+        创建新的历史记录
+        Args:
+            topic: 绘本主题/标题（可能是自动摘要后的）
+            outline: 大纲内容
+            task_id: 关联的生成任务 ID
+            content: 生成的内容
+            original_text: 用户原始输入文本
+        """
+        # 创建完整的记录对象（含唯一记录 ID）
+        record = self._new_record(topic, outline, task_id, content, original_text)
 
-        return record_id
+        with self._lock:
+            # 先加载索引：索引损坏需要重建时，不会把新记录重复加入
+            index = self._refresh_index()
+
+            # 保存完整记录到独立文件
+            self._write_record(record)
+
+            # 更新索引（用于快速列表查询）
+            index.insert(self._index_entry(record))
+            self._commit_index()
+            self._on_record_written(record)
+
+        return record["id"]
 
     def get_record(self, record_id: str) -> Optional[Dict]:
         """
@@ -169,16 +427,15 @@ class HistoryService:
             - status: 当前状态
             - thumbnail: 缩略图文件名
         """
-        record_path = self._get_record_path(record_id)
+        # 先取待写入的更新再读磁盘：期间恰好刷新时重复应用同一更新也不影响结果
+        with self._pending_lock:
+            pending = self._pending.get(record_id)
+            pending = {"fields": dict(pending["fields"]), "updated_at": pending["updated_at"]} if pending else None
 
-        if not os.path.exists(record_path):
-            return None
-
-        try:
-            with open(record_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            return None
+        record = self._read_record(record_id)
+        if record is not None and pending is not None:
+            self._apply_update(record, now=pending["updated_at"], **self._update_args(pending["fields"]))
+        return record
 
     def record_exists(self, record_id: str) -> bool:
         """
@@ -193,6 +450,42 @@ class HistoryService:
         record_path = self._get_record_path(record_id)
         return os.path.exists(record_path)
 
+    def get_records(self, record_ids: List[str], fields: Optional[List[str]] = None) -> List[Dict]:
+        """
+        批量获取历史记录
+
+        只请求列表字段（SUMMARY_FIELDS）时直接从索引返回，不读取记录文件；
+        否则并行读取记录（HISTORY_READ_WORKERS，默认 8）后再投影。
+
+        Args:
+            record_ids: 记录 ID 列表（重复的 ID 只返回一次）
+            fields: 需要的字段（可选，见 project_record），为空时返回完整记录
+
+        Returns:
+            List[Dict]: 按 record_ids 顺序排列的记录，不存在的记录跳过
+        """
+        record_ids = list(dict.fromkeys(record_ids))
+
+        if fields and set(fields) <= set(SUMMARY_FIELDS):
+            self.flush()
+            summaries = self._get_summaries(record_ids)
+            return [project_record(summaries[record_id], fields) for record_id in record_ids if record_id in summaries]
+
+        records = [record for record in self._read_records(record_ids) if record]
+        if not fields:
+            return records
+        # 投影时也可以选择列表字段（page_count、task_id 等只存在于索引条目中）
+        return [project_record({**self._index_entry(record), **record}, fields) for record in records]
+
+    def _read_records(self, record_ids: List[str]) -> List[Optional[Dict]]:
+        """并行读取多条记录（含尚未写盘的进度更新），不存在的记录为 None"""
+        if len(record_ids) <= 1:
+            return [self.get_record(record_id) for record_id in record_ids]
+
+        max_workers = min(len(record_ids), max(1, int(os.getenv('HISTORY_READ_WORKERS', 8))))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-read") as pool:
+            return list(pool.map(self.get_record, record_ids))
+
     def update_record(
         self,
         record_id: str,
@@ -227,66 +520,114 @@ class HistoryService:
             partial -> generating: 继续生成剩余图片
             partial -> completed: 剩余图片生成完成
         """
-        # 获取现有记录
-        record = self.get_record(record_id)
-        if not record:
-            return False
-
-        # 更新时间戳
+        fields = {
+            key: value for key, value in (
+                ("outline", outline), ("images", images), ("status", status),
+                ("thumbnail", thumbnail), ("content", content)
+            ) if value is not None
+        }
         now = datetime.now().isoformat()
-        record["updated_at"] = now
-
-        # 更新大纲内容（支持修改大纲）
-        if outline is not None:
-            record["outline"] = outline
 
-        # 更新图片信息
-        if images is not None:
-            record["images"] = images
-
-        # 更新状态（状态流转）
-        if status is not None:
-            record["status"] = status
+        # 进度类更新先合并在内存中，由定时器批量写入
+        if self._is_deferrable(status, fields):
+            if not self.record_exists(record_id):
+                return False
+            with self._pending_lock:
+                entry = self._pending.setdefault(record_id, {"fields": {}, "updated_at": now})
+                entry["fields"].update(fields)
+                entry["updated_at"] = now
+                self._schedule_flush()
+            return True
+
+        with self._lock:
+            # 与尚未写入的更新合并（本次更新的字段优先）
+            with self._pending_lock:
+                pending = self._pending.pop(record_id, None)
+            if pending is not None:
+                fields = {**pending["fields"], **fields}
+
+            record = self._read_record(record_id)
+            if not record:
+                return False
+
+            self._apply_update(record, now=now, **self._update_args(fields))
+            self._write_record(record)
+
+            # 同步更新索引
+            self._refresh_index().update(
+                record_id, lambda idx_record: self._update_index_entry(idx_record, now, fields)
+            )
+            self._commit_index()
+            self._on_record_written(record)
 
-        # 更新缩略图
-        if thumbnail is not None:
-            record["thumbnail"] = thumbnail
-
-        # 更新内容
-        if content is not None:
-            record["content"] = content
-
-        # 保存完整记录
-        record_path = self._get_record_path(record_id)
-        with open(record_path, "w", encoding="utf-8") as f:
-            json.dump(record, f, ensure_ascii=False, indent=2)
+        return True
 
-        # 同步更新索引
-        index = self._load_index()
-        for idx_record in index["records"]:
-            if idx_record["id"] == record_id:
-                idx_record["updated_at"] = now
+    def _is_deferrable(self, status: Optional[str], fields: Dict[str, Any]) -> bool:
+        """是否为可以延迟写入的生成进度更新（只含图片/缩略图，状态为空或 generating）"""
+        return (
+            self.flush_interval > 0
+            and status in self.DEFERRED_STATUSES
+            and set(fields) <= self.DEFERRED_FIELDS
+        )
 
-                # 更新状态
-                if status:
-                    idx_record["status"] = status
+    @staticmethod
+    def _update_args(fields: Dict[str, Any]) -> Dict[str, Any]:
+        """待写入字段 -> _apply_update 的参数"""
+        return {key: fields.get(key) for key in ("outline", "images", "status", "thumbnail", "content")}
 
-                # 更新缩略图
-                if thumbnail:
-                    idx_record["thumbnail"] = thumbnail
+    def _schedule_flush(self) -> None:
+        """安排一次延迟刷新（调用方需持有 _pending_lock）"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
 
-                # 更新页数（如果大纲被修改）
-                if outline:
-                    idx_record["page_count"] = len(outline.get("pages", []))
+    def _flush_from_timer(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"❌ 历史记录延迟写入失败: {e}", exc_info=True)
 
-                # 更新任务 ID
-                if images is not None and images.get("task_id"):
-                    idx_record["task_id"] = images.get("task_id")
+    def flush(self) -> int:
+        """
+        把内存中合并的更新写入磁盘
 
-                break
+        所有待写入的记录共用一次索引写入。
 
-        self._save_index(index)
-        return True
+        Returns:
+            int: 写入的记录数
+        """
+        with self._pending_lock:
+            if not self._pending:
+                return 0
+
+        with self._lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+            if not batch:
+                return 0
+
+            index = self._refresh_index()
+            written = 0
+            for record_id, entry in batch.items():
+                record = self._read_record(record_id)
+                if not record:
+                    continue
+                self._apply_update(record, now=entry["updated_at"], **self._update_args(entry["fields"]))
+                self._write_record(record)
+                index.update(
+                    record_id,
+                    lambda idx_record, e=entry: self._update_index_entry(idx_record, e["updated_at"], e["fields"])
+                )
+                self._on_record_written(record)
+                written += 1
+            self._commit_index()
+
+        logger.debug(f"历史记录延迟写入: {written} 条")
+        return written
 
     def delete_record(self, record_id: str) -> bool:
         """
@@ -308,28 +649,23 @@ class HistoryService:
             return False
 
         # 删除关联的任务图片目录
-        if record.get("images") and record["images"].get("task_id"):
-            task_id = record["images"]["task_id"]
-            task_dir = os.path.join(self.history_dir, task_id)
-            if os.path.exists(task_dir) and os.path.isdir(task_dir):
-                try:
-                    import shutil
-                    shutil.rmtree(task_dir)
-                    print(f"已删除任务目录: {task_dir}")
-                except Exception as e:
-                    print(f"删除任务目录失败: {task_dir}, {e}")
+        self._remove_task_dir(record)
 
-        # 删除记录 JSON 文件
-        record_path = self._get_record_path(record_id)
-        try:
-            os.remove(record_path)
-        except Exception:
-            return False
+        with self._lock:
+            with self._pending_lock:
+                self._pending.pop(record_id, None)
+
+            # 删除记录 JSON 文件
+            record_path = self._get_record_path(record_id)
+            try:
+                os.remove(record_path)
+            except Exception:
+                return False
 
-        # 从索引中移除
-        index = self._load_index()
-        index["records"] = [r for r in index["records"] if r["id"] != record_id]
-        self._save_index(index)
+            # 从索引中移除
+            self._refresh_index().remove(record_id)
+            self._commit_index()
+            self._on_record_deleted(record_id)
 
         return True
 
@@ -355,18 +691,11 @@ class HistoryService:
                 - page_size: 每页大小
                 - total_pages: 总页数
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        self.flush()
 
-        # 按状态过滤
-        if status:
-            records = [r for r in records if r.get("status") == status]
-
-        # 分页计算
-        total = len(records)
+        # 分页计算（按状态过滤时总数来自状态计数）
         start = (page - 1) * page_size
-        end = start + page_size
-        page_records = records[start:end]
+        page_records, total = self._refresh_index().page(start, page_size, status)
 
         return {
             "records": page_records,
@@ -376,27 +705,193 @@ class HistoryService:
             "total_pages": (total + page_size - 1) // page_size
         }
 
+    def list_records_after(
+        self,
+        cursor: Optional[str] = None,
+        page_size: int = 20,
+        status: Optional[str] = None
+    ) -> Dict:
+        """
+        游标（keyset）分页获取历史记录列表
+
+        按 (updated_at, id) 倒序，最近更新的在前。翻页期间有记录被更新或删除时，
+        不会像按偏移分页那样重复或漏掉未变化的记录。
+
+        Args:
+            cursor: 上一页返回的 next_cursor，不传表示第一页
+            page_size: 每页记录数
+            status: 状态过滤（可选）
+
+        Returns:
+            Dict: 分页结果
+                - records: 当前页的记录列表
+                - page_size: 每页大小
+                - next_cursor: 下一页的游标（没有下一页时为 None）
+                - has_more: 是否还有下一页
+
+        Raises:
+            ValueError: 游标格式错误
+        """
+        after = decode_cursor(cursor) if cursor else None
+        self.flush()
+        records, has_more = self._refresh_index().page_after(after, page_size, status)
+        return self._cursor_page(records, has_more, page_size)
+
+    @staticmethod
+    def _cursor_page(records: List[Dict], has_more: bool, page_size: int) -> Dict:
+        """组装游标分页结果"""
+        next_cursor = None
+        if has_more and records:
+            last = records[-1]
+            next_cursor = encode_cursor(last.get("updated_at") or last.get("created_at") or "", last["id"])
+        return {
+            "records": records,
+            "page_size": page_size,
+            "next_cursor": next_cursor,
+            "has_more": has_more
+        }
+
+    def get_list_version(self) -> Dict[str, Optional[str]]:
+        """
+        获取列表的版本（用于 ETag / Last-Modified）
+
+        任何记录的创建、更新、删除（包括其他进程的写入）都会改变版本。
+
+        Returns:
+            Dict:
+                - version: 版本标识（index.json 的文件签名）
+                - updated_at: 最近一次更新的时间
+        """
+        self.flush()
+        index = self._refresh_index()
+        signature = index.signature
+        return {
+            "version": "-".join(str(part) for part in signature) if signature else "",
+            "updated_at": index.latest_updated_at()
+        }
+
+    def get_record_version(self, record_id: str) -> Optional[str]:
+        """
+        获取单条记录的版本（最后更新时间，含尚未写盘的进度更新），不读取记录文件
+
+        Returns:
+            Optional[str]: 版本，记录不存在时返回 None
+        """
+        with self._pending_lock:
+            pending = self._pending.get(record_id)
+            if pending is not None:
+                return pending["updated_at"]
+
+        entry = self._refresh_index().get(record_id)
+        if entry is None:
+            return None
+        return entry.get("updated_at") or entry.get("created_at") or ""
+
+    def search(self, keyword: str, page: int = 1, page_size: int = 20) -> Dict:
+        """
+        全文搜索历史记录
+
+        搜索标题、原始输入、大纲页面、文案标题、正文和标签，按相关度排序。
+
+        Args:
+            keyword: 搜索关键词（不区分大小写，多个词需全部命中）
+            page: 页码，从 1 开始
+            page_size: 每页记录数
+
+        Returns:
+            Dict: 分页结果（结构同 list_records，每条记录额外带 score 相关度）
+        """
+        ranked = self._ranked_search(keyword)
+        total = len(ranked)
+        start = max(0, (page - 1) * page_size)
+
+        return {
+            "records": self._search_results(ranked[start:start + page_size]),
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size
+        }
+
     def search_records(self, keyword: str) -> List[Dict]:
         """
-        根据关键词搜索历史记录
+        根据关键词搜索历史记录（不分页）
 
         Args:
             keyword: 搜索关键词（不区分大小写）
 
         Returns:
-            List[Dict]: 匹配的记录列表（按创建时间倒序）
+            List[Dict]: 匹配的记录列表（按相关度排序）
         """
-        index = self._load_index()
-        records = index.get("records", [])
+        return self._search_results(self._ranked_search(keyword))
+
+    def _ranked_search(self, keyword: str) -> List[Tuple[str, float]]:
+        """搜索并按相关度排序，返回 (记录 ID, 得分)"""
+        self.flush()
+        self._sync_search_index()
+
+        ranked = self._search_index.search(keyword)
+        if ranked is None:
+            # 关键词只有符号等无法分词的字符时，退回标题子串匹配
+            ranked = [(record_id, 0.0) for record_id in self._search_titles(keyword)]
+        return ranked
+
+    def _search_results(self, ranked: List[Tuple[str, float]]) -> List[Dict]:
+        """(记录 ID, 得分) -> 带 score 的列表条目（跳过期间被删除的记录）"""
+        summaries = self._get_summaries([record_id for record_id, _ in ranked])
+        results = []
+        for record_id, score in ranked:
+            summary = summaries.get(record_id)
+            if summary is not None:
+                summary["score"] = round(score, 4)
+                results.append(summary)
+        return results
+
+    def _sync_search_index(self) -> None:
+        """让搜索索引与存储对齐（首次建立，或其他进程修改后补齐变化的记录）"""
+        with self._search_sync_lock:
+            versions = self._search_versions()
+            if versions is not None:
+                self._search_index.sync(versions, self.get_record)
 
-        # 不区分大小写的标题搜索
+    def _search_versions(self) -> Optional[Dict[str, Optional[str]]]:
+        """
+        搜索索引需要对齐时返回 记录 ID -> updated_at，否则返回 None
+
+        本进程的写入已增量更新搜索索引，只有索引缓存重新加载过（其他进程写入）才需要对齐。
+        """
+        index = self._refresh_index()
+        if self._search_index.ready and self._search_synced_reloads == index.reloads:
+            return None
+        self._search_synced_reloads = index.reloads
+        return {entry["id"]: entry.get("updated_at") for entry in index.entries()}
+
+    def _get_summaries(self, record_ids: List[str]) -> Dict[str, Dict]:
+        """按 ID 批量获取列表条目（来自索引，不读取记录文件）"""
+        index = self._refresh_index()
+        summaries = {}
+        for record_id in record_ids:
+            entry = index.get(record_id)
+            if entry is not None:
+                summaries[record_id] = entry
+        return summaries
+
+    def _search_titles(self, keyword: str) -> List[str]:
+        """标题包含关键词的记录 ID（按创建时间倒序）"""
         keyword_lower = keyword.lower()
-        results = [
-            r for r in records
-            if keyword_lower in r.get("title", "").lower()
+        return [
+            r["id"] for r in self._refresh_index().entries()
+            if keyword_lower in (r.get("title") or "").lower()
         ]
 
-        return results
+    def _on_record_written(self, record: Dict) -> None:
+        """记录写入后增量更新搜索索引（索引尚未建立时跳过，首次搜索时统一建立）"""
+        if self._search_index.ready:
+            self._search_index.index_record(record)
+
+    def _on_record_deleted(self, record_id: str) -> None:
+        """记录删除后从搜索索引中移除"""
+        self._search_index.remove(record_id)
 
     def get_statistics(self) -> Dict:
         """
@@ -412,20 +907,13 @@ class HistoryService:
                     - completed: 已完成数
                     - error: 错误数
         """
-        index = self._load_index()
-        records = index.get("records", [])
-
-        total = len(records)
-        status_count = {}
-
-        # 统计各状态的记录数
-        for record in records:
-            status = record.get("status", RecordStatus.DRAFT)
-            status_count[status] = status_count.get(status, 0) + 1
+        self.flush()
+        index = self._refresh_index()
 
+        # 各状态的记录数由索引缓存增量维护
         return {
-            "total": total,
-            "by_status": status_count
+            "total": len(index),
+            "by_status": index.status_counts()
         }
 
     def scan_and_sync_task_images(self, task_id: str) -> Dict[str, Any]:
@@ -478,14 +966,7 @@ class HistoryService:
             image_files.sort(key=get_index)
 
             # 查找关联的历史记录
-            index = self._load_index()
-            record_id = None
-            for rec in index.get("records", []):
-                # 通过遍历所有记录，找到 task_id 匹配的记录
-                record_detail = self.get_record(rec["id"])
-                if record_detail and record_detail.get("images", {}).get("task_id") == task_id:
-                    record_id = rec["id"]
-                    break
+            record_id = self._find_record_id_by_task(task_id)
 
             if record_id:
                 # 更新历史记录
@@ -537,18 +1018,98 @@ class HistoryService:
                 "error": f"扫描任务失败: {str(e)}"
             }
 
-    def scan_all_tasks(self) -> Dict[str, Any]:
+    # ==================== 增量扫描 ====================
+
+    def _get_manifest_path(self) -> str:
+        return os.path.join(self.history_dir, ".scan_manifest.json")
+
+    def _load_scan_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        读取扫描清单
+
+        task_id -> {mtime_ns: 目录修改时间, images: 图片列表, record_id, record_updated_at}
+        """
+        try:
+            with open(self._get_manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f).get("tasks", {})
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"扫描清单损坏，将全量扫描: {e}")
+            return {}
+
+    def _is_task_unchanged(self, task_id: str, mtime_ns: int, entry: Optional[Dict[str, Any]]) -> bool:
+        """
+        目录和关联记录自上次扫描后都没有变化
+
+        目录中增删文件会改变目录的 mtime；记录被重新关联或修改（如前端更新图片列表）
+        时 record_id / updated_at 会变化，这些情况都需要重新同步。
+        """
+        if not entry or entry.get("mtime_ns") != mtime_ns:
+            return False
+        record_id = self._find_record_id_by_task(task_id)
+        if record_id != entry.get("record_id"):
+            return False
+        return record_id is None or self._record_updated_at(record_id) == entry.get("record_updated_at")
+
+    def _scan_task_incremental(
+        self,
+        task_id: str,
+        manifest: Dict[str, Dict[str, Any]],
+        full: bool
+    ) -> Dict[str, Any]:
+        """扫描单个任务目录，未变化时直接返回清单中的结果"""
+        try:
+            mtime_ns = os.stat(os.path.join(self.history_dir, task_id)).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+
+        entry = manifest.get(task_id)
+        if not full and mtime_ns is not None and self._is_task_unchanged(task_id, mtime_ns, entry):
+            result = {
+                "success": True,
+                "task_id": task_id,
+                "images_count": len(entry.get("images", [])),
+                "images": entry.get("images", []),
+                "unchanged": True
+            }
+            if entry.get("record_id"):
+                result["record_id"] = entry["record_id"]
+            else:
+                result["no_record"] = True
+            return result
+
+        result = self.scan_and_sync_task_images(task_id)
+        if result.get("success") and mtime_ns is not None:
+            record_id = result.get("record_id")
+            result["_manifest"] = {
+                "mtime_ns": mtime_ns,
+                "images": result.get("images", []),
+                "record_id": record_id,
+                "record_updated_at": self._record_updated_at(record_id) if record_id else None
+            }
+        return result
+
+    def scan_all_tasks(self, full: bool = False) -> Dict[str, Any]:
         """
         扫描所有任务文件夹，同步图片列表
 
         批量扫描 history 目录下的所有任务文件夹，
         同步图片列表并更新记录状态。
 
+        扫描结果保存在扫描清单（history/.scan_manifest.json）中，
+        目录内容和关联记录都没有变化的任务直接跳过；
+        需要扫描的任务由线程池并行处理（HISTORY_SCAN_WORKERS，默认 8）。
+
+        Args:
+            full: 忽略扫描清单，重新扫描所有任务
+
         Returns:
             Dict[str, Any]: 扫描结果统计
                 - success: 是否成功
                 - total_tasks: 扫描的任务总数
                 - synced: 成功同步的任务数
+                - unchanged: 未变化而跳过的任务数
                 - failed: 失败的任务数
                 - orphan_tasks: 孤立任务列表（有图片但无记录）
                 - results: 详细结果列表
@@ -561,38 +1122,55 @@ class HistoryService:
             }
 
         try:
+            # 假设任务文件夹名就是 task_id，只处理目录
+            task_ids = [
+                item for item in os.listdir(self.history_dir)
+                if os.path.isdir(os.path.join(self.history_dir, item))
+            ]
+
+            self.flush()
+            manifest = {} if full else self._load_scan_manifest()
+            max_workers = max(1, int(os.getenv('HISTORY_SCAN_WORKERS', 8)))
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-scan") as pool:
+                results = list(pool.map(
+                    lambda task_id: self._scan_task_incremental(task_id, manifest, full),
+                    task_ids
+                ))
+
             synced_count = 0
+            unchanged_count = 0
             failed_count = 0
             orphan_tasks = []  # 没有关联记录的任务
-            results = []
+            new_manifest = {}
 
-            # 遍历 history 目录
-            for item in os.listdir(self.history_dir):
-                item_path = os.path.join(self.history_dir, item)
-
-                # 只处理目录（任务文件夹）
-                if not os.path.isdir(item_path):
-                    continue
-
-                # 假设任务文件夹名就是 task_id
-                task_id = item
-
-                # 扫描并同步
-                result = self.scan_and_sync_task_images(task_id)
-                results.append(result)
+            for task_id, result in zip(task_ids, results):
+                if result.get("unchanged"):
+                    new_manifest[task_id] = manifest[task_id]
+                elif "_manifest" in result:
+                    new_manifest[task_id] = result.pop("_manifest")
 
                 if result.get("success"):
                     if result.get("no_record"):
                         orphan_tasks.append(task_id)
+                    elif result.get("unchanged"):
+                        unchanged_count += 1
                     else:
                         synced_count += 1
                 else:
                     failed_count += 1
 
+            # 已删除的任务目录不会写入新清单；并发扫描时以后完成的一次为准
+            atomic_write_json(self._get_manifest_path(), {"tasks": new_manifest})
+
+            logger.info(
+                f"扫描任务完成: 共 {len(task_ids)} 个，同步 {synced_count}，"
+                f"未变化 {unchanged_count}，失败 {failed_count}"
+            )
             return {
                 "success": True,
                 "total_tasks": len(results),
                 "synced": synced_count,
+                "unchanged": unchanged_count,
                 "failed": failed_count,
                 "orphan_tasks": orphan_tasks,
                 "results": results
@@ -606,16 +1184,34 @@ class HistoryService:
 
 
 _service_instance = None
+_service_lock = threading.Lock()
 
 
 def get_history_service() -> HistoryService:
     """
     获取历史记录服务实例（单例模式）
 
+    存储引擎由环境变量 HISTORY_STORAGE 选择：
+    - json（默认）：index.json + 每条记录一个 JSON 文件
+    - sqlite：history/history.db（WAL 模式），首次启用时自动导入已有的 JSON 记录
+
     Returns:
         HistoryService: 历史记录服务实例
     """
     global _service_instance
     if _service_instance is None:
-        _service_instance = HistoryService()
+        with _service_lock:
+            if _service_instance is None:
+                storage = os.getenv('HISTORY_STORAGE', 'json').lower()
+                if storage == 'sqlite':
+                    from backend.services.history_sqlite import SqliteHistoryService
+                    _service_instance = SqliteHistoryService()
+                elif storage == 'json':
+                    _service_instance = HistoryService()
+                else:
+                    raise ValueError(
+                        f"不支持的历史记录存储类型: {storage}\n"
+                        "解决方案：HISTORY_STORAGE 设置为 json 或 sqlite"
+                    )
+                logger.info(f"历史记录存储: {storage}")
     return _service_instance
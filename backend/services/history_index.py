@@ -0,0 +1,296 @@
+"""
+历史记录索引的进程内缓存
+
+index.json 解析后常驻内存，按文件的 inode + mtime + 大小判断是否被其他进程修改：
+- 未修改时列表、统计直接读内存，不再重新读取和解析整个索引
+- 本进程的写入（创建/更新/删除）增量更新缓存，写盘后刷新文件签名
+- 维护 记录 ID -> 位置 的映射和各状态计数，统计为 O(状态数)，分页为 O(页大小)
+- 维护 task_id -> 记录 ID 的反向索引，按任务查找记录不再逐个读取记录文件
+- 维护按 (updated_at, id) 排序的键列表，游标分页为 O(log n + 页大小)
+
+条目在内存中按创建顺序（最旧在前）保存，新建只需追加；
+对外（以及写入 index.json 时）仍是最新在前。
+"""
+
+import os
+import bisect
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class HistoryIndexCache:
+    """index.json 的进程内缓存（线程安全）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: 索引文件路径
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._entries: Optional[List[Dict[str, Any]]] = None   # 最旧在前
+        self._positions: Dict[str, int] = {}
+        self._status_counts: Dict[str, int] = {}
+        # task_id -> 关联的记录 ID 集合（通常只有一条）
+        self._task_records: Dict[str, set] = {}
+        # (updated_at, id) 升序列表
+        self._by_updated: List[Tuple[str, str]] = []
+        self.reloads = 0
+
+    # ==================== 加载与失效 ====================
+
+    def _stat_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self, loader: Callable[[], Dict]) -> None:
+        """
+        文件被修改（或尚未加载）时重新加载
+
+        先取签名再读取：读取期间文件被替换时，下次调用会再次加载，不会把新签名配上旧内容。
+
+        Args:
+            loader: 读取并解析 index.json 的函数
+        """
+        signature = self._stat_signature()
+        with self._lock:
+            if self._entries is not None and signature is not None and signature == self._signature:
+                return
+            index = loader()
+            self._reset(index.get("records", []))
+            self._signature = signature
+            self.reloads += 1
+
+    def invalidate(self) -> None:
+        """丢弃缓存，下次访问时重新加载"""
+        with self._lock:
+            self._entries = None
+            self._signature = None
+
+    @property
+    def signature(self) -> Optional[Tuple[int, int, int]]:
+        """当前缓存对应的 index.json 签名（inode, mtime_ns, size）"""
+        with self._lock:
+            return self._signature
+
+    def mark_saved(self) -> None:
+        """本进程写入 index.json 后调用（调用方需持有写锁），记录新文件的签名"""
+        signature = self._stat_signature()
+        with self._lock:
+            self._signature = signature
+
+    def _reset(self, records_newest_first: List[Dict[str, Any]]) -> None:
+        self._entries = list(reversed(records_newest_first))
+        self._reindex(0)
+        self._status_counts = {}
+        self._task_records = {}
+        for entry in self._entries:
+            self._count(entry.get("status"), 1)
+            self._link_task(entry.get("task_id"), entry["id"])
+        self._by_updated = sorted(self._updated_key(entry) for entry in self._entries)
+
+    @staticmethod
+    def _updated_key(entry: Dict[str, Any]) -> Tuple[str, str]:
+        """游标分页的排序键（旧记录可能没有 updated_at，退回 created_at）"""
+        return entry.get("updated_at") or entry.get("created_at") or "", entry["id"]
+
+    def _unlink_updated(self, key: Tuple[str, str]) -> None:
+        i = bisect.bisect_left(self._by_updated, key)
+        if i < len(self._by_updated) and self._by_updated[i] == key:
+            del self._by_updated[i]
+
+    def _reindex(self, start: int) -> None:
+        """重建 start 之后的位置映射"""
+        if start == 0:
+            self._positions = {}
+        for i in range(start, len(self._entries)):
+            self._positions[self._entries[i]["id"]] = i
+
+    def _count(self, status: Optional[str], delta: int) -> None:
+        status = status or "draft"
+        count = self._status_counts.get(status, 0) + delta
+        if count > 0:
+            self._status_counts[status] = count
+        else:
+            self._status_counts.pop(status, None)
+
+    def _link_task(self, task_id: Optional[str], record_id: str) -> None:
+        if task_id:
+            self._task_records.setdefault(task_id, set()).add(record_id)
+
+    def _unlink_task(self, task_id: Optional[str], record_id: str) -> None:
+        ids = self._task_records.get(task_id) if task_id else None
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del self._task_records[task_id]
+
+    # ==================== 增量修改（调用方需持有写锁并已 refresh） ====================
+
+    def insert(self, entry: Dict[str, Any]) -> None:
+        """新增条目（作为最新的一条）"""
+        with self._lock:
+            if entry["id"] in self._positions:
+                self.remove(entry["id"])
+            self._positions[entry["id"]] = len(self._entries)
+            self._entries.append(entry)
+            self._count(entry.get("status"), 1)
+            self._link_task(entry.get("task_id"), entry["id"])
+            bisect.insort(self._by_updated, self._updated_key(entry))
+
+    def update(self, record_id: str, apply: Callable[[Dict[str, Any]], None]) -> bool:
+        """
+        原地修改条目并同步状态计数
+
+        Args:
+            record_id: 记录 ID
+            apply: 修改条目的函数
+
+        Returns:
+            bool: 条目是否存在
+        """
+        with self._lock:
+            position = self._positions.get(record_id)
+            if position is None:
+                return False
+            entry = self._entries[position]
+            old_status, old_task_id = entry.get("status"), entry.get("task_id")
+            old_key = self._updated_key(entry)
+            apply(entry)
+            new_key = self._updated_key(entry)
+            if new_key != old_key:
+                self._unlink_updated(old_key)
+                bisect.insort(self._by_updated, new_key)
+            if entry.get("status") != old_status:
+                self._count(old_status, -1)
+                self._count(entry.get("status"), 1)
+            if entry.get("task_id") != old_task_id:
+                self._unlink_task(old_task_id, record_id)
+                self._link_task(entry.get("task_id"), record_id)
+            return True
+
+    def remove(self, record_id: str) -> bool:
+        """删除条目"""
+        with self._lock:
+            position = self._positions.pop(record_id, None)
+            if position is None:
+                return False
+            entry = self._entries.pop(position)
+            self._count(entry.get("status"), -1)
+            self._unlink_task(entry.get("task_id"), record_id)
+            self._unlink_updated(self._updated_key(entry))
+            self._reindex(position)
+            return True
+
+    def to_index(self) -> Dict[str, Any]:
+        """导出为 index.json 的结构（最新在前）"""
+        with self._lock:
+            return {"records": list(reversed(self._entries))}
+
+    # ==================== 查询 ====================
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """按 ID 获取条目副本"""
+        with self._lock:
+            position = self._positions.get(record_id)
+            return dict(self._entries[position]) if position is not None else None
+
+    def find_by_task(self, task_id: str) -> Optional[str]:
+        """查找关联任务的记录 ID（多条时取最新创建的）"""
+        with self._lock:
+            ids = self._task_records.get(task_id)
+            if not ids:
+                return None
+            return max(ids, key=lambda record_id: self._positions[record_id])
+
+    def __contains__(self, record_id: str) -> bool:
+        with self._lock:
+            return record_id in self._positions
+
+    def page(self, start: int, size: int, status: Optional[str] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        按最新在前的顺序分页
+
+        Args:
+            start: 起始偏移
+            size: 页大小
+            status: 状态过滤（可选）
+
+        Returns:
+            (当前页条目副本, 总数)
+        """
+        with self._lock:
+            if not status:
+                total = len(self._entries)
+                first = total - 1 - max(0, start)
+                last = max(first - size, -1)
+                return [dict(self._entries[i]) for i in range(first, last, -1)], total
+
+            # 按状态过滤时从最新开始跳过不匹配的条目，凑够一页即停止
+            total = self._status_counts.get(status, 0)
+            result: List[Dict[str, Any]] = []
+            skipped = 0
+            for i in range(len(self._entries) - 1, -1, -1):
+                if len(result) >= size or skipped + len(result) >= total:
+                    break
+                entry = self._entries[i]
+                if (entry.get("status") or "draft") != status:
+                    continue
+                if skipped < start:
+                    skipped += 1
+                    continue
+                result.append(dict(entry))
+            return result, total
+
+    def page_after(
+        self,
+        after: Optional[Tuple[str, str]],
+        size: int,
+        status: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        按 (updated_at, id) 倒序的游标分页
+
+        Args:
+            after: 上一页最后一条的 (updated_at, id)，None 表示第一页
+            size: 页大小
+            status: 状态过滤（可选）
+
+        Returns:
+            (当前页条目副本, 是否还有下一页)
+        """
+        with self._lock:
+            i = len(self._by_updated) if after is None else bisect.bisect_left(self._by_updated, tuple(after))
+            result: List[Dict[str, Any]] = []
+            while i > 0:
+                i -= 1
+                entry = self._entries[self._positions[self._by_updated[i][1]]]
+                if status and (entry.get("status") or "draft") != status:
+                    continue
+                if len(result) >= size:
+                    return result, True
+                result.append(dict(entry))
+            return result, False
+
+    def latest_updated_at(self) -> Optional[str]:
+        """最近一次更新的时间"""
+        with self._lock:
+            return self._by_updated[-1][0] if self._by_updated else None
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """全部条目副本（最新在前）"""
+        with self._lock:
+            return [dict(entry) for entry in reversed(self._entries)]
+
+    def status_counts(self) -> Dict[str, int]:
+        """各状态的记录数"""
+        with self._lock:
+            return dict(self._status_counts)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries or [])
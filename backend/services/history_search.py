@@ -0,0 +1,273 @@
+"""
+历史记录全文搜索索引
+
+倒排索引常驻内存，覆盖标题、原始输入、大纲页面、文案标题、正文和标签：
+- 分词：中日韩文字按单字 + 相邻双字（bigram）切分，拉丁字母和数字按单词切分并转小写
+- 查询：所有查询词都要命中（AND）；单个汉字按单字匹配，英文单词按前缀匹配
+- 排序：各字段加权的词频（饱和）× IDF，标题包含完整关键词时额外加分
+- 维护：记录创建/更新/删除时增量更新；首次搜索时并行读取全部记录建立索引，
+  之后按记录的 updated_at 对比，只重建有变化的记录（兼容其他进程的写入）
+"""
+
+import re
+import math
+import bisect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_CJK_RUN = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+')
+_WORD = re.compile(r'[a-z0-9]+')
+
+# 字段权重
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "content_titles": 2.0,
+    "original_text": 1.5,
+    "copywriting": 1.0,
+    "outline": 1.0,
+}
+
+# 词频饱和参数（同 BM25 的 k1）
+_K1 = 1.2
+# 标题包含完整关键词时的加分倍数
+_TITLE_PHRASE_BOOST = 1.5
+
+
+def tokenize(text: str, for_query: bool = False) -> List[str]:
+    """
+    切分文本
+
+    Args:
+        text: 原始文本
+        for_query: 查询模式下多字的中文片段只取双字（更精确），单字片段取单字
+
+    Returns:
+        词列表（可能重复）
+    """
+    if not text:
+        return []
+    text = text.lower()
+    tokens: List[str] = []
+
+    for run in _CJK_RUN.findall(text):
+        if for_query:
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+    tokens.extend(_WORD.findall(_CJK_RUN.sub(" ", text)))
+    return tokens
+
+
+def _record_fields(record: Dict[str, Any]) -> Dict[str, str]:
+    """提取记录中参与搜索的字段文本"""
+    outline = record.get("outline") or {}
+    content = record.get("content") or {}
+    pages = outline.get("pages") or [] if isinstance(outline, dict) else []
+    tags = content.get("tags") or []
+    titles = content.get("titles") or []
+
+    return {
+        "title": record.get("title") or "",
+        "original_text": record.get("original_text") or "",
+        "outline": "\n".join(str(page.get("content", "")) for page in pages if isinstance(page, dict)),
+        "content_titles": " ".join(titles) if isinstance(titles, list) else str(titles),
+        "copywriting": content.get("copywriting") or "",
+        "tags": " ".join(tags) if isinstance(tags, list) else str(tags),
+    }
+
+
+class HistorySearchIndex:
+    """历史记录倒排索引（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 词 -> {记录 ID: 字段加权后的词频得分}
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # 记录 ID -> 包含的词（删除/更新时用）
+        self._doc_tokens: Dict[str, Set[str]] = {}
+        # 记录 ID -> 建立索引时的 updated_at
+        self._versions: Dict[str, Optional[str]] = {}
+        # 记录 ID -> 小写标题（整词加分用）
+        self._titles: Dict[str, str] = {}
+        # 有序词表（英文前缀匹配用），词表变化时惰性重建
+        self._vocabulary: Optional[List[str]] = None
+        self.ready = False
+
+    # ==================== 维护 ====================
+
+    def index_record(self, record: Dict[str, Any]) -> None:
+        """添加或替换一条记录（比已索引版本旧的记录会被忽略）"""
+        record_id = record.get("id")
+        if not record_id:
+            return
+        version = record.get("updated_at")
+
+        weighted: Dict[str, float] = {}
+        for field, text in _record_fields(record).items():
+            counts: Dict[str, int] = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            weight = FIELD_WEIGHTS[field]
+            for token, tf in counts.items():
+                weighted[token] = weighted.get(token, 0.0) + weight * tf * (_K1 + 1) / (tf + _K1)
+
+        with self._lock:
+            # 并发对齐时可能读到旧版本，不能覆盖写入时已索引的新版本（ISO 时间可直接比较）
+            indexed = self._versions.get(record_id)
+            if indexed and version and version < indexed:
+                return
+            self._remove_locked(record_id)
+            for token, score in weighted.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._vocabulary = None
+                postings[record_id] = score
+            self._doc_tokens[record_id] = set(weighted)
+            self._versions[record_id] = version
+            self._titles[record_id] = (record.get("title") or "").lower()
+
+    def remove(self, record_id: str) -> None:
+        """删除一条记录"""
+        with self._lock:
+            self._remove_locked(record_id)
+
+    def _remove_locked(self, record_id: str) -> None:
+        for token in self._doc_tokens.pop(record_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(record_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+        self._versions.pop(record_id, None)
+        self._titles.pop(record_id, None)
+
+    def sync(
+        self,
+        versions: Dict[str, Optional[str]],
+        loader: Callable[[str], Optional[Dict[str, Any]]],
+        max_workers: int = 8
+    ) -> int:
+        """
+        与存储中的记录对齐：删除已不存在的记录，重建 updated_at 变化的记录
+
+        Args:
+            versions: 记录 ID -> updated_at（存储中的当前状态）
+            loader: 按 ID 读取完整记录
+            max_workers: 并行读取记录的线程数
+
+        Returns:
+            int: 重新建立索引的记录数
+        """
+        with self._lock:
+            removed = [record_id for record_id in self._versions if record_id not in versions]
+            for record_id in removed:
+                self._remove_locked(record_id)
+            stale = [
+                record_id for record_id, version in versions.items()
+                if record_id not in self._versions or self._versions[record_id] != version
+            ]
+
+        if stale:
+            if len(stale) > 1 and max_workers > 1:
+                with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-search") as pool:
+                    records = list(pool.map(loader, stale))
+            else:
+                records = [loader(record_id) for record_id in stale]
+            for record in records:
+                if record:
+                    self.index_record(record)
+
+        if not self.ready:
+            logger.info(f"历史记录搜索索引已建立: {len(versions)} 条记录")
+        self.ready = True
+        return len(stale)
+
+    # ==================== 查询 ====================
+
+    def _expand(self, token: str) -> List[str]:
+        """查询词 -> 索引中匹配的词（英文单词按前缀匹配，调用方需持有锁）"""
+        if not _WORD.fullmatch(token):
+            return [token] if token in self._postings else []
+
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        start = bisect.bisect_left(self._vocabulary, token)
+        matches = []
+        for i in range(start, len(self._vocabulary)):
+            if not self._vocabulary[i].startswith(token):
+                break
+            matches.append(self._vocabulary[i])
+        return matches
+
+    def search(self, keyword: str) -> Optional[List[Tuple[str, float]]]:
+        """
+        搜索
+
+        Args:
+            keyword: 关键词（可包含多个词，全部命中才返回）
+
+        Returns:
+            按得分从高到低（得分相同时最近更新的在前）排列的 (记录 ID, 得分)；关键词无法分词（如只有符号）时返回 None
+        """
+        terms = list(dict.fromkeys(tokenize(keyword, for_query=True)))
+        if not terms:
+            return None
+
+        phrase = keyword.strip().lower()
+        with self._lock:
+            total_docs = max(1, len(self._doc_tokens))
+            scores: Optional[Dict[str, float]] = None
+
+            # 先处理文档数少的词，尽早缩小候选集
+            expanded = [(term, self._expand(term)) for term in terms]
+            expanded.sort(key=lambda item: sum(len(self._postings[t]) for t in item[1]))
+
+            for _, tokens in expanded:
+                term_scores: Dict[str, float] = {}
+                for token in tokens:
+                    postings = self._postings[token]
+                    idf = math.log(1 + total_docs / len(postings))
+                    for record_id, weight in postings.items():
+                        if scores is not None and record_id not in scores:
+                            continue
+                        term_scores[record_id] = max(term_scores.get(record_id, 0.0), idf * weight)
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {record_id: scores[record_id] + s for record_id, s in term_scores.items()}
+                if not scores:
+                    return []
+
+            for record_id in scores:
+                if phrase and phrase in self._titles.get(record_id, ""):
+                    scores[record_id] *= _TITLE_PHRASE_BOOST
+
+            # 得分相同时最近更新的在前
+            return sorted(
+                scores.items(),
+                key=lambda item: (item[1], self._versions.get(item[0]) or ""),
+                reverse=True
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """索引统计信息"""
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "documents": len(self._doc_tokens),
+                "tokens": len(self._postings)
+            }
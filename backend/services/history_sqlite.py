@@ -0,0 +1,419 @@
+"""
+历史记录服务（SQLite 存储）
+
+与 HistoryService 接口一致，记录保存在 history/history.db：
+- WAL 模式，读写互不阻塞，多个进程可同时访问
+- 列表字段单独成列并建立索引（status / created_at / updated_at / task_id），
+  列表、统计只查询需要的行，不再解析整个索引文件
+- 全文搜索与 JSON 存储共用进程内倒排索引，搜索时按 updated_at 补齐变化的记录
+- 完整记录以 JSON 保存在 data 列
+- meta 表中的 version 由触发器在每次写入时递增，作为列表 ETag 的版本
+- 首次启用时自动导入已有的 index.json + <id>.json 记录（原文件保留）
+
+通过环境变量 HISTORY_STORAGE=sqlite 启用。
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from backend.services.history import HistoryService, SUMMARY_FIELDS, decode_cursor
+from backend.services.history_search import HistorySearchIndex
+
+logger = logging.getLogger(__name__)
+
+# 数据库结构版本，升级结构时递增并在 _migrate_schema 中处理
+_SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    status TEXT NOT NULL,
+    thumbnail TEXT,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    task_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_status ON records (status);
+CREATE INDEX IF NOT EXISTS idx_records_created_at ON records (created_at);
+CREATE INDEX IF NOT EXISTS idx_records_updated_at ON records (updated_at);
+CREATE INDEX IF NOT EXISTS idx_records_task_id ON records (task_id);
+"""
+
+
+def _summary_of(record: Dict) -> Dict[str, Any]:
+    """从完整记录中提取列表字段"""
+    outline = record.get("outline") or {}
+    images = record.get("images") or {}
+    return {
+        "id": record["id"],
+        "title": record.get("title") or "",
+        "created_at": record.get("created_at") or "",
+        "updated_at": record.get("updated_at") or record.get("created_at") or "",
+        "status": record.get("status") or "draft",
+        "thumbnail": record.get("thumbnail"),
+        "page_count": len(outline.get("pages", [])) if isinstance(outline, dict) else 0,
+        "task_id": images.get("task_id")
+    }
+
+
+class SqliteHistoryService(HistoryService):
+    """历史记录服务（SQLite 存储）"""
+
+    def __init__(self, history_dir: Optional[str] = None, db_path: Optional[str] = None):
+        """
+        初始化 SQLite 历史记录服务
+
+        Args:
+            history_dir: 历史记录目录（默认为项目根目录/history），任务图片仍保存在这里
+            db_path: 数据库文件路径（默认 HISTORY_DB_PATH 环境变量或 history_dir/history.db）
+        """
+        # 不调用父类构造函数：SQLite 模式不需要创建 index.json
+        if history_dir is None:
+            history_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+        self.history_dir = history_dir
+        os.makedirs(self.history_dir, exist_ok=True)
+
+        self.index_file = os.path.join(self.history_dir, "index.json")
+        self.db_path = db_path or os.getenv('HISTORY_DB_PATH') or os.path.join(self.history_dir, "history.db")
+
+        # sqlite3 连接不能跨线程使用，每个线程一个连接
+        self._local = threading.local()
+
+        # 全文搜索索引（首次搜索时建立）
+        self._search_index = HistorySearchIndex()
+        self._search_sync_lock = threading.Lock()
+
+        self._init_db()
+
+    # ==================== 连接与事务 ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None：由 _transaction 显式控制事务
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            # SQLite 内置 lower() 只处理 ASCII，搜索时与 Python 的大小写规则保持一致
+            conn.create_function("py_lower", 1, lambda value: value.lower() if value else value, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务（BEGIN IMMEDIATE，读-改-写期间不会被其他写入者插入）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def _init_db(self) -> None:
+        """创建表和索引，必要时从 JSON 存储迁移"""
+        with self._transaction() as conn:
+            # executescript 会隐式提交，这里逐条执行以保持在同一事务中
+            for statement in _SCHEMA.strip().split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                self._import_json_records(conn)
+            self._migrate_schema(conn, version)
+            if version != _SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _migrate_schema(self, conn: sqlite3.Connection, version: int) -> None:
+        """按版本升级数据库结构（调用方需在事务中）"""
+        if version < 2:
+            # 版本 2：游标分页的组合索引；写入计数器（列表 ETag）
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_records_updated_id ON records (updated_at, id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # instance 区分重建后的数据库，避免计数器从 0 重新开始时与旧 ETag 相同
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', ?)", (uuid.uuid4().hex,))
+            conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', '0')")
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS records_version_{event.lower()} AFTER {event} ON records "
+                    "BEGIN UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'; END"
+                )
+
+    def _import_json_records(self, conn: sqlite3.Connection) -> None:
+        """
+        一次性导入 JSON 存储中的记录（调用方需在事务中）
+
+        按 index.json 的顺序导入（最新的在前），索引中缺失的记录文件会被跳过；
+        原有 JSON 文件保留不动，切回 json 存储时仍可使用（但看不到之后的新记录）。
+        """
+        if not os.path.exists(self.index_file):
+            return
+
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("records", [])
+        except Exception as e:
+            logger.warning(f"读取 index.json 失败，跳过历史记录迁移: {e}")
+            return
+
+        imported = 0
+        # 反向插入，rowid 与原索引的先后顺序一致
+        for entry in reversed(entries):
+            record = self._read_record(entry.get("id", ""))
+            if not record or not record.get("id"):
+                continue
+            self._upsert(conn, record)
+            imported += 1
+
+        if imported:
+            logger.info(f"✅ 已从 JSON 存储导入 {imported} 条历史记录到 {self.db_path}")
+
+    def _upsert(self, conn: sqlite3.Connection, record: Dict) -> None:
+        """写入完整记录（调用方需在事务中）"""
+        summary = _summary_of(record)
+        conn.execute(
+            "INSERT INTO records "
+            "(id, title, created_at, updated_at, status, thumbnail, page_count, task_id, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET "
+            "title = excluded.title, updated_at = excluded.updated_at, status = excluded.status, "
+            "thumbnail = excluded.thumbnail, page_count = excluded.page_count, "
+            "task_id = excluded.task_id, data = excluded.data",
+            (
+                summary["id"], summary["title"], summary["created_at"], summary["updated_at"],
+                summary["status"], summary["thumbnail"], summary["page_count"], summary["task_id"],
+                json.dumps(record, ensure_ascii=False)
+            )
+        )
+
+    def _select_by_ids(self, columns: str, record_ids: List[str]) -> List[sqlite3.Row]:
+        """按 ID 批量查询（分批，避免超过 SQLite 的参数个数上限）"""
+        conn = self._connect()
+        rows: List[sqlite3.Row] = []
+        for i in range(0, len(record_ids), 500):
+            batch = record_ids[i:i + 500]
+            rows.extend(conn.execute(
+                f"SELECT {columns} FROM records WHERE id IN ({', '.join('?' * len(batch))})", batch
+            ).fetchall())
+        return rows
+
+    @staticmethod
+    def _rows_to_summaries(rows) -> List[Dict]:
+        return [{column: row[column] for column in SUMMARY_FIELDS} for row in rows]
+
+    # ==================== CRUD ====================
+
+    def create_record(
+        self,
+        topic: str,
+        outline: Dict,
+        task_id: Optional[str] = None,
+        content: Optional[Dict] = None,
+        original_text: Optional[str] = None
+    ) -> str:
+        """创建新的历史记录（参数同 HistoryService.create_record）"""
+        record = self._new_record(topic, outline, task_id, content, original_text)
+        with self._transaction() as conn:
+            self._upsert(conn, record)
+        self._on_record_written(record)
+        return record["id"]
+
+    def get_record(self, record_id: str) -> Optional[Dict]:
+        """获取历史记录详情，不存在时返回 None"""
+        row = self._connect().execute(
+            "SELECT data FROM records WHERE id = ?", (record_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(row["data"])
+        except ValueError:
+            return None
+
+    def _read_records(self, record_ids: List[str]) -> List[Optional[Dict]]:
+        """一次查询读取多条记录（比逐条并行查询更快），不存在的记录为 None"""
+        found: Dict[str, Dict] = {}
+        for row in self._select_by_ids("id, data", record_ids):
+            try:
+                found[row["id"]] = json.loads(row["data"])
+            except ValueError:
+                continue
+        return [found.get(record_id) for record_id in record_ids]
+
+    def record_exists(self, record_id: str) -> bool:
+        """检查历史记录是否存在"""
+        row = self._connect().execute(
+            "SELECT 1 FROM records WHERE id = ?", (record_id,)
+        ).fetchone()
+        return row is not None
+
+    def update_record(
+        self,
+        record_id: str,
+        outline: Optional[Dict] = None,
+        images: Optional[Dict] = None,
+        status: Optional[str] = None,
+        thumbnail: Optional[str] = None,
+        content: Optional[Dict] = None
+    ) -> bool:
+        """部分更新历史记录（参数和状态流转同 HistoryService.update_record）"""
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM records WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return False
+            record = json.loads(row["data"])
+            self._apply_update(record, outline, images, status, thumbnail, content)
+            self._upsert(conn, record)
+        self._on_record_written(record)
+        return True
+
+    def delete_record(self, record_id: str) -> bool:
+        """删除历史记录及关联的任务图片目录"""
+        record = self.get_record(record_id)
+        if not record:
+            return False
+
+        self._remove_task_dir(record)
+
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM records WHERE id = ?", (record_id,)).rowcount
+        self._on_record_deleted(record_id)
+        return deleted > 0
+
+    def flush(self) -> int:
+        """SQLite 存储每次更新直接提交，没有需要刷新的延迟写入"""
+        return 0
+
+    # ==================== 查询 ====================
+
+    def list_records(
+        self,
+        page: int = 1,
+        page_size: int = 20,
+        status: Optional[str] = None
+    ) -> Dict:
+        """分页获取历史记录列表（按创建时间倒序，返回结构同 HistoryService.list_records）"""
+        conn = self._connect()
+        where, params = ("WHERE status = ?", [status]) if status else ("", [])
+
+        total = conn.execute(f"SELECT COUNT(*) FROM records {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {', '.join(SUMMARY_FIELDS)} FROM records {where} "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?",
+            params + [page_size, max(0, (page - 1) * page_size)]
+        ).fetchall()
+
+        return {
+            "records": self._rows_to_summaries(rows),
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size
+        }
+
+    def list_records_after(
+        self,
+        cursor: Optional[str] = None,
+        page_size: int = 20,
+        status: Optional[str] = None
+    ) -> Dict:
+        """游标分页获取历史记录列表（按 updated_at, id 倒序，返回结构同 HistoryService.list_records_after）"""
+        after: Optional[Tuple[str, str]] = decode_cursor(cursor) if cursor else None
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if after:
+            clauses.append("(updated_at, id) < (?, ?)")
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # 多取一条判断是否还有下一页
+        rows = self._connect().execute(
+            f"SELECT {', '.join(SUMMARY_FIELDS)} FROM records {where} "
+            "ORDER BY updated_at DESC, id DESC LIMIT ?",
+            params + [page_size + 1]
+        ).fetchall()
+        return self._cursor_page(self._rows_to_summaries(rows[:page_size]), len(rows) > page_size, page_size)
+
+    def get_list_version(self) -> Dict[str, Optional[str]]:
+        """获取列表的版本（写入计数器，其他进程的写入同样生效；返回结构同 HistoryService.get_list_version）"""
+        conn = self._connect()
+        meta = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+        latest = conn.execute("SELECT MAX(updated_at) FROM records").fetchone()[0]
+        return {
+            "version": f"{meta.get('instance', '')}-{meta.get('version', '0')}",
+            "updated_at": latest
+        }
+
+    def get_record_version(self, record_id: str) -> Optional[str]:
+        """获取单条记录的版本（最后更新时间），记录不存在时返回 None"""
+        return self._record_updated_at(record_id)
+
+    def _search_versions(self) -> Dict[str, Optional[str]]:
+        """
+        记录 ID -> updated_at
+
+        其他进程的写入没有可用的变更信号，每次搜索都对比一次版本（只查询索引列，不读 data）。
+        """
+        rows = self._connect().execute("SELECT id, updated_at FROM records").fetchall()
+        return {row["id"]: row["updated_at"] for row in rows}
+
+    def _get_summaries(self, record_ids: List[str]) -> Dict[str, Dict]:
+        """按 ID 批量获取列表条目"""
+        rows = self._select_by_ids(", ".join(SUMMARY_FIELDS), record_ids)
+        return {summary["id"]: summary for summary in self._rows_to_summaries(rows)}
+
+    def _search_titles(self, keyword: str) -> List[str]:
+        """标题包含关键词的记录 ID（不区分大小写，按创建时间倒序）"""
+        pattern = keyword.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        rows = self._connect().execute(
+            "SELECT id FROM records "
+            "WHERE py_lower(title) LIKE ? ESCAPE '\\' "
+            "ORDER BY created_at DESC, rowid DESC",
+            (f"%{pattern}%",)
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def get_statistics(self) -> Dict:
+        """获取历史记录统计信息（返回结构同 HistoryService.get_statistics）"""
+        rows = self._connect().execute(
+            "SELECT status, COUNT(*) AS count FROM records GROUP BY status"
+        ).fetchall()
+        status_count = {row["status"]: row["count"] for row in rows}
+        return {
+            "total": sum(status_count.values()),
+            "by_status": status_count
+        }
+
+    def _find_record_id_by_task(self, task_id: str) -> Optional[str]:
+        """通过 task_id 索引查找关联的记录"""
+        row = self._connect().execute(
+            "SELECT id FROM records WHERE task_id = ? ORDER BY created_at DESC LIMIT 1", (task_id,)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def _record_updated_at(self, record_id: str) -> Optional[str]:
+        """记录的最后更新时间"""
+        row = self._connect().execute(
+            "SELECT updated_at FROM records WHERE id = ?", (record_id,)
+        ).fetchone()
+        return row["updated_at"] if row else None
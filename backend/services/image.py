@@ -4,20 +4,144 @@ import os
 import base64
 import uuid
 import time
+import queue
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError
-from typing import Dict, Any, Generator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Generator, Iterable, List, Optional, Tuple
 from backend.config import Config
 from backend.generators.factory import ImageGeneratorFactory
-from backend.utils.image_compressor import compress_image
+from backend.utils.image_engine import get_image_engine
+from backend.utils.concurrency import get_concurrency_limiter
+from backend.utils.http_pool import get_http_pool
+from backend.utils.disk_cache import DiskCache, SingleFlight, make_cache_key
+from backend.utils.reference_store import PreparedReference, ReferenceStore
+from backend.utils.file_lock import atomic_write_bytes
+from backend.services.task_state import get_task_state_store
 
 logger = logging.getLogger(__name__)
 
 
+# 图片生成共享线程池（进程内所有任务共用，服务实例重建后继续复用）
+# 实际发往服务商的并发由并发控制器限制，这里只需保证线程数不少于并发上限
+_worker_pool: Optional[ThreadPoolExecutor] = None
+_worker_pool_lock = threading.Lock()
+
+
+def _get_worker_pool() -> ThreadPoolExecutor:
+    """获取图片生成共享线程池"""
+    global _worker_pool
+    if _worker_pool is None:
+        with _worker_pool_lock:
+            if _worker_pool is None:
+                max_workers = int(os.getenv('IMAGE_WORKER_THREADS', 16))
+                _worker_pool = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix="image-worker"
+                )
+                logger.info(f"图片生成线程池已创建: workers={max_workers}")
+    return _worker_pool
+
+
+# 生成结果缓存（可选，IMAGE_CACHE_ENABLED=true 时启用）
+# 相同服务商、模型、提示词、尺寸和参考图的请求直接复用已生成的图片，
+# 同时进行中的相同请求合并为一次服务商调用
+_image_cache: Optional[DiskCache] = None
+_image_cache_lock = threading.Lock()
+_image_flights = SingleFlight()
+
+
+def _get_image_cache() -> Optional[DiskCache]:
+    """获取图片生成结果缓存（未启用时返回 None）"""
+    global _image_cache
+    if os.getenv('IMAGE_CACHE_ENABLED', 'false').lower() != 'true':
+        return None
+    if _image_cache is None:
+        with _image_cache_lock:
+            if _image_cache is None:
+                cache_dir = os.getenv('IMAGE_CACHE_DIR') or os.path.join(
+                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                    "cache", "images"
+                )
+                max_mb = int(os.getenv('IMAGE_CACHE_MAX_MB', 1024))
+                _image_cache = DiskCache(cache_dir, max_mb * 1024 * 1024, suffix=".img")
+                logger.info(f"图片生成缓存已启用: {cache_dir}, 上限 {max_mb}MB")
+    return _image_cache
+
+
+# 图片后处理线程池（缩略图生成），与生成线程池分开，不占用生成线程
+_postprocess_pool: Optional[ThreadPoolExecutor] = None
+_postprocess_pool_lock = threading.Lock()
+
+
+def _get_postprocess_pool() -> ThreadPoolExecutor:
+    """获取图片后处理共享线程池"""
+    global _postprocess_pool
+    if _postprocess_pool is None:
+        with _postprocess_pool_lock:
+            if _postprocess_pool is None:
+                max_workers = int(os.getenv('IMAGE_POSTPROCESS_WORKERS', 2))
+                _postprocess_pool = ThreadPoolExecutor(
+                    max_workers=max_workers,
+                    thread_name_prefix="image-postprocess"
+                )
+    return _postprocess_pool
+
+
+class TaskContext:
+    """
+    图片生成任务的执行上下文
+
+    每个任务持有独立的输出目录、参考图、大纲和用户输入，
+    在生成流程中显式传递，多个任务可在同一个服务实例中并行执行。
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        task_dir: str,
+        full_outline: str = "",
+        user_topic: str = "",
+        user_images: Optional[List[bytes]] = None,
+        cover_image: Optional[bytes] = None,
+        use_cache: bool = True
+    ):
+        self.task_id = task_id
+        self.task_dir = task_dir
+        self.full_outline = full_outline
+        self.user_topic = user_topic
+        self.user_images = user_images      # 用户上传的参考图（已压缩）
+        self.cover_image = cover_image      # 封面参考图（已压缩），封面生成后填充
+        self.use_cache = use_cache          # 是否读取生成结果缓存（重新生成时为 False）
+
+        # 参考图预处理缓存：每张参考图在任务内只压缩、编码一次
+        self.references = ReferenceStore(max_size_kb=200)
+
+        # 页面生成结果和后处理结果共用的完成队列
+        self.completions: queue.Queue = queue.Queue()
+        self._pending_postprocess = 0
+        self._lock = threading.Lock()
+
+    def postprocess_started(self) -> None:
+        """登记一个后处理任务"""
+        with self._lock:
+            self._pending_postprocess += 1
+
+    def postprocess_consumed(self) -> None:
+        """一个后处理结果已被消费"""
+        with self._lock:
+            self._pending_postprocess -= 1
+
+    @property
+    def pending_postprocess(self) -> int:
+        """尚未消费结果的后处理任务数"""
+        with self._lock:
+            return self._pending_postprocess
+
+
 class ImageService:
     """图片生成服务类"""
 
-    # 并发配置
+    # 并发配置（初始并发，实际并发由自适应并发控制器动态调整）
     MAX_CONCURRENT = int(os.getenv('GEMINI_MAX_CONCURRENT', 2))  # Default to 2 to prevent OOM
     AUTO_RETRY_COUNT = 1  # 不自动重试，超时后让用户手动重试
 
@@ -46,6 +170,14 @@ class ImageService:
         self.provider_name = provider_name
         self.provider_config = provider_config
 
+        # 自适应并发控制器（按服务商共享，根据延迟和限流信号调整并发）
+        self.concurrency_limiter = get_concurrency_limiter(
+            provider_name, provider_config, initial_limit=self.MAX_CONCURRENT
+        )
+
+        # 服务商主机的 HTTP 连接池不小于并发上限，避免高并发时连接被丢弃重建
+        get_http_pool().ensure_pool_size(provider_config.get('base_url'), self.concurrency_limiter.max_limit)
+
         # 检查是否启用短 prompt 模式
         self.use_short_prompt = provider_config.get('short_prompt', False)
 
@@ -60,11 +192,9 @@ class ImageService:
         )
         os.makedirs(self.history_root_dir, exist_ok=True)
 
-        # 当前任务的输出目录（每个任务一个子文件夹）
-        self.current_task_dir = None
-
         # 存储任务状态（用于重试）
-        self._task_states: Dict[str, Dict] = {}
+        # 内存 LRU/TTL + 磁盘持久化，服务实例重建后仍可恢复
+        self._task_states = get_task_state_store()
 
         logger.info(f"ImageService 初始化完成: provider={provider_name}, type={provider_type}")
 
@@ -82,63 +212,295 @@ class ImageService:
         with open(prompt_path, "r", encoding="utf-8") as f:
             return f.read()
 
-    def _save_image(self, image_data: bytes, filename: str, task_dir: str = None) -> str:
+    def _save_image(self, image_data: bytes, filename: str, context: TaskContext) -> str:
         """
-        保存图片到本地，同时生成缩略图
+        保存原图到本地，缩略图交给后处理线程池异步生成
+
+        缩略图完成后向任务的完成队列放入 thumbnail_ready 事件；
+        缩略图就绪前，图片接口会直接返回原图。
 
         Args:
             image_data: 图片二进制数据
             filename: 文件名
-            task_dir: 任务目录（如果为None则使用当前任务目录）
+            context: 任务上下文
 
         Returns:
             保存的文件路径
         """
-        if task_dir is None:
-            task_dir = self.current_task_dir
-
+        task_dir = context.task_dir
         if task_dir is None:
             raise ValueError("任务目录未设置")
 
-        # 保存原图
+        # 删除旧缩略图（重新生成时避免返回过期的缩略图）
+        thumbnail_path = os.path.join(task_dir, f"thumb_{filename}")
+        if os.path.exists(thumbnail_path):
+            os.remove(thumbnail_path)
+
+        # 保存原图（原子写入：恢复任务时按文件是否存在判断页面已生成，不能留下写了一半的图片）
         filepath = os.path.join(task_dir, filename)
-        with open(filepath, "wb") as f:
-            f.write(image_data)
+        atomic_write_bytes(filepath, image_data)
+
+        # 异步生成缩略图
+        context.postprocess_started()
+        future = _get_postprocess_pool().submit(self._save_thumbnail, image_data, filename, task_dir)
+        future.add_done_callback(
+            lambda f: context.completions.put(("postprocess", self._build_thumbnail_event(context, filename, f)))
+        )
 
-        # 生成缩略图（50KB左右）
-        thumbnail_data = compress_image(image_data, max_size_kb=50)
+        return filepath
+
+    def _save_thumbnail(self, image_data: bytes, filename: str, task_dir: str) -> str:
+        """生成缩略图（50KB左右），由图片处理进程池压缩并原子写入"""
         thumbnail_filename = f"thumb_{filename}"
         thumbnail_path = os.path.join(task_dir, thumbnail_filename)
-        with open(thumbnail_path, "wb") as f:
-            f.write(thumbnail_data)
+        get_image_engine().thumbnail(image_data, thumbnail_path, max_size_kb=50)
+        return thumbnail_filename
 
-        return filepath
+    def _build_thumbnail_event(self, context: TaskContext, filename: str, future) -> Dict[str, Any]:
+        """根据缩略图任务结果构建 thumbnail_ready 事件"""
+        index = int(os.path.splitext(filename)[0])
+        try:
+            future.result()
+        except Exception as e:
+            logger.warning(f"⚠️ 缩略图生成失败 [{index}]: {e}")
+            return {
+                "event": "thumbnail_ready",
+                "data": {
+                    "index": index,
+                    "status": "error",
+                    "message": str(e)
+                }
+            }
+        return {
+            "event": "thumbnail_ready",
+            "data": {
+                "index": index,
+                "status": "done",
+                "thumbnail_url": f"/api/images/{context.task_id}/{filename}?thumbnail=true"
+            }
+        }
 
-    def _generate_single_image(
+    def _drain_postprocess(self, context: TaskContext) -> Generator[Dict[str, Any], None, None]:
+        """等待剩余的后处理任务完成，依次产出事件"""
+        while context.pending_postprocess > 0:
+            kind, event = context.completions.get()
+            context.postprocess_consumed()
+            yield event
+
+    def _create_task_context(
         self,
-        page: Dict,
         task_id: str,
-        reference_image: Optional[bytes] = None,
-        retry_count: int = 0,
         full_outline: str = "",
+        user_topic: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        cover_image: Optional[bytes] = None,
+        use_cache: bool = True
+    ) -> TaskContext:
+        """创建任务上下文（同时创建任务专属目录）"""
+        task_dir = os.path.join(self.history_root_dir, task_id)
+        os.makedirs(task_dir, exist_ok=True)
+        return TaskContext(
+            task_id, task_dir,
+            full_outline=full_outline,
+            user_topic=user_topic,
+            user_images=user_images,
+            cover_image=cover_image,
+            use_cache=use_cache
+        )
+
+    def _load_cover_reference(self, task_dir: str, filename: str) -> bytes:
+        """读取封面图并压缩到 200KB 以内，作为后续页面的风格参考"""
+        cover_path = os.path.join(task_dir, filename)
+
+        # 压缩封面图（减少内存占用和后续传输开销），由工作进程直接读取文件
+        return get_image_engine().compress(cover_path, max_size_kb=200)
+
+    def _find_existing_images(self, task_dir: str, pages: list) -> Dict[int, str]:
+        """
+        查找任务目录中已生成的页面图片
+
+        Args:
+            task_dir: 任务目录
+            pages: 页面列表
+
+        Returns:
+            {页面索引: 文件名}
+        """
+        existing = {}
+        for page in pages:
+            filename = f"{page['index']}.png"
+            filepath = os.path.join(task_dir, filename)
+            if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
+                existing[page["index"]] = filename
+        return existing
+
+    def _invoke_generator(
+        self,
+        prompt: str,
+        primary_reference_image: Optional[PreparedReference],
+        page_specific_image_data: Optional[PreparedReference],
+        reference_image: Optional[PreparedReference],
+        user_images: Optional[List[PreparedReference]]
+    ) -> bytes:
+        """
+        按服务商类型调用生成器
+
+        Args:
+            prompt: 最终提示词
+            primary_reference_image: 主要参考图（页面特定参考图优先，否则为封面）
+            page_specific_image_data: 页面特定参考图
+            reference_image: 封面参考图
+            user_images: 用户上传的参考图片列表
+
+        Returns:
+            图片二进制数据
+        """
+        if self.provider_config.get('type') == 'google_genai':
+            logger.debug(f"  使用 Google GenAI 生成器")
+            return self.generator.generate_image(
+                prompt=prompt,
+                aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
+                temperature=self.provider_config.get('temperature', 1.0),
+                model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
+                reference_image=primary_reference_image,
+            )
+        elif self.provider_config.get('type') == 'image_api':
+            logger.debug(f"  使用 Image API 生成器")
+            # Image API 支持多张参考图片
+            # 优先级：页面特定图 > 用户全局上传图 > 封面参考图
+            reference_images = []
+            
+            if page_specific_image_data:
+                reference_images.append(page_specific_image_data)
+
+            if user_images:
+                reference_images.extend(user_images)
+            
+            if reference_image:
+                reference_images.append(reference_image)
+
+            return self.generator.generate_image(
+                prompt=prompt,
+                aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
+                temperature=self.provider_config.get('temperature', 1.0),
+                model=self.provider_config.get('model', 'nano-banana-2'),
+                reference_images=reference_images if reference_images else None,
+            )
+        else:
+            logger.debug(f"  使用 OpenAI 兼容生成器")
+            return self.generator.generate_image(
+                prompt=prompt,
+                size=self.provider_config.get('default_size', '1024x1024'),
+                model=self.provider_config.get('model'),
+                quality=self.provider_config.get('quality', 'standard'),
+            )
+
+    def _call_generator(self, *args) -> bytes:
+        """在并发控制器的许可下调用生成器（参数同 _invoke_generator）"""
+        with self.concurrency_limiter.track() as call:
+            try:
+                return self._invoke_generator(*args)
+            finally:
+                call["headers"] = self.generator.pop_response_headers()
+
+    def _image_cache_key(
+        self,
+        prompt: str,
+        primary_reference_image: Optional[PreparedReference],
+        page_specific_image_data: Optional[PreparedReference],
+        reference_image: Optional[PreparedReference],
+        user_images: Optional[List[PreparedReference]]
+    ) -> str:
+        """根据服务商、模型、提示词、尺寸参数和参考图内容计算缓存键"""
+        config = self.provider_config
+        return make_cache_key(
+            config.get('type'),
+            config.get('base_url'),
+            config.get('endpoint_type'),
+            config.get('model'),
+            config.get('default_aspect_ratio'),
+            config.get('default_size'),
+            config.get('image_size'),
+            config.get('quality'),
+            config.get('temperature'),
+            prompt,
+            *(ref.digest if ref else None for ref in (
+                primary_reference_image, page_specific_image_data, reference_image, *(user_images or [])
+            ))
+        )
+
+    def _generate_or_reuse(
+        self,
+        prompt: str,
+        primary_reference_image: Optional[PreparedReference],
+        page_specific_image_data: Optional[PreparedReference],
+        reference_image: Optional[PreparedReference],
+        user_images: Optional[List[PreparedReference]],
+        use_cache: bool = True
+    ) -> bytes:
+        """
+        生成图片，启用缓存时复用相同请求的结果
+
+        Args:
+            use_cache: 为 False 时跳过缓存读取和请求合并（重新生成），但仍会刷新缓存
+
+        Returns:
+            图片二进制数据
+        """
+        args = (prompt, primary_reference_image, page_specific_image_data, reference_image, user_images)
+
+        cache = _get_image_cache()
+        if cache is None:
+            return self._call_generator(*args)
+
+        key = self._image_cache_key(*args)
+
+        if not use_cache:
+            image_data = self._call_generator(*args)
+            cache.set(key, image_data)
+            return image_data
+
+        cached = cache.get(key)
+        if cached is not None:
+            logger.info(f"♻️ 命中图片缓存: {key[:12]}")
+            return cached
+
+        def produce() -> bytes:
+            # 等待期间可能已有其他请求写入缓存
+            data = cache.get(key)
+            if data is None:
+                data = self._call_generator(*args)
+                cache.set(key, data)
+            return data
+
+        image_data, shared = _image_flights.do(key, produce)
+        if shared:
+            logger.info(f"♻️ 合并相同的进行中请求: {key[:12]}")
+        return image_data
+
+    def _generate_single_image(
+        self,
+        page: Dict,
+        context: TaskContext,
+        use_reference: bool = True
     ) -> Tuple[int, bool, Optional[str], Optional[str]]:
         """
-        生成单张图片（带自动重试）
+        生成单张图片
 
         Args:
             page: 页面数据
-            task_id: 任务ID
-            reference_image: 参考图片（封面图）
-            retry_count: 当前重试次数
-            full_outline: 完整的大纲文本
-            user_images: 用户上传的参考图片列表
-            user_topic: 用户原始输入
+            context: 任务上下文（输出目录、参考图、大纲、用户输入）
+            use_reference: 是否使用封面作为参考图
 
         Returns:
             (index, success, filename, error_message)
         """
+        # 参考图统一经过任务的预处理缓存，封面和用户图在任务内只压缩、编码一次
+        reference_image = context.references.prepare(context.cover_image) if use_reference else None
+        user_images = context.references.prepare_many(context.user_images)
+        full_outline = context.full_outline
+        user_topic = context.user_topic
+
         index = page["index"]
         page_type = page["type"]
         page_content = page["content"]
@@ -156,7 +518,7 @@ class ImageService:
                 # 压缩页面特定参考图
                 if page_specific_image_data:
                     original_size = len(page_specific_image_data)
-                    page_specific_image_data = compress_image(page_specific_image_data, max_size_kb=200)
+                    page_specific_image_data = context.references.prepare(page_specific_image_data)
                     logger.debug(f"  使用页面特定参考图 (原始 {original_size} bytes, 压缩后 {len(page_specific_image_data)} bytes)")
             except Exception as e:
                 logger.error(f"  解析页面特定user_image失败或压缩失败: {e}")
@@ -190,50 +552,15 @@ class ImageService:
             # 如果有页面特定参考图，优先使用它
             primary_reference_image = page_specific_image_data if page_specific_image_data else reference_image
 
-            # 调用生成器生成图片
-            if self.provider_config.get('type') == 'google_genai':
-                logger.debug(f"  使用 Google GenAI 生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'gemini-3-pro-image-preview'),
-                    reference_image=primary_reference_image,
-                )
-            elif self.provider_config.get('type') == 'image_api':
-                logger.debug(f"  使用 Image API 生成器")
-                # Image API 支持多张参考图片
-                # 优先级：页面特定图 > 用户全局上传图 > 封面参考图
-                reference_images = []
-                
-                if page_specific_image_data:
-                    reference_images.append(page_specific_image_data)
-
-                if user_images:
-                    reference_images.extend(user_images)
-                
-                if reference_image:
-                    reference_images.append(reference_image)
-
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    aspect_ratio=self.provider_config.get('default_aspect_ratio', '3:4'),
-                    temperature=self.provider_config.get('temperature', 1.0),
-                    model=self.provider_config.get('model', 'nano-banana-2'),
-                    reference_images=reference_images if reference_images else None,
-                )
-            else:
-                logger.debug(f"  使用 OpenAI 兼容生成器")
-                image_data = self.generator.generate_image(
-                    prompt=prompt,
-                    size=self.provider_config.get('default_size', '1024x1024'),
-                    model=self.provider_config.get('model'),
-                    quality=self.provider_config.get('quality', 'standard'),
-                )
+            # 调用生成器生成图片（优先复用缓存，经过自适应并发控制器）
+            image_data = self._generate_or_reuse(
+                prompt, primary_reference_image, page_specific_image_data,
+                reference_image, user_images, use_cache=context.use_cache
+            )
 
-            # 保存图片（使用当前任务目录）
+            # 保存图片（使用任务自己的目录）
             filename = f"{index}.png"
-            self._save_image(image_data, filename, self.current_task_dir)
+            self._save_image(image_data, filename, context)
             logger.info(f"✅ 图片 [{index}] 生成成功: {filename}")
 
             return (index, True, filename, None)
@@ -243,31 +570,64 @@ class ImageService:
             logger.error(f"❌ 图片 [{index}] 生成失败: {error_msg[:200]}")
             return (index, False, None, error_msg)
 
-    def _generate_with_heartbeat(self, *args, **kwargs) -> Generator[Dict[str, Any], None, Tuple[int, bool, Optional[str], Optional[str]]]:
+    def _submit_page(self, page: Dict, context: TaskContext, use_reference: bool = True) -> None:
+        """把单个页面提交到共享线程池，完成后放入任务的完成队列"""
+        future = _get_worker_pool().submit(self._generate_single_image, page, context, use_reference)
+        future.add_done_callback(lambda f: context.completions.put(("page", (page, f))))
+
+    def _submit_pages(
+        self,
+        pages: List[Dict],
+        context: TaskContext,
+        use_reference: bool = True
+    ) -> Generator[Tuple[Optional[Dict], Any], None, None]:
         """
-        Executes _generate_single_image with 2s heartbeat pings to prevent timeout.
-        Returns the result tuple from _generate_single_image.
+        把页面提交到共享线程池，按完成顺序产出结果
+
+        页面完成和缩略图完成都由回调放入任务的完成队列，消费方阻塞等待队列，
+        不轮询单个 future，结果一到立刻处理。
+
+        Yields:
+            - (page, (index, success, filename, error_message))：页面生成结果
+            - (None, event)：期间完成的后处理事件（thumbnail_ready）
+        """
+        for page in pages:
+            self._submit_page(page, context, use_reference)
+
+        remaining = len(pages)
+        while remaining > 0:
+            kind, item = context.completions.get()
+
+            if kind == "postprocess":
+                context.postprocess_consumed()
+                yield None, item
+                continue
+
+            remaining -= 1
+            page, future = item
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (page["index"], False, None, str(e))
+            yield page, result
+
+    def _generate_page(
+        self,
+        page: Dict,
+        context: TaskContext,
+        use_reference: bool = True
+    ) -> Generator[Dict[str, Any], None, Tuple[int, bool, Optional[str], Optional[str]]]:
+        """
+        在共享线程池中生成单个页面并等待结果
+
+        等待期间完成的后处理事件会先产出，页面结果作为返回值（配合 yield from 使用）。
         """
         result = None
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(self._generate_single_image, *args, **kwargs)
-            while True:
-                try:
-                    # Wait for 2 seconds
-                    result = future.result(timeout=2.0)
-                    break
-                except TimeoutError:
-                    # Yield a ping event to keep connection alive
-                    yield {
-                        "event": "ping",
-                        "data": {
-                            "message": "generating..."
-                        }
-                    }
-                except Exception as e:
-                    # If other exception occurs, re-raise it effectively?
-                    # future.result() raises the exception if the call failed.
-                    raise e
+        for page_done, item in self._submit_pages([page], context, use_reference):
+            if page_done is None:
+                yield item
+            else:
+                result = item
         return result
 
     def generate_images(
@@ -276,7 +636,8 @@ class ImageService:
         task_id: str = None,
         full_outline: str = "",
         user_images: Optional[List[bytes]] = None,
-        user_topic: str = ""
+        user_topic: str = "",
+        resume: bool = False
     ) -> Generator[Dict[str, Any], None, None]:
         """
         生成图片（生成器，支持 SSE 流式返回）
@@ -288,6 +649,7 @@ class ImageService:
             full_outline: 完整的大纲文本（用于保持风格一致）
             user_images: 用户上传的参考图片列表（可选）
             user_topic: 用户原始输入（用于保持意图一致）
+            resume: 是否跳过任务目录中已存在的页面（用于恢复中断的任务）
 
         Yields:
             进度事件字典
@@ -297,31 +659,36 @@ class ImageService:
 
         logger.info(f"开始图片生成任务: task_id={task_id}, pages={len(pages)}")
 
-        # 创建任务专属目录
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-        logger.debug(f"任务目录: {self.current_task_dir}")
+        # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
+        compressed_user_images = None
+        if user_images:
+            compressed_user_images = get_image_engine().compress_many(user_images, max_size_kb=200)
+
+        # 创建任务上下文（任务专属目录）
+        context = self._create_task_context(
+            task_id,
+            full_outline=full_outline,
+            user_topic=user_topic,
+            user_images=compressed_user_images
+        )
+        logger.debug(f"任务目录: {context.task_dir}")
 
         total = len(pages)
         generated_images = []
         failed_pages = []
-        cover_image_data = None
 
-        # 压缩用户上传的参考图到200KB以内（减少内存和传输开销）
-        compressed_user_images = None
-        if user_images:
-            compressed_user_images = [compress_image(img, max_size_kb=200) for img in user_images]
+        # 恢复模式：已落盘的页面不再重复生成
+        existing_images = self._find_existing_images(context.task_dir, pages) if resume else {}
+        if existing_images:
+            logger.info(f"恢复任务 {task_id}: 跳过已生成的 {len(existing_images)} 页")
 
         # 初始化任务状态
-        self._task_states[task_id] = {
-            "pages": pages,
-            "generated": {},
-            "failed": {},
-            "cover_image": None,
-            "full_outline": full_outline,
-            "user_images": compressed_user_images,
-            "user_topic": user_topic
-        }
+        self._task_states.create(
+            task_id, pages,
+            full_outline=full_outline,
+            user_topic=user_topic,
+            user_images=compressed_user_images
+        )
 
 
         try:
@@ -340,7 +707,25 @@ class ImageService:
                 cover_page = pages[0]
                 other_pages = pages[1:]
 
-            if cover_page:
+            if cover_page and cover_page["index"] in existing_images:
+                filename = existing_images[cover_page["index"]]
+                generated_images.append(filename)
+                self._task_states.mark_generated(task_id, cover_page["index"], filename)
+                context.cover_image = self._load_cover_reference(context.task_dir, filename)
+                self._task_states.set_cover(task_id, context.cover_image)
+
+                yield {
+                    "event": "complete",
+                    "data": {
+                        "index": cover_page["index"],
+                        "status": "done",
+                        "image_url": f"/api/images/{task_id}/{filename}",
+                        "phase": "cover",
+                        "resumed": True
+                    }
+                }
+
+            elif cover_page:
                 # 发送封面生成进度
                 yield {
                     "event": "progress",
@@ -355,23 +740,15 @@ class ImageService:
                 }
 
                 # 生成封面（使用用户上传的图片作为参考）
-                index, success, filename, error = yield from self._generate_with_heartbeat(
-                    cover_page, task_id, reference_image=None, full_outline=full_outline,
-                    user_images=compressed_user_images, user_topic=user_topic
-                )
+                index, success, filename, error = yield from self._generate_page(cover_page, context)
 
                 if success:
                     generated_images.append(filename)
-                    self._task_states[task_id]["generated"][index] = filename
+                    self._task_states.mark_generated(task_id, index, filename)
 
                     # 读取封面图片作为参考，并立即压缩到200KB以内
-                    cover_path = os.path.join(self.current_task_dir, filename)
-                    with open(cover_path, "rb") as f:
-                        cover_image_data = f.read()
-
-                    # 压缩封面图（减少内存占用和后续传输开销）
-                    cover_image_data = compress_image(cover_image_data, max_size_kb=200)
-                    self._task_states[task_id]["cover_image"] = cover_image_data
+                    context.cover_image = self._load_cover_reference(context.task_dir, filename)
+                    self._task_states.set_cover(task_id, context.cover_image)
 
                     yield {
                         "event": "complete",
@@ -384,7 +761,7 @@ class ImageService:
                     }
                 else:
                     failed_pages.append(cover_page)
-                    self._task_states[task_id]["failed"][index] = error
+                    self._task_states.mark_failed(task_id, index, error)
 
                     yield {
                         "event": "error",
@@ -397,6 +774,25 @@ class ImageService:
                         }
                     }
 
+            # 恢复模式下已存在的内容页直接回报完成
+            for page in other_pages:
+                if page["index"] in existing_images:
+                    filename = existing_images[page["index"]]
+                    generated_images.append(filename)
+                    self._task_states.mark_generated(task_id, page["index"], filename)
+
+                    yield {
+                        "event": "complete",
+                        "data": {
+                            "index": page["index"],
+                            "status": "done",
+                            "image_url": f"/api/images/{task_id}/{filename}",
+                            "phase": "content",
+                            "resumed": True
+                        }
+                    }
+            other_pages = [p for p in other_pages if p["index"] not in existing_images]
+
             # ==================== 第二阶段：生成其他页面 ====================
             if other_pages:
                 # 检查是否启用高并发模式
@@ -415,91 +811,53 @@ class ImageService:
                         }
                     }
 
-                    # 使用线程池并发生成
-                    try:
-                        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-                            # 提交所有任务
-                            future_to_page = {
-                                executor.submit(
-                                    self._generate_single_image,
-                                    page,
-                                    task_id,
-                                    cover_image_data,  # 使用封面作为参考
-                                    0,  # retry_count
-                                    full_outline,  # 传入完整大纲
-                                    compressed_user_images,  # 用户上传的参考图片（已压缩）
-                                    user_topic  # 用户原始输入
-                                ): page
-                                for page in other_pages
+                    # 发送每个页面的进度
+                    for page in other_pages:
+                        yield {
+                            "event": "progress",
+                            "data": {
+                                "index": page["index"],
+                                "status": "generating",
+                                "current": len(generated_images) + 1,
+                                "total": total,
+                                "phase": "content"
                             }
+                        }
+
+                    # 提交到共享线程池并发生成，按完成顺序收集结果
+                    for page, result in self._submit_pages(other_pages, context):
+                        if page is None:
+                            yield result
+                            continue
 
-                            # 发送每个页面的进度
-                            for page in other_pages:
-                                yield {
-                                    "event": "progress",
-                                    "data": {
-                                        "index": page["index"],
-                                        "status": "generating",
-                                        "current": len(generated_images) + 1,
-                                        "total": total,
-                                        "phase": "content"
-                                    }
+                        index, success, filename, error = result
+                        if success:
+                            generated_images.append(filename)
+                            self._task_states.mark_generated(task_id, index, filename)
+
+                            yield {
+                                "event": "complete",
+                                "data": {
+                                    "index": index,
+                                    "status": "done",
+                                    "image_url": f"/api/images/{task_id}/{filename}",
+                                    "phase": "content"
                                 }
+                            }
+                        else:
+                            failed_pages.append(page)
+                            self._task_states.mark_failed(task_id, index, error)
 
-                            # 收集结果
-                            for future in as_completed(future_to_page):
-                                page = future_to_page[future]
-                                try:
-                                    index, success, filename, error = future.result()
-
-                                    if success:
-                                        generated_images.append(filename)
-                                        self._task_states[task_id]["generated"][index] = filename
-
-                                        yield {
-                                            "event": "complete",
-                                            "data": {
-                                                "index": index,
-                                                "status": "done",
-                                                "image_url": f"/api/images/{task_id}/{filename}",
-                                                "phase": "content"
-                                            }
-                                        }
-                                    else:
-                                        failed_pages.append(page)
-                                        self._task_states[task_id]["failed"][index] = error
-
-                                        yield {
-                                            "event": "error",
-                                            "data": {
-                                                "index": index,
-                                                "status": "error",
-                                                "message": error,
-                                                "retryable": True,
-                                                "phase": "content"
-                                            }
-                                        }
-
-                                except Exception as e:
-                                    failed_pages.append(page)
-                                    error_msg = str(e)
-                                    self._task_states[task_id]["failed"][page["index"]] = error_msg
-
-                                    yield {
-                                        "event": "error",
-                                        "data": {
-                                            "index": page["index"],
-                                            "status": "error",
-                                            "message": error_msg,
-                                            "retryable": True,
-                                            "phase": "content"
-                                        }
-                                    }
-                    except Exception as e:
-                        logger.error(f"并发生成失败，尝试降级为顺序生成: {e}")
-                        # 如果并发池彻底失败（如无法创建线程），尝试顺序执行或者直接报错
-                        # 这里选择直接报错，因为资源可能已经枯竭
-                        raise e
+                            yield {
+                                "event": "error",
+                                "data": {
+                                    "index": index,
+                                    "status": "error",
+                                    "message": error,
+                                    "retryable": True,
+                                    "phase": "content"
+                                }
+                            }
                 else:
                     # 顺序模式：逐个生成
                     yield {
@@ -527,19 +885,11 @@ class ImageService:
                         }
 
                         # 生成单张图片
-                        index, success, filename, error = yield from self._generate_with_heartbeat(
-                            page,
-                            task_id,
-                            cover_image_data,
-                            0,
-                            full_outline,  # 传入完整大纲
-                            compressed_user_images,  # 用户上传的参考图片（已压缩）
-                            user_topic  # 用户原始输入
-                        )
+                        index, success, filename, error = yield from self._generate_page(page, context)
 
                         if success:
                             generated_images.append(filename)
-                            self._task_states[task_id]["generated"][index] = filename
+                            self._task_states.mark_generated(task_id, index, filename)
 
                             yield {
                                 "event": "complete",
@@ -552,7 +902,7 @@ class ImageService:
                             }
                         else:
                             failed_pages.append(page)
-                            self._task_states[task_id]["failed"][index] = error
+                            self._task_states.mark_failed(task_id, index, error)
 
                             yield {
                                 "event": "error",
@@ -565,6 +915,9 @@ class ImageService:
                                 }
                             }
 
+            # 等待剩余缩略图完成
+            yield from self._drain_postprocess(context)
+
             # ==================== 完成 ====================
             yield {
                 "event": "finish",
@@ -606,13 +959,244 @@ class ImageService:
                 }
             }
 
+    def generate_images_pipelined(
+        self,
+        outline_events: Iterable[Dict[str, Any]],
+        task_id: str = None,
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流水线模式：边接收大纲流边生成图片（生成器，支持 SSE 流式返回）
+
+        大纲流由后台线程读取，和页面结果、缩略图结果汇入同一个完成队列：
+        - 封面页一闭合就开始生成封面，不等大纲写完
+        - 内容页解析出来后排队，封面参考图就绪后立即提交
+        - 生成提示词时读取当时已输出的大纲（封面通常只能看到大纲的开头部分）
+
+        大纲事件以 outline_ 前缀转发（outline_token / outline_topic / outline_page /
+        outline_complete / outline_error），图片事件与 generate_images 相同；
+        大纲解析完成时发送 status 为 outline_parsed 的 progress 事件，
+        此后的 progress 事件才带 total（总页数）。
+
+        Args:
+            outline_events: OutlineService.generate_outline_stream 产出的事件
+            task_id: 任务 ID（可选）
+            user_images: 用户上传的参考图片列表（可选）
+            user_topic: 用户原始输入
+
+        Yields:
+            进度事件字典
+        """
+        if task_id is None:
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+
+        logger.info(f"开始流水线图片生成任务: task_id={task_id}")
+
+        compressed_user_images = None
+        if user_images:
+            compressed_user_images = get_image_engine().compress_many(user_images, max_size_kb=200)
+
+        context = self._create_task_context(
+            task_id,
+            user_topic=user_topic,
+            user_images=compressed_user_images
+        )
+        self._task_states.create(
+            task_id, [],
+            user_topic=user_topic,
+            user_images=compressed_user_images
+        )
+
+        def pump_outline():
+            try:
+                for event in outline_events:
+                    context.completions.put(("outline", event))
+            except Exception as e:
+                context.completions.put(("outline", {"event": "error", "data": {"message": str(e)}}))
+            finally:
+                context.completions.put(("outline_end", None))
+
+        threading.Thread(target=pump_outline, name=f"outline-{task_id}", daemon=True).start()
+
+        high_concurrency = self.provider_config.get('high_concurrency', False)
+        outline_chunks = []
+        pages: List[Dict] = []
+        cover_page = None
+        cover_state = "pending"     # pending -> running -> done
+        queued_pages: List[Dict] = []
+        in_flight = 0
+        outline_done = False
+        generated_images = []
+        failed_pages = []
+
+        def submit(page: Dict, phase: str):
+            nonlocal in_flight
+            in_flight += 1
+            self._submit_page(page, context)
+            data = {
+                "index": page["index"],
+                "status": "generating",
+                "current": len(generated_images) + 1,
+                "phase": phase
+            }
+            # 大纲解析完成前页数未定，不下发 total
+            if outline_done:
+                data["total"] = len(pages)
+            if phase == "cover":
+                data["message"] = "正在生成封面..."
+            return {"event": "progress", "data": data}
+
+        def submit_queued():
+            """封面就绪后提交排队的内容页（顺序模式下同时只有一页在生成）"""
+            while queued_pages and (high_concurrency or in_flight == 0):
+                yield submit(queued_pages.pop(0), "content")
+
+        try:
+            while not (outline_done and cover_state == "done" and not queued_pages and in_flight == 0):
+                kind, item = context.completions.get()
+
+                if kind == "postprocess":
+                    context.postprocess_consumed()
+                    yield item
+                    continue
+
+                if kind == "outline_end":
+                    outline_done = True
+                    yield {
+                        "event": "progress",
+                        "data": {
+                            "status": "outline_parsed",
+                            "message": f"大纲解析完成，共 {len(pages)} 页",
+                            "current": len(generated_images),
+                            "total": len(pages),
+                            "phase": "outline"
+                        }
+                    }
+                    if cover_page is None:
+                        # 大纲中没有封面页时使用第一页作为封面（同 generate_images）
+                        if queued_pages:
+                            cover_page = queued_pages.pop(0)
+                            cover_state = "running"
+                            yield submit(cover_page, "cover")
+                        else:
+                            cover_state = "done"
+                    self._task_states.set_pages(task_id, pages, context.full_outline)
+                    continue
+
+                if kind == "outline":
+                    name, data = item["event"], item["data"]
+                    if name == "token":
+                        outline_chunks.append(data["text"])
+                        context.full_outline = "".join(outline_chunks)
+                    elif name == "complete":
+                        context.full_outline = data["outline"]
+                    yield {"event": f"outline_{name}", "data": data}
+
+                    if name == "page":
+                        pages.append(data)
+                        if cover_page is None and data["type"] == "cover":
+                            # 封面页闭合，立即开始生成封面
+                            cover_page = data
+                            cover_state = "running"
+                            yield submit(cover_page, "cover")
+                        else:
+                            queued_pages.append(data)
+                            if cover_state == "done":
+                                yield from submit_queued()
+                    continue
+
+                # 页面生成结果
+                in_flight -= 1
+                page, future = item
+                try:
+                    index, success, filename, error = future.result()
+                except Exception as e:
+                    index, success, filename, error = page["index"], False, None, str(e)
+                phase = "cover" if page is cover_page else "content"
+
+                if success:
+                    generated_images.append(filename)
+                    self._task_states.mark_generated(task_id, index, filename)
+                    if phase == "cover":
+                        context.cover_image = self._load_cover_reference(context.task_dir, filename)
+                        self._task_states.set_cover(task_id, context.cover_image)
+                    yield {
+                        "event": "complete",
+                        "data": {
+                            "index": index,
+                            "status": "done",
+                            "image_url": f"/api/images/{task_id}/{filename}",
+                            "phase": phase
+                        }
+                    }
+                else:
+                    failed_pages.append(page)
+                    self._task_states.mark_failed(task_id, index, error)
+                    yield {
+                        "event": "error",
+                        "data": {
+                            "index": index,
+                            "status": "error",
+                            "message": error,
+                            "retryable": True,
+                            "phase": phase
+                        }
+                    }
+
+                if phase == "cover":
+                    cover_state = "done"
+                yield from submit_queued()
+
+            # 等待剩余缩略图完成
+            yield from self._drain_postprocess(context)
+
+            yield {
+                "event": "finish",
+                "data": {
+                    "success": len(failed_pages) == 0 and len(pages) > 0,
+                    "task_id": task_id,
+                    "images": generated_images,
+                    "total": len(pages),
+                    "completed": len(generated_images),
+                    "failed": len(failed_pages),
+                    "failed_indices": [p["index"] for p in failed_pages]
+                }
+            }
+
+        except Exception as e:
+            logger.error(f"❌ 流水线任务未捕获异常: {e}", exc_info=True)
+            yield {
+                "event": "error",
+                "data": {
+                    "index": -1,
+                    "status": "error",
+                    "message": f"服务器内部错误: {str(e)}",
+                    "retryable": True,
+                    "phase": "system"
+                }
+            }
+            yield {
+                "event": "finish",
+                "data": {
+                    "success": False,
+                    "task_id": task_id,
+                    "images": generated_images,
+                    "total": len(pages),
+                    "completed": len(generated_images),
+                    "failed": len(pages) - len(generated_images),
+                    "failed_indices": [p["index"] for p in failed_pages]
+                }
+            }
+
     def retry_single_image(
         self,
         task_id: str,
         page: Dict,
         use_reference: bool = True,
         full_outline: str = "",
-        user_topic: str = ""
+        user_topic: str = "",
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         重试生成单张图片
@@ -623,19 +1207,17 @@ class ImageService:
             use_reference: 是否使用封面作为参考
             full_outline: 完整大纲文本（从前端传入）
             user_topic: 用户原始输入（从前端传入）
+            use_cache: 是否复用生成结果缓存
 
         Returns:
             生成结果
         """
-        self.current_task_dir = os.path.join(self.history_root_dir, task_id)
-        os.makedirs(self.current_task_dir, exist_ok=True)
-
         reference_image = None
         user_images = None
 
-        # 首先尝试从任务状态中获取上下文
-        if task_id in self._task_states:
-            task_state = self._task_states[task_id]
+        # 首先尝试从任务状态中获取上下文（内存中没有时从磁盘恢复）
+        task_state = self._task_states.get(task_id)
+        if task_state is not None:
             if use_reference:
                 reference_image = task_state.get("cover_image")
             # 如果没有传入上下文，则使用任务状态中的
@@ -645,30 +1227,25 @@ class ImageService:
                 user_topic = task_state.get("user_topic", "")
             user_images = task_state.get("user_images")
 
+        context = self._create_task_context(
+            task_id,
+            full_outline=full_outline,
+            user_topic=user_topic,
+            user_images=user_images,
+            cover_image=reference_image,
+            use_cache=use_cache
+        )
+
         # 如果任务状态中没有封面图，尝试从文件系统加载
-        if use_reference and reference_image is None:
-            cover_path = os.path.join(self.current_task_dir, "0.png")
-            if os.path.exists(cover_path):
-                with open(cover_path, "rb") as f:
-                    cover_data = f.read()
+        if use_reference and context.cover_image is None:
+            if os.path.exists(os.path.join(context.task_dir, "0.png")):
                 # 压缩封面图到 200KB
-                reference_image = compress_image(cover_data, max_size_kb=200)
+                context.cover_image = self._load_cover_reference(context.task_dir, "0.png")
 
-        index, success, filename, error = self._generate_single_image(
-            page,
-            task_id,
-            reference_image,
-            0,
-            full_outline,
-            user_images,
-            user_topic
-        )
+        index, success, filename, error = self._generate_single_image(page, context, use_reference)
 
         if success:
-            if task_id in self._task_states:
-                self._task_states[task_id]["generated"][index] = filename
-                if index in self._task_states[task_id]["failed"]:
-                    del self._task_states[task_id]["failed"][index]
+            self._task_states.mark_generated(task_id, index, filename)
 
             return {
                 "success": True,
@@ -698,10 +1275,19 @@ class ImageService:
         Yields:
             进度事件
         """
-        # 获取参考图
+        # 从任务状态中获取参考图和完整大纲
         reference_image = None
-        if task_id in self._task_states:
-            reference_image = self._task_states[task_id].get("cover_image")
+        full_outline = ""
+        task_state = self._task_states.get(task_id)
+        if task_state is not None:
+            reference_image = task_state.get("cover_image")
+            full_outline = task_state.get("full_outline", "")
+
+        context = self._create_task_context(
+            task_id,
+            full_outline=full_outline,
+            cover_image=reference_image
+        )
 
         total = len(pages)
         success_count = 0
@@ -716,67 +1302,37 @@ class ImageService:
         }
 
         # 并发重试
-        # 从任务状态中获取完整大纲
-        full_outline = ""
-        if task_id in self._task_states:
-            full_outline = self._task_states[task_id].get("full_outline", "")
-
-        with ThreadPoolExecutor(max_workers=self.MAX_CONCURRENT) as executor:
-            future_to_page = {
-                executor.submit(
-                    self._generate_single_image,
-                    page,
-                    task_id,
-                    reference_image,
-                    0,  # retry_count
-                    full_outline  # 传入完整大纲
-                ): page
-                for page in pages
-            }
-
-            for future in as_completed(future_to_page):
-                page = future_to_page[future]
-                try:
-                    index, success, filename, error = future.result()
+        for page, result in self._submit_pages(pages, context):
+            if page is None:
+                yield result
+                continue
 
-                    if success:
-                        success_count += 1
-                        if task_id in self._task_states:
-                            self._task_states[task_id]["generated"][index] = filename
-                            if index in self._task_states[task_id]["failed"]:
-                                del self._task_states[task_id]["failed"][index]
+            index, success, filename, error = result
+            if success:
+                success_count += 1
+                self._task_states.mark_generated(task_id, index, filename)
 
-                        yield {
-                            "event": "complete",
-                            "data": {
-                                "index": index,
-                                "status": "done",
-                                "image_url": f"/api/images/{task_id}/{filename}"
-                            }
-                        }
-                    else:
-                        failed_count += 1
-                        yield {
-                            "event": "error",
-                            "data": {
-                                "index": index,
-                                "status": "error",
-                                "message": error,
-                                "retryable": True
-                            }
-                        }
-
-                except Exception as e:
-                    failed_count += 1
-                    yield {
-                        "event": "error",
-                        "data": {
-                            "index": page["index"],
-                            "status": "error",
-                            "message": str(e),
-                            "retryable": True
-                        }
+                yield {
+                    "event": "complete",
+                    "data": {
+                        "index": index,
+                        "status": "done",
+                        "image_url": f"/api/images/{task_id}/{filename}"
+                    }
+                }
+            else:
+                failed_count += 1
+                yield {
+                    "event": "error",
+                    "data": {
+                        "index": index,
+                        "status": "error",
+                        "message": error,
+                        "retryable": True
                     }
+                }
+
+        yield from self._drain_postprocess(context)
 
         yield {
             "event": "retry_finish",
@@ -794,7 +1350,8 @@ class ImageService:
         page: Dict,
         use_reference: bool = True,
         full_outline: str = "",
-        user_topic: str = ""
+        user_topic: str = "",
+        use_cache: bool = False
     ) -> Dict[str, Any]:
         """
         重新生成图片（用户手动触发，即使成功的也可以重新生成）
@@ -805,6 +1362,7 @@ class ImageService:
             use_reference: 是否使用封面作为参考
             full_outline: 完整大纲文本
             user_topic: 用户原始输入
+            use_cache: 是否复用生成结果缓存（默认跳过缓存，保证得到新图片）
 
         Returns:
             生成结果
@@ -812,7 +1370,8 @@ class ImageService:
         return self.retry_single_image(
             task_id, page, use_reference,
             full_outline=full_outline,
-            user_topic=user_topic
+            user_topic=user_topic,
+            use_cache=use_cache
         )
 
     def get_image_path(self, task_id: str, filename: str) -> str:
@@ -830,26 +1389,31 @@ class ImageService:
         return os.path.join(task_dir, filename)
 
     def get_task_state(self, task_id: str) -> Optional[Dict]:
-        """获取任务状态"""
+        """获取任务状态（内存中没有时从磁盘恢复）"""
         return self._task_states.get(task_id)
 
     def cleanup_task(self, task_id: str):
-        """清理任务状态（释放内存）"""
-        if task_id in self._task_states:
-            del self._task_states[task_id]
+        """清理任务状态（释放内存，磁盘上的状态保留）"""
+        self._task_states.evict(task_id)
 
 
 # 全局服务实例
 _service_instance = None
+_service_lock = threading.Lock()
 
 def get_image_service() -> ImageService:
-    """获取全局图片生成服务实例"""
+    """获取全局图片生成服务实例（线程安全）"""
     global _service_instance
-    if _service_instance is None:
-        _service_instance = ImageService()
-    return _service_instance
+    service = _service_instance
+    if service is None:
+        with _service_lock:
+            if _service_instance is None:
+                _service_instance = ImageService()
+            service = _service_instance
+    return service
 
 def reset_image_service():
     """重置全局服务实例（配置更新后调用）"""
     global _service_instance
-    _service_instance = None
+    with _service_lock:
+        _service_instance = None
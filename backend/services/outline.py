@@ -4,11 +4,79 @@ import re
 import base64
 import yaml
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Generator, List, Any, Optional
 from backend.utils.text_client import get_text_chat_client
+from backend.utils.text_cache import get_text_cache, text_cache_key
+from backend.services.registry import get_service_registry, text_service_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# 主题行，格式如 "[主题]：xxx" 或 "[Topic]: xxx"
+_TOPIC_PATTERN = re.compile(r'^\[(?:主题|Topic)\][:：]\s*(.+)$', re.MULTILINE | re.IGNORECASE)
+_PAGE_MARKER = re.compile(r'<page>', re.IGNORECASE)
+
+
+def _detect_page_type(page_text: str) -> str:
+    """根据页面开头的 [封面]/[内容]/[总结] 标记判断页面类型"""
+    type_match = re.match(r"\[(\S+)\]", page_text)
+    if type_match:
+        type_mapping = {
+            "封面": "cover",
+            "内容": "content",
+            "总结": "summary",
+        }
+        return type_mapping.get(type_match.group(1), "content")
+    return "content"
+
+
+class OutlineStreamParser:
+    """
+    流式大纲解析器
+
+    文本逐段输入，每当一个 <page> 块闭合（出现下一个 <page> 标记）就产出该页。
+    页面类型、主题行和索引的处理与 OutlineService._parse_outline 一致；
+    最后一页和旧的 --- 分隔格式在全文解析时补齐。
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self.pages: List[Dict[str, Any]] = []
+        self.derived_topic: Optional[str] = None
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """输入一段文本，返回新闭合的页面"""
+        self._buffer += text
+        closed = []
+        while True:
+            match = _PAGE_MARKER.search(self._buffer)
+            if not match:
+                break
+            segment = self._buffer[:match.start()]
+            self._buffer = self._buffer[match.end():]
+            page = self._close_segment(segment)
+            if page:
+                closed.append(page)
+        return closed
+
+    def _close_segment(self, segment: str) -> Optional[Dict[str, Any]]:
+        if self.derived_topic is None:
+            topic_match = _TOPIC_PATTERN.search(segment)
+            if topic_match:
+                self.derived_topic = topic_match.group(1).strip()
+                segment = segment.replace(topic_match.group(0), "")
+
+        page_text = segment.strip()
+        if not page_text:
+            return None
+
+        page = {
+            "index": len(self.pages),
+            "type": _detect_page_type(page_text),
+            "content": page_text
+        }
+        self.pages.append(page)
+        return page
+
 
 class OutlineService:
     def __init__(self):
@@ -124,7 +192,7 @@ class OutlineService:
         
         # 尝试提取主题行，格式如 "[主题]：xxx" 或 "[Topic]: xxx"
         # 匹配以 [主题] 或 [Topic] 开头的行，忽略大小写
-        topic_match = re.search(r'^\[(?:主题|Topic)\][:：]\s*(.+)$', outline_text, re.MULTILINE | re.IGNORECASE)
+        topic_match = _TOPIC_PATTERN.search(outline_text)
         if topic_match:
             derived_topic = topic_match.group(1).strip()
             # 从原文中移除这一行，避免被解析为页面内容
@@ -147,20 +215,9 @@ class OutlineService:
             # 如果第一段被分割为空（例如主题行在最前面，且后面紧跟分隔符），跳过
             # 或者是被移除主题后留下的空行
             
-            page_type = "content"
-            type_match = re.match(r"\[(\S+)\]", page_text)
-            if type_match:
-                type_cn = type_match.group(1)
-                type_mapping = {
-                    "封面": "cover",
-                    "内容": "content",
-                    "总结": "summary",
-                }
-                page_type = type_mapping.get(type_cn, "content")
-
             pages.append({
                 "index": index,
-                "type": page_type,
+                "type": _detect_page_type(page_text),
                 "content": page_text
             })
 
@@ -170,36 +227,115 @@ class OutlineService:
 
         return pages, derived_topic
 
+    def _build_prompt(self, topic: str, images: Optional[List[bytes]] = None) -> str:
+        """构建大纲提示词"""
+        prompt = self.prompt_template.format(topic=topic)
+
+        if images and len(images) > 0:
+            prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
+            logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
+
+        return prompt
+
+    def _get_provider_config(self) -> Dict[str, Any]:
+        """当前服务商配置"""
+        active_provider = self.text_config.get('active_provider', 'google_gemini')
+        return self.text_config.get('providers', {}).get(active_provider, {})
+
+    def _get_generation_params(self) -> Dict[str, Any]:
+        """从配置中获取模型参数"""
+        provider_config = self._get_provider_config()
+
+        return {
+            "model": provider_config.get('model', 'gemini-2.0-flash-exp'),
+            "temperature": provider_config.get('temperature', 1.0),
+            "max_output_tokens": provider_config.get('max_output_tokens', 8000)
+        }
+
+    def _format_error(self, error_msg: str) -> str:
+        """根据错误类型提供更详细的错误信息"""
+        if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
+            detailed_error = (
+                f"API 认证失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查并更新 API Key"
+            )
+        elif "model" in error_msg.lower() or "404" in error_msg:
+            detailed_error = (
+                f"模型访问失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 模型名称不正确\n"
+                "2. 没有访问该模型的权限\n"
+                "解决方案：在系统设置页面检查模型名称配置"
+            )
+        elif "timeout" in error_msg.lower() or "连接" in error_msg:
+            detailed_error = (
+                f"网络连接失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. 网络连接不稳定\n"
+                "2. API 服务暂时不可用\n"
+                "3. Base URL 配置错误\n"
+                "解决方案：检查网络连接，稍后重试"
+            )
+        elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
+            detailed_error = (
+                f"API 配额限制。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. API 调用次数超限\n"
+                "2. 账户配额用尽\n"
+                "解决方案：等待配额重置，或升级 API 套餐"
+            )
+        else:
+            detailed_error = (
+                f"大纲生成失败。\n"
+                f"错误详情: {error_msg}\n"
+                "可能原因：\n"
+                "1. Text API 配置错误或密钥无效\n"
+                "2. 网络连接问题\n"
+                "3. 模型无法访问或不存在\n"
+                "建议：检查配置文件 text_providers.yaml"
+            )
+
+        return detailed_error
+
+    def _cache_key(self, prompt: str, params: Dict[str, Any], images: Optional[List[bytes]]) -> str:
+        return text_cache_key("outline", self._get_provider_config(), params, prompt, images)
+
+    def _generate_text(
+        self,
+        prompt: str,
+        params: Dict[str, Any],
+        images: Optional[List[bytes]] = None,
+        use_cache: bool = True
+    ) -> str:
+        """调用文本生成 API，启用文本缓存时复用相同请求的结果"""
+        def generate() -> str:
+            return self.client.generate_text(prompt=prompt, images=images, **params)
+
+        cache = get_text_cache()
+        if cache is None:
+            return generate()
+        return cache.get_or_generate(self._cache_key(prompt, params, images), generate, use_cache=use_cache)
+
     def generate_outline(
         self,
         topic: str,
-        images: Optional[List[bytes]] = None
+        images: Optional[List[bytes]] = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         try:
             logger.info(f"开始生成大纲: topic={topic[:50]}..., images={len(images) if images else 0}")
-            prompt = self.prompt_template.format(topic=topic)
-
-            if images and len(images) > 0:
-                prompt += f"\n\n注意：用户提供了 {len(images)} 张参考图片，请在生成大纲时考虑这些图片的内容和风格。这些图片可能是产品图、个人照片或场景图，请根据图片内容来优化大纲，使生成的内容与图片相关联。"
-                logger.debug(f"添加了 {len(images)} 张参考图片到提示词")
-
-            # 从配置中获取模型参数
-            active_provider = self.text_config.get('active_provider', 'google_gemini')
-            providers = self.text_config.get('providers', {})
-            provider_config = providers.get(active_provider, {})
-
-            model = provider_config.get('model', 'gemini-2.0-flash-exp')
-            temperature = provider_config.get('temperature', 1.0)
-            max_output_tokens = provider_config.get('max_output_tokens', 8000)
-
-            logger.info(f"调用文本生成 API: model={model}, temperature={temperature}")
-            outline_text = self.client.generate_text(
-                prompt=prompt,
-                model=model,
-                temperature=temperature,
-                max_output_tokens=max_output_tokens,
-                images=images
-            )
+            prompt = self._build_prompt(topic, images)
+            params = self._get_generation_params()
+
+            logger.info(f"调用文本生成 API: model={params['model']}, temperature={params['temperature']}")
+            outline_text = self._generate_text(prompt, params, images, use_cache=use_cache)
 
             logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
             pages, derived_topic = self._parse_outline(outline_text)
@@ -217,64 +353,96 @@ class OutlineService:
             error_msg = str(e)
             logger.error(f"大纲生成失败: {error_msg}")
 
-            # 根据错误类型提供更详细的错误信息
-            if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower() or "401" in error_msg:
-                detailed_error = (
-                    f"API 认证失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查并更新 API Key"
-                )
-            elif "model" in error_msg.lower() or "404" in error_msg:
-                detailed_error = (
-                    f"模型访问失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 模型名称不正确\n"
-                    "2. 没有访问该模型的权限\n"
-                    "解决方案：在系统设置页面检查模型名称配置"
-                )
-            elif "timeout" in error_msg.lower() or "连接" in error_msg:
-                detailed_error = (
-                    f"网络连接失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. 网络连接不稳定\n"
-                    "2. API 服务暂时不可用\n"
-                    "3. Base URL 配置错误\n"
-                    "解决方案：检查网络连接，稍后重试"
-                )
-            elif "rate" in error_msg.lower() or "429" in error_msg or "quota" in error_msg.lower():
-                detailed_error = (
-                    f"API 配额限制。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. API 调用次数超限\n"
-                    "2. 账户配额用尽\n"
-                    "解决方案：等待配额重置，或升级 API 套餐"
-                )
+            return {
+                "success": False,
+                "error": self._format_error(error_msg)
+            }
+
+    def generate_outline_stream(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None,
+        use_cache: bool = True
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        流式生成大纲
+
+        启用文本缓存且命中时，缓存的大纲作为一个 token 事件一次性输出；
+        同时进行中的相同请求合并为一次服务商调用，后到的请求回放同一份输出。
+
+        Yields:
+            - token: 模型新输出的文本片段
+            - topic: 解析出自动生成的主题
+            - page: 一个 <page> 块闭合后解析出的页面
+            - complete: 全部完成，数据同 generate_outline 的返回值
+            - error: 生成失败
+        """
+        try:
+            logger.info(f"开始流式生成大纲: topic={topic[:50]}..., images={len(images) if images else 0}")
+            prompt = self._build_prompt(topic, images)
+            params = self._get_generation_params()
+
+            def generate_stream():
+                logger.info(f"调用文本生成 API（流式）: model={params['model']}, temperature={params['temperature']}")
+                return self.client.generate_text_stream(prompt=prompt, images=images, **params)
+
+            # 启用文本缓存时，命中直接输出，同时进行中的相同请求只调用一次服务商
+            cache = get_text_cache()
+            if cache is None:
+                stream = generate_stream()
             else:
-                detailed_error = (
-                    f"大纲生成失败。\n"
-                    f"错误详情: {error_msg}\n"
-                    "可能原因：\n"
-                    "1. Text API 配置错误或密钥无效\n"
-                    "2. 网络连接问题\n"
-                    "3. 模型无法访问或不存在\n"
-                    "建议：检查配置文件 text_providers.yaml"
+                stream = cache.stream_or_generate(
+                    self._cache_key(prompt, params, images), generate_stream, use_cache=use_cache
                 )
 
-            return {
-                "success": False,
-                "error": detailed_error
+            parser = OutlineStreamParser()
+            chunks = []
+
+            for text in stream:
+                chunks.append(text)
+                yield {"event": "token", "data": {"text": text}}
+
+                had_topic = parser.derived_topic is not None
+                for page in parser.feed(text):
+                    yield {"event": "page", "data": page}
+                if not had_topic and parser.derived_topic is not None:
+                    yield {"event": "topic", "data": {"topic": parser.derived_topic}}
+
+            outline_text = "".join(chunks)
+            logger.debug(f"API 返回文本长度: {len(outline_text)} 字符")
+
+            # 全文解析补齐最后一页（以及旧的 --- 分隔格式）
+            pages, derived_topic = self._parse_outline(outline_text)
+            if derived_topic and parser.derived_topic is None:
+                yield {"event": "topic", "data": {"topic": derived_topic}}
+            for page in pages[len(parser.pages):]:
+                yield {"event": "page", "data": page}
+
+            logger.info(f"大纲解析完成，共 {len(pages)} 页，自动生成主题: {derived_topic}")
+            yield {
+                "event": "complete",
+                "data": {
+                    "success": True,
+                    "outline": outline_text,
+                    "pages": pages,
+                    "derived_topic": derived_topic,
+                    "has_images": images is not None and len(images) > 0
+                }
             }
 
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"大纲生成失败: {error_msg}")
+            yield {
+                "event": "error",
+                "data": {"message": self._format_error(error_msg)}
+            }
 
 def get_outline_service() -> OutlineService:
     """
     获取大纲生成服务实例
-    每次调用都创建新实例以确保配置是最新的
+    按配置指纹缓存，配置文件、提示词模板或环境变量变化时自动重建
     """
-    return OutlineService()
+    return get_service_registry().get(
+        "outline", OutlineService, text_service_fingerprint("outline_prompt.txt")
+    )
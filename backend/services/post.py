@@ -0,0 +1,218 @@
+"""
+图文一键生成服务
+
+在服务端串起完整流程：大纲（流式）→ 文案 ∥ 图片，并写入历史记录。
+- 图片走流水线模式，封面在大纲写完前就开始生成
+- 大纲完成后创建历史记录，同时在后台线程生成标题、文案、标签，与图片生成并行
+- 整个流程在后台线程中执行，客户端断开后仍会完成并保存结果
+"""
+
+import uuid
+import queue
+import logging
+import threading
+from typing import Any, Dict, Generator, Iterable, List, Optional
+
+from backend.services.outline import get_outline_service
+from backend.services.content import get_content_service
+from backend.services.image import get_image_service
+from backend.services.history import get_history_service, RecordStatus
+
+logger = logging.getLogger(__name__)
+
+# 事件流结束标记
+_END = object()
+
+
+class PostService:
+    """图文一键生成编排服务"""
+
+    def create_post(
+        self,
+        topic: str,
+        images: Optional[List[bytes]] = None,
+        task_id: str = None,
+        use_cache: bool = True
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        一键生成图文（返回事件生成器，支持 SSE 流式返回）
+
+        服务在调用时立即获取，配置错误在这里同步抛出，不会推迟到读取第一个事件时。
+
+        Args:
+            topic: 用户输入的主题
+            images: 用户上传的参考图片（同时用于大纲和图片生成）
+            task_id: 图片任务 ID（可选）
+            use_cache: 大纲和文案是否复用文本生成缓存
+
+        Returns:
+            事件生成器：
+            - outline_*: 大纲进度（同 /pipeline）
+            - history_created: 历史记录已创建 {record_id}
+            - content_complete / content_error: 标题、文案、标签生成结果
+            - progress / complete / error / thumbnail_ready / finish: 图片进度（同 /generate）
+            - post_complete: 全部完成 {record_id, task_id, status, content, images}
+        """
+        # 提前获取服务，配置错误时在返回事件流前抛出
+        outline_service = get_outline_service()
+        content_service = get_content_service()
+        image_service = get_image_service()
+        history_service = get_history_service()
+
+        # 先确定任务 ID，历史记录创建时即可关联图片任务
+        if task_id is None:
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+
+        events: queue.Queue = queue.Queue()
+        worker = _PostWorker(
+            topic, images, task_id, use_cache, events,
+            outline_service, content_service, image_service, history_service
+        )
+        threading.Thread(target=worker.run, name="post-orchestrator", daemon=True).start()
+
+        return _drain(events)
+
+
+def _drain(events: queue.Queue) -> Generator[Dict[str, Any], None, None]:
+    """依次产出后台执行者放入队列的事件，直到结束标记"""
+    while True:
+        event = events.get()
+        if event is _END:
+            break
+        yield event
+
+
+class _PostWorker:
+    """单次一键生成的后台执行者"""
+
+    def __init__(self, topic, images, task_id, use_cache, events,
+                 outline_service, content_service, image_service, history_service):
+        self.topic = topic
+        self.images = images
+        self.task_id = task_id
+        self.use_cache = use_cache
+        self.events = events
+        self.outline_service = outline_service
+        self.content_service = content_service
+        self.image_service = image_service
+        self.history_service = history_service
+
+        self.record_id: Optional[str] = None
+        self.content: Optional[Dict[str, Any]] = None
+        self._content_thread: Optional[threading.Thread] = None
+
+    def emit(self, event: Dict[str, Any]) -> None:
+        self.events.put(event)
+
+    def _tap_outline(self, outline_events: Iterable[Dict[str, Any]]):
+        """透传大纲事件；大纲完成时创建历史记录并开始生成文案"""
+        for event in outline_events:
+            yield event
+            if event["event"] == "complete":
+                self._on_outline_complete(event["data"])
+
+    def _on_outline_complete(self, result: Dict[str, Any]) -> None:
+        outline = {
+            "raw": result["outline"],
+            "pages": result["pages"]
+        }
+        title = result.get("derived_topic") or self.topic
+
+        try:
+            self.record_id = self.history_service.create_record(
+                title, outline, self.task_id, original_text=self.topic
+            )
+            self.history_service.update_record(self.record_id, status=RecordStatus.GENERATING)
+            self.emit({"event": "history_created", "data": {"record_id": self.record_id}})
+        except Exception as e:
+            logger.error(f"❌ 创建历史记录失败: {e}")
+
+        self._content_thread = threading.Thread(
+            target=self._generate_content, args=(result["outline"],),
+            name="post-content", daemon=True
+        )
+        self._content_thread.start()
+
+    def _generate_content(self, outline_text: str) -> None:
+        """生成标题、文案、标签（与图片生成并行）"""
+        result = self.content_service.generate_content(self.topic, outline_text, use_cache=self.use_cache)
+        if not result.get("success"):
+            self.emit({"event": "content_error", "data": {"message": result.get("error")}})
+            return
+
+        self.content = {
+            "titles": result["titles"],
+            "copywriting": result["copywriting"],
+            "tags": result["tags"]
+        }
+        if self.record_id:
+            self.history_service.update_record(self.record_id, content=self.content)
+        self.emit({"event": "content_complete", "data": result})
+
+    def run(self) -> None:
+        generated: List[str] = []
+        failed = 0
+        try:
+            outline_events = self.outline_service.generate_outline_stream(
+                self.topic, self.images, use_cache=self.use_cache
+            )
+            for event in self.image_service.generate_images_pipelined(
+                self._tap_outline(outline_events),
+                task_id=self.task_id,
+                user_images=self.images,
+                user_topic=self.topic
+            ):
+                if event["event"] == "finish":
+                    self.task_id = event["data"]["task_id"]
+                    generated = event["data"]["images"]
+                    failed = event["data"]["failed"]
+                self.emit(event)
+
+            if self._content_thread is not None:
+                self._content_thread.join()
+
+            status = self._finalize(generated, failed)
+            self.emit({
+                "event": "post_complete",
+                "data": {
+                    "success": self.record_id is not None and status == RecordStatus.COMPLETED and self.content is not None,
+                    "record_id": self.record_id,
+                    "task_id": self.task_id,
+                    "status": status,
+                    "content": self.content,
+                    "images": generated
+                }
+            })
+        except Exception as e:
+            logger.error(f"❌ 一键生成未捕获异常: {e}", exc_info=True)
+            self.emit({"event": "post_error", "data": {"message": f"服务器内部错误: {str(e)}"}})
+        finally:
+            self.emit(_END)
+
+    def _finalize(self, generated: List[str], failed: int) -> Optional[str]:
+        """写入最终的图片列表和状态（状态规则同前端生成页）"""
+        if self.record_id is None:
+            return None
+
+        if failed == 0 and generated:
+            status = RecordStatus.COMPLETED
+        elif generated:
+            status = RecordStatus.PARTIAL
+        else:
+            status = RecordStatus.DRAFT
+
+        # 按页面顺序保存，封面在前
+        generated = sorted(generated, key=lambda name: int(name.split('.')[0]))
+        self.history_service.update_record(
+            self.record_id,
+            images={"task_id": self.task_id, "generated": generated},
+            status=status,
+            thumbnail=generated[0] if generated else None
+        )
+        logger.info(f"✅ 一键生成完成: record={self.record_id}, task={self.task_id}, status={status}")
+        return status
+
+
+def get_post_service() -> PostService:
+    """获取图文一键生成服务实例"""
+    return PostService()
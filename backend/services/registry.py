@@ -0,0 +1,122 @@
+"""
+服务实例注册表
+
+大纲、文案等服务在构造时会读取配置文件、提示词模板并创建 API 客户端。
+注册表按"配置指纹"缓存构造好的实例：指纹不变时直接复用，
+配置文件或提示词被修改（mtime/大小变化）、相关环境变量变化，
+或通过 /api/config 保存配置后才重建。
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+_PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "prompts")
+
+
+def file_fingerprint(*paths: str) -> Tuple:
+    """文件指纹（路径 + mtime + 大小），文件不存在时记为 None"""
+    result = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            result.append((path, stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            result.append((path, None))
+    return tuple(result)
+
+
+def text_service_fingerprint(prompt_filename: str) -> Tuple:
+    """文本类服务的配置指纹：text_providers.yaml、提示词模板和 Gemini 环境变量"""
+    return (
+        file_fingerprint(
+            os.path.join(_PROJECT_ROOT, "text_providers.yaml"),
+            os.path.join(_PROMPTS_DIR, prompt_filename)
+        ),
+        os.getenv('GEMINI_API_KEY'),
+        os.getenv('GEMINI_TEXT_MODEL')
+    )
+
+
+class ServiceRegistry:
+    """按配置指纹缓存服务实例（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 名称 -> (指纹, 实例)
+        self._entries: Dict[str, Tuple[Hashable, Any]] = {}
+        # 每次显式失效时递增，保证 mtime 精度不足时也能重建
+        self._generation = 0
+
+    def get(self, name: str, factory: Callable[[], Any], fingerprint: Hashable) -> Any:
+        """
+        获取服务实例，指纹变化时重建
+
+        重建在锁内完成后整体替换，正在使用旧实例的请求不受影响，
+        也不会出现两个请求同时重建同一个服务。
+
+        Args:
+            name: 服务名称
+            factory: 构造函数
+            fingerprint: 当前配置指纹
+
+        Returns:
+            服务实例
+        """
+        key = (self._generation, fingerprint)
+        entry = self._entries.get(name)
+        if entry is not None and entry[0] == key:
+            return entry[1]
+
+        with self._lock:
+            key = (self._generation, fingerprint)
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] == key:
+                return entry[1]
+
+            instance = factory()
+            if entry is not None:
+                logger.info(f"🔄 配置已变化，重建服务: {name}")
+            self._entries[name] = (key, instance)
+            return instance
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """使缓存失效（name 为空时全部失效），下次获取时重建"""
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                self._generation += 1
+            else:
+                self._entries.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """已缓存的服务名称和失效代数"""
+        with self._lock:
+            return {
+                "services": sorted(self._entries.keys()),
+                "generation": self._generation
+            }
+
+
+# 全局注册表实例
+_registry_instance = None
+_registry_lock = threading.Lock()
+
+
+def get_service_registry() -> ServiceRegistry:
+    """获取全局服务注册表"""
+    global _registry_instance
+    if _registry_instance is None:
+        with _registry_lock:
+            if _registry_instance is None:
+                _registry_instance = ServiceRegistry()
+    return _registry_instance
+
+
+def invalidate_services() -> None:
+    """配置保存后调用，使全部缓存的服务失效"""
+    get_service_registry().invalidate()
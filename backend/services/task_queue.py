@@ -0,0 +1,706 @@
+"""
+后台图片生成任务队列
+
+把图片生成从 SSE 请求中解耦：
+- 提交任务后由后台工作线程池执行，客户端断开不会中断生成
+- 客户端可以通过 task_id 随时接入、断开、重新接入任务的事件流，
+  并通过 Last-Event-ID 只补发错过的事件
+- 任务清单持久化到 history/<task_id>/job.json（与 TaskStateStore 共用，
+  队列只写调度字段，页面进度由状态存储写入），进程重启后自动恢复未完成的任务，
+  已生成的页面不会重复生成
+- 流水线任务（大纲 → 图片）同样在后台执行，大纲事件以 outline_ 前缀写入事件通道
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Deque, Generator, List, Optional, Tuple
+from backend.services.image import get_image_service
+from backend.services.outline import get_outline_service
+from backend.services.task_state import (
+    read_job_manifest, update_job_manifest, save_user_images, load_user_images
+)
+from backend.utils.image_engine import get_image_engine
+
+logger = logging.getLogger(__name__)
+
+
+class TaskStatus:
+    """任务状态常量"""
+    QUEUED = "queued"          # 排队中：已提交，等待工作线程
+    RUNNING = "running"        # 执行中：正在生成图片
+    COMPLETED = "completed"    # 已结束：所有页面都已处理（可能有失败页）
+    ERROR = "error"            # 异常：执行过程中出现未捕获的错误
+
+    ACTIVE = (QUEUED, RUNNING)
+
+
+class TaskKind:
+    """任务类型常量"""
+    GENERATE = "generate"      # 批量生成
+    RETRY = "retry"            # 批量重试失败的页面
+    PIPELINE = "pipeline"      # 大纲 → 图片流水线（边生成大纲边生成图片）
+
+
+class TaskChannel:
+    """
+    单个任务的事件通道
+
+    按顺序为每个事件分配递增的序号（SSE 的 id 字段），并在内存中保留最近
+    LOG_SIZE 条事件。订阅者可以随时接入，并通过 Last-Event-ID 只回放错过的事件，
+    断开后不影响任务本身的执行。同一任务的多次运行（生成、批量重试）共用一个通道，
+    序号持续递增。
+    """
+
+    # 每个任务保留的事件条数
+    LOG_SIZE = int(os.getenv('TASK_EVENT_LOG_SIZE', 200))
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=max(1, self.LOG_SIZE))
+        self.last_seq = 0
+        # 本轮运行开始前的最后一个序号，新订阅者默认从这里开始回放
+        self.run_start_seq = 0
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def reopen(self) -> None:
+        """开始新一轮运行（保留事件记录和序号）"""
+        with self._cond:
+            self.run_start_seq = self.last_seq
+            self.closed = False
+            self.closed_at = None
+
+    def publish(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """发布一个事件并唤醒所有订阅者"""
+        with self._cond:
+            self.last_seq += 1
+            entry = {"id": self.last_seq, "event": event["event"], "data": event["data"]}
+            self.events.append(entry)
+            self._cond.notify_all()
+            return entry
+
+    def close(self) -> None:
+        """标记本轮运行结束，订阅者读完剩余事件后退出"""
+        with self._cond:
+            self.closed = True
+            self.closed_at = time.monotonic()
+            self._cond.notify_all()
+
+    def _events_after(self, seq: int) -> List[Dict[str, Any]]:
+        """返回序号大于 seq 的事件（调用方需持有锁）"""
+        if not self.events or seq >= self.last_seq:
+            return []
+        first_seq = self.events[0]["id"]
+        return list(self.events)[max(0, seq - first_seq + 1):]
+
+    def subscribe(
+        self,
+        heartbeat_interval: float,
+        last_event_id: Optional[int] = None,
+        snapshot: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> Generator[Dict[str, Any], None, None]:
+        """
+        订阅事件流
+
+        空闲超过 heartbeat_interval 秒时发送 ping 事件保持连接。
+
+        Args:
+            heartbeat_interval: 心跳间隔（秒）
+            last_event_id: 客户端最后收到的事件序号，为 None 时从本轮运行开始回放
+            snapshot: 错过的事件已被淘汰时，用于构建 resync 快照事件
+
+        Yields:
+            事件字典（带 id 字段的事件会写入 SSE 的 id）
+        """
+        with self._cond:
+            cursor = self.run_start_seq if last_event_id is None else last_event_id
+            oldest = self.events[0]["id"] if self.events else self.last_seq + 1
+            # 错过的事件已不在记录中（或序号来自重启前的进程），先下发任务快照
+            missed_evicted = last_event_id is not None and cursor + 1 < oldest
+            stale = last_event_id is not None and cursor > self.last_seq
+            if stale:
+                cursor = self.run_start_seq
+
+        if (missed_evicted or stale) and snapshot is not None:
+            yield snapshot()
+
+        while True:
+            with self._cond:
+                if cursor >= self.last_seq and not self.closed:
+                    self._cond.wait(timeout=heartbeat_interval)
+                pending = self._events_after(cursor)
+                cursor = self.last_seq
+                finished = self.closed
+
+            if pending:
+                for event in pending:
+                    yield event
+            elif not finished:
+                yield {
+                    "event": "ping",
+                    "data": {
+                        "message": "generating..."
+                    }
+                }
+
+            if finished and cursor >= self.last_seq:
+                return
+
+
+class TaskQueue:
+    """图片生成任务队列"""
+
+    # 同时执行的任务数（服务商调用的总并发由并发控制器统一限制）
+    MAX_WORKERS = int(os.getenv('IMAGE_TASK_WORKERS', 4))
+    # 事件流心跳间隔（秒）
+    HEARTBEAT_INTERVAL = 2.0
+    # 已结束任务的事件通道在内存中保留的时间（秒）
+    FINISHED_TTL = 600
+
+    # 队列负责写入的清单字段（页面、大纲、生成进度等由 TaskStateStore 维护）
+    QUEUE_FIELDS = ("task_id", "kind", "status", "created_at", "updated_at", "retry_pages", "error", "resume")
+
+    def __init__(self, history_root_dir: str = None):
+        """
+        初始化任务队列
+
+        Args:
+            history_root_dir: 历史记录根目录（默认为项目根目录/history）
+        """
+        if history_root_dir is None:
+            history_root_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+        self.history_root_dir = history_root_dir
+        os.makedirs(self.history_root_dir, exist_ok=True)
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, self.MAX_WORKERS),
+            thread_name_prefix="image-task"
+        )
+        self._lock = threading.Lock()
+        self._channels: Dict[str, TaskChannel] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+        logger.info(f"TaskQueue 初始化完成: workers={self.MAX_WORKERS}")
+
+    # ==================== 任务清单持久化 ====================
+
+    def _get_task_dir(self, task_id: str) -> str:
+        return os.path.join(self.history_root_dir, task_id)
+
+    def _save_job(self, job: Dict[str, Any], full: bool = False) -> None:
+        """
+        合并写入任务清单
+
+        Args:
+            job: 内存中的任务
+            full: 是否写入全部字段（只在提交新任务时），否则只写调度字段
+        """
+        fields = job if full else {key: job[key] for key in self.QUEUE_FIELDS if key in job}
+        update_job_manifest(self._get_task_dir(job["task_id"]), fields)
+
+    def _load_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return read_job_manifest(self._get_task_dir(task_id))
+
+    def _update_job(self, task_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is None:
+                return
+            job.update(fields)
+            job["updated_at"] = datetime.now().isoformat()
+            self._save_job(job)
+
+    def _save_user_images(self, task_id: str, user_images: Optional[List[bytes]]) -> int:
+        """
+        把用户参考图保存到任务目录，供恢复任务时使用
+
+        先压缩到与图片服务相同的大小，图片服务初始化任务状态时得到的是同样的数据，不会再写一份。
+        """
+        if not user_images:
+            return 0
+        compressed = get_image_engine().compress_many(user_images, max_size_kb=200)
+        return save_user_images(self._get_task_dir(task_id), compressed)
+
+    # ==================== 提交与订阅 ====================
+
+    def submit(
+        self,
+        pages: list,
+        task_id: str = None,
+        full_outline: str = "",
+        user_images: Optional[List[bytes]] = None,
+        user_topic: str = ""
+    ) -> Tuple[str, bool]:
+        """
+        提交图片生成任务
+
+        同一个 task_id 已在排队或执行中时不会重复提交，直接返回已有任务。
+
+        Args:
+            pages: 页面列表
+            task_id: 任务 ID（可选）
+            full_outline: 完整大纲文本
+            user_images: 用户上传的参考图片列表
+            user_topic: 用户原始输入
+
+        Returns:
+            (task_id, created) - created 为 False 表示复用了进行中的任务
+        """
+        if task_id is None:
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+
+        now = datetime.now().isoformat()
+        job = {
+            "task_id": task_id,
+            "kind": TaskKind.GENERATE,
+            "status": TaskStatus.QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "pages": pages,
+            "full_outline": full_outline,
+            "user_topic": user_topic,
+            "user_image_count": 0,
+            "generated": {},
+            "failed": {},
+            "retry_pages": [],
+            "error": None,
+            "resume": False
+        }
+        if not self._submit_job(job, user_images):
+            logger.info(f"任务已在执行中，直接接入: {task_id}")
+            return task_id, False
+
+        logger.info(f"📥 任务已入队: {task_id}, 共 {len(pages)} 页")
+        return task_id, True
+
+    def submit_pipeline(
+        self,
+        topic: str,
+        task_id: str = None,
+        user_images: Optional[List[bytes]] = None,
+        use_cache: bool = True
+    ) -> Tuple[str, bool]:
+        """
+        提交大纲 → 图片流水线任务
+
+        页面列表在大纲解析过程中逐页确定，提交时为空。
+
+        Args:
+            topic: 用户输入的主题
+            task_id: 任务 ID（可选）
+            user_images: 用户上传的参考图片列表
+            use_cache: 大纲生成是否使用缓存
+
+        Returns:
+            (task_id, created) - created 为 False 表示复用了进行中的任务
+        """
+        if task_id is None:
+            task_id = f"task_{uuid.uuid4().hex[:8]}"
+
+        now = datetime.now().isoformat()
+        job = {
+            "task_id": task_id,
+            "kind": TaskKind.PIPELINE,
+            "status": TaskStatus.QUEUED,
+            "created_at": now,
+            "updated_at": now,
+            "pages": [],
+            "full_outline": "",
+            "user_topic": topic,
+            "user_image_count": 0,
+            "use_cache": use_cache,
+            "generated": {},
+            "failed": {},
+            "retry_pages": [],
+            "error": None,
+            "resume": False
+        }
+        if not self._submit_job(job, user_images):
+            logger.info(f"任务已在执行中，直接接入: {task_id}")
+            return task_id, False
+
+        logger.info(f"📥 流水线任务已入队: {task_id}")
+        return task_id, True
+
+    def submit_retry(self, task_id: str, pages: List[Dict]) -> Tuple[str, bool]:
+        """
+        提交批量重试任务（复用同一个任务的事件通道和清单）
+
+        Args:
+            task_id: 任务 ID
+            pages: 需要重试的页面列表
+
+        Returns:
+            (task_id, created) - created 为 False 表示任务仍在执行中，直接接入
+        """
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is not None and job["status"] in TaskStatus.ACTIVE:
+                logger.info(f"任务仍在执行中，直接接入: {task_id}")
+                return task_id, False
+            job = dict(job) if job is not None else None
+
+        # 内存中没有时从磁盘读取清单（锁外进行）
+        if job is None:
+            job = self._load_job(task_id)
+
+        now = datetime.now().isoformat()
+        new_manifest = job is None
+        if new_manifest:
+            # 旧版本生成的任务没有清单，只记录本次重试的页面
+            job = {
+                "task_id": task_id,
+                "created_at": now,
+                "pages": pages,
+                "full_outline": "",
+                "user_topic": "",
+                "user_image_count": 0,
+                "generated": {},
+                "failed": {},
+                "resume": False
+            }
+        job.update({
+            "kind": TaskKind.RETRY,
+            "status": TaskStatus.QUEUED,
+            "updated_at": now,
+            "retry_pages": pages,
+            "error": None
+        })
+        if not self._submit_job(job, full=new_manifest):
+            logger.info(f"任务仍在执行中，直接接入: {task_id}")
+            return task_id, False
+
+        logger.info(f"📥 重试任务已入队: {task_id}, 共 {len(pages)} 页")
+        return task_id, True
+
+    def _submit_job(
+        self,
+        job: Dict[str, Any],
+        user_images: Optional[List[bytes]] = None,
+        full: bool = True
+    ) -> bool:
+        """
+        登记任务并交给工作线程
+
+        锁内只做去重检查和登记（占用 task_id、打开事件通道），
+        压缩参考图、写入清单等耗时操作在锁外进行，不阻塞其他任务的提交和订阅。
+
+        Args:
+            job: 新任务
+            user_images: 用户上传的参考图片（未压缩）
+            full: 是否写入清单的全部字段
+
+        Returns:
+            False 表示同一任务仍在排队或执行中，未重复提交
+        """
+        task_id = job["task_id"]
+        with self._lock:
+            self._prune_finished()
+            existing = self._jobs.get(task_id)
+            if existing and existing["status"] in TaskStatus.ACTIVE:
+                return False
+            channel = self._register_run(job)
+
+        # task_id 已被占用，同一任务的并发提交会直接接入，这里不会有竞争写入
+        try:
+            os.makedirs(self._get_task_dir(task_id), exist_ok=True)
+            if user_images:
+                job["user_image_count"] = self._save_user_images(task_id, user_images)
+            self._save_job(job, full=full)
+        except Exception as e:
+            logger.error(f"❌ 任务提交失败: {task_id}, {e}")
+            self._update_job(task_id, status=TaskStatus.ERROR, error=str(e))
+            channel.close()
+            raise
+
+        self._executor.submit(self._run, task_id)
+        return True
+
+    def _register_run(self, job: Dict[str, Any]) -> TaskChannel:
+        """登记一轮运行并打开事件通道（调用方需持有锁）"""
+        task_id = job["task_id"]
+        self._jobs[task_id] = job
+        channel = self._channels.get(task_id)
+        if channel is None:
+            channel = TaskChannel(task_id)
+            self._channels[task_id] = channel
+        else:
+            channel.reopen()
+        return channel
+
+    def _start_run(self, job: Dict[str, Any]) -> None:
+        """登记一轮运行并交给工作线程（调用方需持有锁）"""
+        self._register_run(job)
+        self._executor.submit(self._run, job["task_id"])
+
+    def get_job(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务清单（优先内存，其次磁盘）"""
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is not None:
+                return dict(job)
+        return self._load_job(task_id)
+
+    def stream(
+        self,
+        task_id: str,
+        last_event_id: Optional[int] = None
+    ) -> Optional[Generator[Dict[str, Any], None, None]]:
+        """
+        接入任务事件流
+
+        Args:
+            task_id: 任务 ID
+            last_event_id: 客户端最后收到的事件序号（Last-Event-ID），
+                只回放之后的事件；为 None 时回放全部保留的事件
+
+        Returns:
+            事件生成器；任务不存在时返回 None
+        """
+        with self._lock:
+            channel = self._channels.get(task_id)
+        if channel is not None:
+            return channel.subscribe(
+                self.HEARTBEAT_INTERVAL,
+                last_event_id=last_event_id,
+                snapshot=lambda: self._build_snapshot_event(task_id)
+            )
+
+        # 通道已释放（任务早已结束或服务重启过），根据清单补发快照和结束事件
+        job = self._load_job(task_id)
+        if job is None:
+            return None
+        return iter([self._build_snapshot_event(task_id, job), self._build_finish_event(job)])
+
+    def resume_pending(self) -> int:
+        """
+        恢复上次进程退出时仍在排队或执行中的任务
+
+        Returns:
+            恢复的任务数
+        """
+        resumed = 0
+        if not os.path.isdir(self.history_root_dir):
+            return 0
+
+        for item in os.listdir(self.history_root_dir):
+            if not os.path.isdir(self._get_task_dir(item)):
+                continue
+            job = self._load_job(item)
+            if not job or job.get("status") not in TaskStatus.ACTIVE:
+                continue
+
+            with self._lock:
+                if item in self._jobs:
+                    continue
+                job["status"] = TaskStatus.QUEUED
+                job["resume"] = True
+                # 重试任务只需要继续处理尚未成功的页面
+                if job.get("kind") == TaskKind.RETRY:
+                    generated = job.get("generated", {})
+                    job["retry_pages"] = [
+                        p for p in job.get("retry_pages", [])
+                        if str(p["index"]) not in generated
+                    ]
+                self._save_job(job)
+                self._start_run(job)
+
+            resumed += 1
+            logger.info(f"♻️  恢复未完成的任务: {item}, 已完成 {len(job.get('generated', {}))}/{len(job.get('pages', []))} 页")
+
+        return resumed
+
+    # ==================== 执行 ====================
+
+    def _run(self, task_id: str) -> None:
+        """工作线程：执行任务直到结束，不受订阅者断开影响"""
+        with self._lock:
+            job = self._jobs[task_id]
+            channel = self._channels[task_id]
+
+        self._update_job(task_id, status=TaskStatus.RUNNING)
+        logger.info(f"▶️  开始执行任务: {task_id} ({job.get('kind', TaskKind.GENERATE)})")
+
+        try:
+            image_service = get_image_service()
+
+            user_images = load_user_images(self._get_task_dir(task_id), job.get("user_image_count", 0))
+            if job.get("kind") == TaskKind.RETRY:
+                events = image_service.retry_failed_images(task_id, job.get("retry_pages", []))
+            elif job.get("kind") == TaskKind.PIPELINE and not (job.get("resume") and job.get("pages")):
+                # 大纲从头生成，页面进度也从头记录
+                with self._lock:
+                    job.update(pages=[], generated={}, failed={})
+                outline_events = get_outline_service().generate_outline_stream(
+                    job.get("user_topic", ""), user_images, use_cache=job.get("use_cache", True)
+                )
+                events = image_service.generate_images_pipelined(
+                    outline_events, task_id,
+                    user_images=user_images,
+                    user_topic=job.get("user_topic", "")
+                )
+            else:
+                # 流水线任务中断前大纲已解析完成时，按普通任务继续生成剩余页面
+                events = image_service.generate_images(
+                    job["pages"], task_id, job.get("full_outline", ""),
+                    user_images=user_images,
+                    user_topic=job.get("user_topic", ""),
+                    resume=job.get("resume", False)
+                )
+
+            for event in events:
+                # 心跳由订阅者各自产生，不写入事件记录
+                if event["event"] == "ping":
+                    continue
+                self._record_progress(task_id, event)
+                channel.publish(event)
+
+            self._update_job(task_id, status=TaskStatus.COMPLETED)
+            logger.info(f"⏹️  任务执行结束: {task_id}")
+
+        except Exception as e:
+            logger.error(f"❌ 任务执行异常: {task_id}, {e}", exc_info=True)
+            self._update_job(task_id, status=TaskStatus.ERROR, error=str(e))
+            with self._lock:
+                job_snapshot = dict(self._jobs[task_id])
+            channel.publish({
+                "event": "error",
+                "data": {
+                    "index": -1,
+                    "status": "error",
+                    "message": f"服务器内部错误: {str(e)}",
+                    "retryable": True,
+                    "phase": "system"
+                }
+            })
+            channel.publish(self._build_finish_event(job_snapshot))
+
+        finally:
+            channel.close()
+
+    def _record_progress(self, task_id: str, event: Dict[str, Any]) -> None:
+        """
+        根据事件更新内存中的页面进度（用于快照和结束事件）
+
+        磁盘上的进度由图片服务通过 TaskStateStore 写入同一份清单，这里不再重复写盘。
+        """
+        event_type = event["event"]
+        data = event["data"]
+        index = data.get("index")
+
+        if event_type == "outline_page":
+            # 流水线任务的页面列表随大纲解析逐页确定（快照和结束事件的 total 依赖它）
+            with self._lock:
+                job = self._jobs.get(task_id)
+                if job is not None:
+                    job["pages"].append(data)
+            return
+
+        if index is None or index < 0:
+            return
+
+        with self._lock:
+            job = self._jobs.get(task_id)
+            if job is None:
+                return
+            key = str(index)
+            if event_type == "complete":
+                job["generated"][key] = os.path.basename(data.get("image_url", ""))
+                job["failed"].pop(key, None)
+            elif event_type == "error":
+                job["failed"][key] = data.get("message")
+
+    def _build_snapshot_event(self, task_id: str, job: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        构建任务快照事件（resync）
+
+        客户端错过的事件已被淘汰时下发，客户端据此整体校正页面状态，
+        之后再继续接收增量事件。
+        """
+        if job is None:
+            job = self.get_job(task_id) or {"task_id": task_id}
+
+        return {
+            "event": "resync",
+            "data": {
+                "task_id": task_id,
+                "status": job.get("status"),
+                "total": len(job.get("pages", [])),
+                "generated": {
+                    k: f"/api/images/{task_id}/{v}"
+                    for k, v in job.get("generated", {}).items()
+                },
+                "failed": job.get("failed", {})
+            }
+        }
+
+    def _build_finish_event(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """根据任务清单构建结束事件（重试任务为 retry_finish）"""
+        generated = job.get("generated", {})
+        failed = job.get("failed", {})
+
+        if job.get("kind") == TaskKind.RETRY:
+            retry_indices = [str(p["index"]) for p in job.get("retry_pages", [])]
+            completed = len([i for i in retry_indices if i in generated])
+            return {
+                "event": "retry_finish",
+                "data": {
+                    "success": completed == len(retry_indices),
+                    "total": len(retry_indices),
+                    "completed": completed,
+                    "failed": len(retry_indices) - completed
+                }
+            }
+
+        total = len(job.get("pages", []))
+        images = [generated[k] for k in sorted(generated, key=int)]
+        failed_indices = sorted(int(k) for k in failed)
+
+        return {
+            "event": "finish",
+            "data": {
+                "success": job.get("status") == TaskStatus.COMPLETED and not failed and len(images) == total,
+                "task_id": job["task_id"],
+                "images": images,
+                "total": total,
+                "completed": len(images),
+                "failed": total - len(images),
+                "failed_indices": failed_indices
+            }
+        }
+
+    def _prune_finished(self) -> None:
+        """释放已结束较久的任务通道（调用方需持有锁）"""
+        now = time.monotonic()
+        expired = [
+            task_id for task_id, channel in self._channels.items()
+            if channel.closed and channel.closed_at is not None
+            and now - channel.closed_at > self.FINISHED_TTL
+        ]
+        for task_id in expired:
+            del self._channels[task_id]
+            self._jobs.pop(task_id, None)
+
+
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+
+def get_task_queue() -> TaskQueue:
+    """获取全局任务队列实例"""
+    global _queue_instance
+    if _queue_instance is None:
+        with _queue_lock:
+            if _queue_instance is None:
+                _queue_instance = TaskQueue()
+    return _queue_instance
@@ -0,0 +1,318 @@
+"""
+图片生成任务状态存储
+
+保存重试所需的任务上下文（页面列表、大纲、用户输入、参考图、生成结果）：
+- 内存层：LRU + TTL，只保留最近活跃的任务，避免长时间运行后内存无限增长
+- 磁盘层：与 TaskQueue 共用任务清单 history/<task_id>/job.json 和 refs/ 下的参考图，
+  每个任务只有一份清单、一份参考图；内存中被淘汰或服务重建后，读取时自动从磁盘恢复
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from backend.utils.file_lock import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+# 任务目录中的文件（TaskQueue 与 TaskStateStore 共用）
+JOB_FILENAME = "job.json"
+REFS_DIRNAME = "refs"
+COVER_FILENAME = "cover_ref.bin"
+USER_IMAGE_PATTERN = "user_{}.bin"
+
+# 清单的读-改-写在进程内串行：任务队列和状态存储会更新同一份清单的不同字段
+_manifest_lock = threading.RLock()
+
+
+def read_job_manifest(task_dir: str) -> Optional[Dict[str, Any]]:
+    """读取任务清单，不存在或损坏时返回 None"""
+    path = os.path.join(task_dir, JOB_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"读取任务清单失败: {path}, {e}")
+        return None
+
+
+def update_job_manifest(task_dir: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    合并写入任务清单（原子替换）
+
+    只覆盖 fields 中的字段，清单中的其他字段保持不变。
+
+    Returns:
+        写入后的完整清单
+    """
+    with _manifest_lock:
+        os.makedirs(task_dir, exist_ok=True)
+        manifest = read_job_manifest(task_dir) or {}
+        manifest.update(fields)
+        atomic_write_json(os.path.join(task_dir, JOB_FILENAME), manifest)
+        return manifest
+
+
+def _write_ref(path: str, data: bytes) -> None:
+    """原子写入参考图，内容相同的文件已存在时跳过"""
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_ref(path: str) -> Optional[bytes]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def save_user_images(task_dir: str, user_images: Optional[List[bytes]]) -> int:
+    """
+    保存用户参考图到 refs/user_{i}.bin（已存在且内容相同的不再重写）
+
+    Returns:
+        保存的张数
+    """
+    for i, img in enumerate(user_images or []):
+        _write_ref(os.path.join(task_dir, REFS_DIRNAME, USER_IMAGE_PATTERN.format(i)), img)
+    return len(user_images or [])
+
+
+def load_user_images(task_dir: str, count: int) -> Optional[List[bytes]]:
+    """读取用户参考图，没有时返回 None"""
+    images = []
+    for i in range(count or 0):
+        img = _read_ref(os.path.join(task_dir, REFS_DIRNAME, USER_IMAGE_PATTERN.format(i)))
+        if img is not None:
+            images.append(img)
+    return images or None
+
+
+class TaskStateStore:
+    """任务状态存储（内存 LRU/TTL + 磁盘持久化）"""
+
+    # 内存中最多保留的任务数
+    MAX_ENTRIES = int(os.getenv('TASK_STATE_CACHE_SIZE', 32))
+    # 内存中任务状态的过期时间（秒，按最近访问时间计算）
+    TTL = int(os.getenv('TASK_STATE_TTL', 1800))
+
+    def __init__(self, history_root_dir: str = None):
+        """
+        初始化任务状态存储
+
+        Args:
+            history_root_dir: 历史记录根目录（默认为项目根目录/history）
+        """
+        if history_root_dir is None:
+            history_root_dir = os.path.join(
+                os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                "history"
+            )
+        self.history_root_dir = history_root_dir
+        os.makedirs(self.history_root_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # task_id -> (最近访问时间, 状态)
+        self._states: "OrderedDict[str, tuple]" = OrderedDict()
+
+    # ==================== 路径 ====================
+
+    def _get_task_dir(self, task_id: str) -> str:
+        return os.path.join(self.history_root_dir, task_id)
+
+    # ==================== 磁盘层 ====================
+
+    def _save_state(self, task_id: str, state: Dict[str, Any]) -> None:
+        """把任务状态合并写入任务清单（不含参考图二进制数据）"""
+        update_job_manifest(self._get_task_dir(task_id), {
+            "task_id": task_id,
+            "pages": state.get("pages", []),
+            "generated": {str(k): v for k, v in state.get("generated", {}).items()},
+            "failed": {str(k): v for k, v in state.get("failed", {}).items()},
+            "full_outline": state.get("full_outline", ""),
+            "user_topic": state.get("user_topic", ""),
+            "user_image_count": len(state.get("user_images") or []),
+            "has_cover": state.get("cover_image") is not None
+        })
+
+    def _load_state(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """从任务清单和参考图恢复任务状态"""
+        task_dir = self._get_task_dir(task_id)
+        data = read_job_manifest(task_dir)
+        if data is None:
+            return None
+
+        cover_image = None
+        if data.get("has_cover"):
+            cover_image = _read_ref(os.path.join(task_dir, REFS_DIRNAME, COVER_FILENAME))
+
+        logger.debug(f"从磁盘恢复任务状态: {task_id}")
+        return {
+            "pages": data.get("pages", []),
+            "generated": {int(k): v for k, v in data.get("generated", {}).items()},
+            "failed": {int(k): v for k, v in data.get("failed", {}).items()},
+            "cover_image": cover_image,
+            "full_outline": data.get("full_outline", ""),
+            "user_images": load_user_images(task_dir, data.get("user_image_count", 0)),
+            "user_topic": data.get("user_topic", "")
+        }
+
+    # ==================== 内存层 ====================
+
+    def _remember(self, task_id: str, state: Dict[str, Any]) -> None:
+        """放入内存层并淘汰过期/超量的任务（调用方需持有锁）"""
+        self._states[task_id] = (time.time(), state)
+        self._states.move_to_end(task_id)
+        self._evict()
+
+    def _evict(self) -> None:
+        """淘汰过期和超出容量的任务（调用方需持有锁）"""
+        now = time.time()
+        expired = [tid for tid, (ts, _) in self._states.items() if now - ts > self.TTL]
+        for tid in expired:
+            del self._states[tid]
+
+        while len(self._states) > max(1, self.MAX_ENTRIES):
+            tid, _ = self._states.popitem(last=False)
+            logger.debug(f"任务状态移出内存: {tid}")
+
+    def _get_cached(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务状态（内存未命中时从磁盘恢复，调用方需持有锁）"""
+        entry = self._states.get(task_id)
+        if entry is not None:
+            state = entry[1]
+        else:
+            state = self._load_state(task_id)
+            if state is None:
+                return None
+        self._remember(task_id, state)
+        return state
+
+    # ==================== 对外接口 ====================
+
+    def create(
+        self,
+        task_id: str,
+        pages: List[Dict],
+        full_outline: str = "",
+        user_topic: str = "",
+        user_images: Optional[List[bytes]] = None
+    ) -> Dict[str, Any]:
+        """
+        初始化任务状态（覆盖已有状态）
+
+        Args:
+            task_id: 任务ID
+            pages: 页面列表
+            full_outline: 完整大纲文本
+            user_topic: 用户原始输入
+            user_images: 用户上传的参考图（已压缩）
+
+        Returns:
+            任务状态
+        """
+        state = {
+            "pages": pages,
+            "generated": {},
+            "failed": {},
+            "cover_image": None,
+            "full_outline": full_outline,
+            "user_images": user_images,
+            "user_topic": user_topic
+        }
+
+        with self._lock:
+            # 任务队列提交时已保存过相同的参考图，这里不会重复写入
+            save_user_images(self._get_task_dir(task_id), user_images)
+            self._save_state(task_id, state)
+            self._remember(task_id, state)
+
+        return state
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态，内存中没有时从磁盘恢复"""
+        with self._lock:
+            return self._get_cached(task_id)
+
+    def set_pages(self, task_id: str, pages: List[Dict], full_outline: Optional[str] = None) -> None:
+        """更新页面列表和大纲（流水线模式下大纲边生成边解析）"""
+        with self._lock:
+            state = self._get_cached(task_id)
+            if state is None:
+                return
+            state["pages"] = pages
+            if full_outline is not None:
+                state["full_outline"] = full_outline
+            self._save_state(task_id, state)
+
+    def set_cover(self, task_id: str, cover_image: bytes) -> None:
+        """保存封面参考图（已压缩）"""
+        with self._lock:
+            state = self._get_cached(task_id)
+            if state is None:
+                return
+            state["cover_image"] = cover_image
+            _write_ref(os.path.join(self._get_task_dir(task_id), REFS_DIRNAME, COVER_FILENAME), cover_image)
+            self._save_state(task_id, state)
+
+    def mark_generated(self, task_id: str, index: int, filename: str) -> None:
+        """记录页面生成成功"""
+        with self._lock:
+            state = self._get_cached(task_id)
+            if state is None:
+                return
+            state["generated"][index] = filename
+            state["failed"].pop(index, None)
+            self._save_state(task_id, state)
+
+    def mark_failed(self, task_id: str, index: int, error: str) -> None:
+        """记录页面生成失败"""
+        with self._lock:
+            state = self._get_cached(task_id)
+            if state is None:
+                return
+            state["failed"][index] = error
+            self._save_state(task_id, state)
+
+    def evict(self, task_id: str) -> None:
+        """把任务状态移出内存（磁盘上的状态保留，可再次恢复）"""
+        with self._lock:
+            self._states.pop(task_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """内存层统计信息"""
+        with self._lock:
+            self._evict()
+            return {
+                "cached": len(self._states),
+                "max_entries": self.MAX_ENTRIES,
+                "ttl": self.TTL
+            }
+
+
+# 全局存储实例（不随 ImageService 重建而丢失）
+_store_instance = None
+_store_lock = threading.Lock()
+
+
+def get_task_state_store() -> TaskStateStore:
+    """获取全局任务状态存储实例"""
+    global _store_instance
+    if _store_instance is None:
+        with _store_lock:
+            if _store_instance is None:
+                _store_instance = TaskStateStore()
+    return _store_instance
@@ -0,0 +1,478 @@
+"""服务商并发控制工具（AIMD 自适应并发）"""
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ErrorKind:
+    """服务商错误分类"""
+    THROTTLE = "throttle"    # 429 / 配额或速率限制
+    SERVER = "server"        # 5xx 服务端错误
+    CLIENT = "client"        # 其他错误（参数、认证、安全过滤等），不影响并发
+
+
+def _get_header(headers, name: str) -> Optional[str]:
+    """不区分大小写地读取响应头"""
+    if not headers:
+        return None
+    try:
+        value = headers.get(name)
+        if value is None:
+            value = headers.get(name.lower())
+        return value
+    except Exception:
+        return None
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    支持秒数和 HTTP 日期两种格式
+
+    Returns:
+        需要等待的秒数，没有该响应头时返回 None
+    """
+    value = _get_header(headers, 'Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _parse_reset_seconds(value: Optional[str]) -> Optional[float]:
+    """解析 x-ratelimit-reset-* 响应头（如 "1.5"、"20s"、"6m0s"、"120ms"）"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    total = 0.0
+    matched = False
+    for amount, unit in re.findall(r'([\d.]+)\s*(ms|h|m|s)', value):
+        matched = True
+        amount = float(amount)
+        total += {'ms': amount / 1000, 's': amount, 'm': amount * 60, 'h': amount * 3600}[unit]
+    return total if matched else None
+
+
+def parse_rate_limit_headers(headers) -> Dict[str, Optional[float]]:
+    """
+    解析 x-ratelimit-* 响应头
+
+    Returns:
+        - remaining: 当前窗口剩余请求数
+        - reset: 距离窗口重置的秒数
+    """
+    remaining = None
+    for name in ('x-ratelimit-remaining-requests', 'x-ratelimit-remaining'):
+        value = _get_header(headers, name)
+        if value is not None:
+            try:
+                remaining = float(value)
+                break
+            except ValueError:
+                continue
+
+    reset = None
+    for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset'):
+        reset = _parse_reset_seconds(_get_header(headers, name))
+        if reset is not None:
+            break
+
+    return {"remaining": remaining, "reset": reset}
+
+
+# 错误信息中明确标注的 5xx 状态码（状态码: 503 / status code 503 / status=503 / HTTP 503）
+_STATUS_5XX_PATTERN = re.compile(r'(?:状态码|status(?:[\s_]*code)?|http)\s*[:：=]?\s*(5\d\d)\b')
+
+
+def classify_provider_error(error: Exception) -> Tuple[str, Optional[float]]:
+    """
+    对服务商调用异常分类
+
+    优先使用异常携带的状态码（ImageProviderError.status_code，或 SDK 异常的
+    status / code）和响应头；没有状态码时才根据错误信息判断，5xx 只认
+    "状态码: 503"、"status code 503"、"HTTP 503" 这类明确的写法，
+    避免把错误信息里的尺寸、字数等数字误判为服务端错误。
+
+    Returns:
+        (错误分类, Retry-After 秒数)
+    """
+    status = None
+    for attr in ('status_code', 'status', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int) and not isinstance(value, bool):
+            status = value
+            break
+    headers = getattr(error, 'headers', None)
+    if headers is None and getattr(error, 'response', None) is not None:
+        headers = getattr(error.response, 'headers', None)
+
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        retry_after = parse_retry_after(headers)
+
+    if not isinstance(status, int):
+        message = str(error).lower()
+        if re.search(r'\b429\b', message) or 'resource_exhausted' in message or '速率限制' in message:
+            status = 429
+        else:
+            match = _STATUS_5XX_PATTERN.search(message)
+            if match:
+                status = int(match.group(1))
+
+    if status == 429:
+        return ErrorKind.THROTTLE, retry_after
+    if isinstance(status, int) and 500 <= status < 600:
+        return ErrorKind.SERVER, retry_after
+    return ErrorKind.CLIENT, retry_after
+
+
+class TokenBucket:
+    """
+    令牌桶限速器（每分钟请求数）
+
+    桶容量为 burst，令牌按 rate_per_minute / 60 的速度匀速补充，
+    取不到令牌时阻塞等待，保证任意一分钟内的请求数不超过上限。
+    """
+
+    def __init__(self, rate_per_minute: float, burst: Optional[int] = None):
+        self._lock = threading.Lock()
+        self.configure(rate_per_minute, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def configure(self, rate_per_minute: float, burst: Optional[int] = None) -> None:
+        """更新速率和桶容量"""
+        with self._lock:
+            self.rate_per_minute = float(rate_per_minute)
+            self.capacity = max(1, int(burst if burst else max(1.0, rate_per_minute / 60)))
+            if hasattr(self, '_tokens'):
+                self._tokens = min(self._tokens, float(self.capacity))
+
+    def _refill(self, now: float) -> None:
+        """补充令牌（调用方需持有锁）"""
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(float(self.capacity), self._tokens + elapsed * self.rate_per_minute / 60)
+
+    def acquire(self) -> float:
+        """
+        取一个令牌，必要时阻塞等待
+
+        Returns:
+            实际等待的秒数
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_time = (1 - self._tokens) * 60 / self.rate_per_minute
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def available(self) -> float:
+        """当前可用令牌数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 自适应并发控制器
+
+    - 加性增：调用成功、延迟正常、且并发已用满时，每轮（约 limit 次成功）并发上限 +1
+    - 乘性减：遇到 429 / 5xx 或限流响应头时，并发上限乘以 DECREASE_FACTOR，
+      并在 Retry-After / 窗口重置前暂停发放新的调用许可
+    """
+
+    DECREASE_FACTOR = 0.5        # 限流时的乘性减系数
+    SLOW_DECREASE_FACTOR = 0.9   # 延迟明显变慢时的温和下降系数
+    LATENCY_TOLERANCE = 2.0      # 延迟超过基线的倍数视为变慢
+    LATENCY_ALPHA = 0.2          # 延迟基线的指数平滑系数
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int,
+        min_limit: int = 1,
+        max_limit: int = 8,
+        requests_per_minute: float = 0
+    ):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+        # 每分钟请求数上限（0 表示不限制）
+        self._bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+
+        self._cooldown_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_baseline: Optional[float] = None
+
+        self._successes = 0
+        self._throttles = 0
+        self._server_errors = 0
+        self._client_errors = 0
+
+    @property
+    def limit(self) -> int:
+        """当前并发上限"""
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def requests_per_minute(self) -> float:
+        """每分钟请求数上限（0 表示不限制）"""
+        return self._bucket.rate_per_minute if self._bucket else 0
+
+    def configure(self, min_limit: int, max_limit: int, requests_per_minute: float = 0) -> None:
+        """更新并发上下限和速率上限（配置变更时调用，保留已学习到的并发上限）"""
+        with self._cond:
+            self.min_limit = max(1, min_limit)
+            self.max_limit = max(self.min_limit, max_limit)
+            self._limit = min(max(self._limit, self.min_limit), self.max_limit)
+
+            if requests_per_minute <= 0:
+                self._bucket = None
+            elif self._bucket is None:
+                self._bucket = TokenBucket(requests_per_minute)
+            else:
+                self._bucket.configure(requests_per_minute)
+
+            self._cond.notify_all()
+
+    def acquire(self) -> None:
+        """获取一个调用许可（并发已满或处于冷却期时阻塞）"""
+        with self._cond:
+            while True:
+                wait_time = self._cooldown_until - time.monotonic()
+                if wait_time > 0:
+                    self._cond.wait(timeout=wait_time)
+                    continue
+                if self._in_flight < self.limit:
+                    self._in_flight += 1
+                    return
+                self._cond.wait()
+
+    def release(self) -> None:
+        """归还调用许可"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def track(self):
+        """
+        获取许可并统计本次调用结果
+
+        调用方可以把成功响应的响应头写入 yield 出的字典的 headers 字段，
+        用于感知 x-ratelimit-* 限流信号。
+        """
+        self.acquire()
+        bucket = self._bucket
+        if bucket is not None:
+            try:
+                waited = bucket.acquire()
+            except BaseException:
+                self.release()
+                raise
+            if waited > 0:
+                logger.debug(f"[{self.name}] 达到每分钟请求上限，等待 {waited:.1f}s")
+        call: Dict[str, Any] = {"headers": None}
+        start = time.monotonic()
+        error: Optional[Exception] = None
+        succeeded = False
+        try:
+            yield call
+            succeeded = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # GeneratorExit / KeyboardInterrupt 等也要归还许可（如 SSE 客户端断开时），只是不计入统计
+            self.release()
+            if error is not None:
+                self.record_failure(error)
+            elif succeeded:
+                self.record_success(time.monotonic() - start, call.get("headers"))
+
+    def record_success(self, latency: float, headers=None) -> None:
+        """记录一次成功调用"""
+        rate_limit = parse_rate_limit_headers(headers)
+
+        with self._cond:
+            self._successes += 1
+
+            if rate_limit["remaining"] is not None and rate_limit["remaining"] <= 0:
+                # 配额窗口已用尽：等到窗口重置再继续
+                self._decrease(self.DECREASE_FACTOR, rate_limit["reset"])
+                return
+
+            baseline = self._latency_baseline
+            self._latency_baseline = latency if baseline is None else (
+                (1 - self.LATENCY_ALPHA) * baseline + self.LATENCY_ALPHA * latency
+            )
+
+            if baseline is not None and latency > baseline * self.LATENCY_TOLERANCE:
+                self._decrease(self.SLOW_DECREASE_FACTOR)
+                return
+
+            # 剩余配额不足以支撑更高并发时不再增长
+            if rate_limit["remaining"] is not None and rate_limit["remaining"] < self._limit + 1:
+                return
+
+            # 只有并发确实被用满时才增长，避免空闲时上限虚高
+            if self._in_flight + 1 >= self.limit and self._limit < self.max_limit:
+                old_limit = self.limit
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                if self.limit != old_limit:
+                    logger.info(f"📈 [{self.name}] 并发上限提升: {old_limit} -> {self.limit}")
+                self._cond.notify_all()
+
+    def record_failure(self, error: Exception) -> None:
+        """根据异常类型调整并发"""
+        kind, retry_after = classify_provider_error(error)
+
+        with self._cond:
+            if kind == ErrorKind.THROTTLE:
+                self._throttles += 1
+                self._decrease(self.DECREASE_FACTOR, retry_after)
+            elif kind == ErrorKind.SERVER:
+                self._server_errors += 1
+                self._decrease(self.DECREASE_FACTOR, retry_after)
+            else:
+                self._client_errors += 1
+
+    def _decrease(self, factor: float, cooldown: Optional[float] = None) -> None:
+        """乘性减（调用方需持有锁）"""
+        now = time.monotonic()
+
+        if cooldown:
+            self._cooldown_until = max(self._cooldown_until, now + cooldown)
+            logger.warning(f"⏳ [{self.name}] 服务商要求等待 {cooldown:.1f}s 后再发起请求")
+
+        # 同一波并发请求同时失败时只下降一次
+        window = self._latency_baseline or 1.0
+        if now - self._last_decrease < window:
+            return
+        self._last_decrease = now
+
+        old_limit = self.limit
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        if self.limit != old_limit:
+            logger.warning(f"📉 [{self.name}] 并发上限下降: {old_limit} -> {self.limit}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """获取当前状态"""
+        with self._cond:
+            cooldown = max(0.0, self._cooldown_until - time.monotonic())
+            return {
+                "provider": self.name,
+                "limit": self.limit,
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "requests_per_minute": self.requests_per_minute,
+                "available_requests": round(self._bucket.available(), 2) if self._bucket else None,
+                "cooldown_seconds": round(cooldown, 2),
+                "latency_baseline": round(self._latency_baseline, 2) if self._latency_baseline else None,
+                "successes": self._successes,
+                "throttles": self._throttles,
+                "server_errors": self._server_errors,
+                "client_errors": self._client_errors
+            }
+
+
+# 每个服务商账号一个控制器，进程内所有任务共享，服务实例重建后仍保留已学习到的并发上限
+_limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _provider_key(provider_name: str, provider_config: Dict[str, Any]) -> str:
+    """
+    计算服务商账号标识
+
+    同一类型、同一地址、同一 API Key 的服务商共享配额，
+    即使在配置中以不同名称出现也使用同一个控制器。
+    """
+    api_key = provider_config.get('api_key') or ''
+    if not api_key:
+        return f"name:{provider_name}"
+    key_hash = hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    provider_type = provider_config.get('type', provider_name)
+    base_url = (provider_config.get('base_url') or '').rstrip('/')
+    return f"{provider_type}|{base_url}|{key_hash}"
+
+
+def get_concurrency_limiter(
+    provider_name: str,
+    provider_config: Dict[str, Any],
+    initial_limit: int = 2
+) -> AdaptiveConcurrencyLimiter:
+    """
+    获取服务商的并发控制器
+
+    配置项（image_providers.yaml 中的服务商配置）：
+    - min_concurrency: 并发下限（默认 1）
+    - max_concurrency: 全局并发上限，所有任务合计（默认 IMAGE_MAX_CONCURRENCY 环境变量，8）
+    - initial_concurrency: 初始并发（默认 initial_limit）
+    - requests_per_minute: 每分钟请求数上限，所有任务合计
+      （默认 IMAGE_REQUESTS_PER_MINUTE 环境变量，0 表示不限制）
+
+    Args:
+        provider_name: 服务商名称
+        provider_config: 服务商配置
+        initial_limit: 默认初始并发
+
+    Returns:
+        AdaptiveConcurrencyLimiter
+    """
+    min_limit = max(1, int(provider_config.get('min_concurrency', 1)))
+    max_limit = max(min_limit, int(provider_config.get('max_concurrency', os.getenv('IMAGE_MAX_CONCURRENCY', 8))))
+    rpm = float(provider_config.get('requests_per_minute', os.getenv('IMAGE_REQUESTS_PER_MINUTE', 0)) or 0)
+    key = _provider_key(provider_name, provider_config)
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            initial = int(provider_config.get('initial_concurrency', initial_limit))
+            limiter = AdaptiveConcurrencyLimiter(provider_name, initial, min_limit, max_limit, rpm)
+            _limiters[key] = limiter
+            logger.info(
+                f"创建并发控制器: {provider_name}, 初始={limiter.limit}, "
+                f"范围=[{limiter.min_limit}, {limiter.max_limit}], RPM={rpm or '不限'}"
+            )
+        elif (limiter.min_limit, limiter.max_limit, limiter.requests_per_minute) != (min_limit, max_limit, rpm):
+            limiter.configure(min_limit, max_limit, rpm)
+        return limiter
+
+
+def get_concurrency_snapshots() -> list:
+    """获取所有服务商并发控制器的状态"""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return [limiter.snapshot() for limiter in limiters]
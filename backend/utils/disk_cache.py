@@ -0,0 +1,209 @@
+"""磁盘缓存与请求合并工具"""
+import os
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts: Any) -> str:
+    """
+    根据多个部分计算缓存键（SHA-256）
+
+    bytes 直接参与哈希，其他值按 repr 参与，None 与空值可区分。
+
+    Returns:
+        64 位十六进制字符串
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            digest.update(b"b")
+            digest.update(hashlib.sha256(part).digest())
+        else:
+            digest.update(b"v")
+            digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    基于文件的内容缓存
+
+    - 每个键一个文件，按键前两位分目录存放
+    - 写入使用临时文件 + 原子替换，进程崩溃不会留下半截数据
+    - 总大小超过 max_bytes 时按最近访问时间（mtime）淘汰最旧的条目
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ".bin"):
+        """
+        初始化磁盘缓存
+
+        Args:
+            directory: 缓存目录
+            max_bytes: 缓存总大小上限（字节）
+            suffix: 缓存文件扩展名
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._total_bytes = self._scan_size()
+        self._hits = 0
+        self._misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}{self.suffix}")
+
+    def _iter_entries(self):
+        """遍历缓存文件，产出 (路径, 大小, mtime)"""
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._iter_entries())
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，命中时刷新访问时间"""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._misses += 1
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        with self._lock:
+            self._hits += 1
+        return data
+
+    def set(self, key: str, data: bytes) -> None:
+        """写入缓存，必要时淘汰旧条目"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._total_bytes += len(data) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def delete(self, key: str) -> None:
+        """删除缓存条目"""
+        path = self._path(key)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            self._total_bytes -= size
+
+    def _evict(self) -> None:
+        """淘汰最久未访问的条目，直到总大小降到上限的 90%（调用方需持有锁）"""
+        entries = sorted(self._iter_entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        self._total_bytes = total
+        if removed:
+            logger.info(f"🧹 缓存淘汰 {removed} 个条目: {self.directory}, 当前 {total / 1024 / 1024:.1f}MB")
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses
+            }
+
+
+class SingleFlight:
+    """
+    相同键的并发调用合并为一次
+
+    第一个调用者执行函数，其余调用者等待并共享其结果（或异常）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Tuple[threading.Event, Dict[str, Any]]] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行或等待同键调用
+
+        Args:
+            key: 调用键
+            fn: 实际执行的函数
+
+        Returns:
+            (结果, 是否复用了其他调用的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = (threading.Event(), {})
+                self._calls[key] = call
+
+        event, outcome = call
+
+        if not leader:
+            event.wait()
+            if "error" in outcome:
+                raise outcome["error"]
+            return outcome["value"], True
+
+        try:
+            outcome["value"] = fn()
+            return outcome["value"], False
+        except BaseException as e:
+            outcome["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            event.set()
+
+    def in_flight(self) -> int:
+        """当前正在执行的调用数"""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,152 @@
+"""
+跨进程文件锁与原子写入
+
+- FileLock：基于锁文件的互斥锁（Unix 用 fcntl.flock，Windows 用 msvcrt.locking），
+  同一进程内的多个线程和多个 worker 进程之间都互斥；同一线程内可重入
+- atomic_write_json / atomic_write_bytes：写入临时文件后 os.replace 原子替换，读者不会读到写了一半的文件
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """跨进程可重入文件锁"""
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        """
+        初始化文件锁
+
+        Args:
+            path: 锁文件路径（不存在时自动创建）
+            timeout: 获取锁的超时时间（秒）
+        """
+        self.path = path
+        self.timeout = timeout
+        # 线程锁：同一进程内先在这里排队，再去竞争文件锁
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self) -> None:
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(
+                f"获取文件锁超时: {self.path}\n"
+                "解决方案：检查是否有其他进程长时间占用历史记录"
+            )
+        if self._depth == 0:
+            try:
+                self._fd = self._lock_file()
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+
+    def release(self) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            self._unlock_file(fd)
+        self._thread_lock.release()
+
+    def _lock_file(self) -> int:
+        """打开锁文件并加排他锁，超时抛出 TimeoutError"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = time.monotonic() + self.timeout
+        delay = 0.001
+        while True:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return fd
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    raise TimeoutError(
+                        f"获取文件锁超时: {self.path}\n"
+                        "解决方案：检查是否有其他进程长时间占用历史记录"
+                    )
+                time.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    @staticmethod
+    def _unlock_file(fd: int) -> None:
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def atomic_write_json(path: str, data: Any, indent: int = None) -> None:
+    """
+    原子写入 JSON 文件
+
+    先写入同目录下的临时文件并 fsync，再替换目标文件；
+    进程崩溃时目标文件要么是旧内容，要么是完整的新内容。
+
+    Args:
+        path: 目标文件路径
+        data: 可 JSON 序列化的数据
+        indent: 缩进（None 为紧凑格式）
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_bytes(path: str, data: bytes) -> None:
+    """
+    原子写入二进制文件（同 atomic_write_json）
+
+    进程在写入过程中崩溃时不会留下截断的目标文件，只可能残留临时文件。
+
+    Args:
+        path: 目标文件路径
+        data: 文件内容
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
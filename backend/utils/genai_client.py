@@ -2,11 +2,32 @@
 import time
 import random
 from functools import wraps
+from typing import Iterator
 from google import genai
 from google.genai import types
 
 # 导入统一的错误解析函数
 from ..generators.google_genai import parse_genai_error
+from .retry import retry_stream_on_429
+
+
+# 不可重试的错误类型
+NON_RETRYABLE_KEYWORDS = (
+    "401", "unauthenticated",  # 认证错误
+    "403", "permission_denied", "forbidden",  # 权限错误
+    "404", "not_found",  # 资源不存在
+    "invalid_argument",  # 参数错误
+    "safety", "blocked", "filter",  # 安全过滤
+)
+
+
+def _is_retryable(error_str: str) -> bool:
+    """认证、权限、参数、安全过滤等错误重试也不会成功"""
+    return not any(keyword in error_str for keyword in NON_RETRYABLE_KEYWORDS)
+
+
+def _wrap_genai_error(error: Exception) -> Exception:
+    return Exception(parse_genai_error(error))
 
 
 def retry_on_429(max_retries=3, base_delay=2):
@@ -22,22 +43,7 @@ def retry_on_429(max_retries=3, base_delay=2):
                     last_error = e
                     error_str = str(e).lower()
 
-                    # 不可重试的错误类型
-                    non_retryable = [
-                        "401", "unauthenticated",  # 认证错误
-                        "403", "permission_denied", "forbidden",  # 权限错误
-                        "404", "not_found",  # 资源不存在
-                        "invalid_argument",  # 参数错误
-                        "safety", "blocked", "filter",  # 安全过滤
-                    ]
-
-                    should_retry = True
-                    for keyword in non_retryable:
-                        if keyword in error_str:
-                            should_retry = False
-                            break
-
-                    if not should_retry:
+                    if not _is_retryable(error_str):
                         # 直接抛出，不重试
                         raise Exception(parse_genai_error(e))
 
@@ -96,35 +102,16 @@ class GenAIClient:
             types.SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="OFF"),
         ]
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_request(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
-        temperature: float = 1.0,
-        max_output_tokens: int = 8000,
+        temperature: float,
+        max_output_tokens: int,
         use_search: bool = False,
         use_thinking: bool = False,
-        images: list = None,
-        system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            use_search: 是否使用搜索
-            use_thinking: 是否启用思考模式
-            images: 图片列表（暂不支持）
-            system_prompt: 系统提示词（暂不支持）
-
-        Returns:
-            生成的文本
-        """
+        images: list = None
+    ):
+        """构建请求内容和生成配置，返回 (contents, config)"""
         parts = [types.Part(text=prompt)]
 
         if images:
@@ -159,9 +146,24 @@ class GenAIClient:
         if use_thinking:
             config_kwargs["thinking_config"] = types.ThinkingConfig(thinking_level="HIGH")
 
-        generate_content_config = types.GenerateContentConfig(**config_kwargs)
+        return contents, types.GenerateContentConfig(**config_kwargs)
+
+    def _iter_text(
+        self,
+        prompt: str,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None
+    ) -> Iterator[str]:
+        """调用 generate_content_stream，逐段产出文本"""
+        contents, generate_content_config = self._build_request(
+            prompt, temperature, max_output_tokens,
+            use_search=use_search, use_thinking=use_thinking, images=images
+        )
 
-        result = ""
         for chunk in self.client.models.generate_content_stream(
             model=model,
             contents=contents,
@@ -169,10 +171,73 @@ class GenAIClient:
         ):
             if not chunk.candidates or not chunk.candidates[0].content or not chunk.candidates[0].content.parts:
                 continue
-            result += chunk.text
+            if chunk.text:
+                yield chunk.text
+
+    @retry_on_429(max_retries=3, base_delay=2)
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            use_search: 是否使用搜索
+            use_thinking: 是否启用思考模式
+            images: 图片列表（暂不支持）
+            system_prompt: 系统提示词（暂不支持）
+
+        Returns:
+            生成的文本
+        """
+        result = ""
+        for text in self._iter_text(
+            prompt, model, temperature, max_output_tokens,
+            use_search=use_search, use_thinking=use_thinking, images=images
+        ):
+            result += text
 
         return result
 
+    @retry_stream_on_429(max_retries=3, base_delay=2, is_retryable=_is_retryable, wrap_error=_wrap_genai_error)
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        use_search: bool = False,
+        use_thinking: bool = False,
+        images: list = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本，模型每输出一段就产出一段
+
+        参数同 generate_text。
+
+        Yields:
+            文本片段
+        """
+        yield from self._iter_text(
+            prompt, model, temperature, max_output_tokens,
+            use_search=use_search, use_thinking=use_thinking, images=images
+        )
+
     @retry_on_429(max_retries=5, base_delay=3)  # 图片生成重试更多次
     def generate_image(
         self,
@@ -0,0 +1,130 @@
+"""
+HTTP 连接池
+
+所有服务商客户端按主机共享 requests.Session（keep-alive），
+同一主机的请求复用已建立的 TCP + TLS 连接，不再每页重新握手。
+连接池是进程级的，跨任务、跨服务实例重建复用。
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class HttpSessionPool:
+    """按主机（scheme://host:port）维护的 Session 池"""
+
+    # 每个主机的默认连接池大小（与图片并发上限默认值一致）
+    DEFAULT_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', os.getenv('IMAGE_MAX_CONCURRENCY', 8)))
+    # 建立连接的超时时间（秒），读取超时由调用方按接口指定
+    CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 10))
+
+    def __init__(self, pool_size: int = None):
+        self.default_pool_size = max(1, pool_size or self.DEFAULT_POOL_SIZE)
+        self._lock = threading.Lock()
+        # host -> (session, 当前连接池大小)
+        self._sessions: Dict[str, Tuple[requests.Session, int]] = {}
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+    @staticmethod
+    def _mount(session: requests.Session, pool_size: int) -> None:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    def get_session(self, url: str, pool_size: int = None) -> requests.Session:
+        """
+        获取目标主机的共享 Session
+
+        Args:
+            url: 请求地址（按其 scheme + host 复用）
+            pool_size: 需要的连接池大小，只会扩大不会缩小
+
+        Returns:
+            requests.Session
+        """
+        key = self._host_key(url)
+        wanted = max(1, pool_size or self.default_pool_size)
+
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                session = requests.Session()
+                self._mount(session, wanted)
+                self._sessions[key] = (session, wanted)
+                logger.debug(f"创建 HTTP 连接池: {key}, pool_size={wanted}")
+                return session
+
+            session, size = entry
+            if wanted > size:
+                # 新适配器只影响之后借出的连接，进行中的请求不受影响
+                self._mount(session, wanted)
+                self._sessions[key] = (session, wanted)
+                logger.info(f"扩大 HTTP 连接池: {key}, {size} -> {wanted}")
+            return session
+
+    def ensure_pool_size(self, url: Optional[str], pool_size: int) -> None:
+        """确保目标主机的连接池不小于 pool_size（url 为空时忽略）"""
+        if url:
+            self.get_session(url, pool_size)
+
+    def stats(self) -> Dict[str, int]:
+        """各主机的连接池大小"""
+        with self._lock:
+            return {key: size for key, (_, size) in self._sessions.items()}
+
+    def close(self) -> None:
+        """关闭全部 Session"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session, _ in sessions.values():
+            session.close()
+
+
+# 全局连接池实例
+_pool_instance = None
+_pool_lock = threading.Lock()
+
+
+def get_http_pool() -> HttpSessionPool:
+    """获取全局 HTTP 连接池"""
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = HttpSessionPool()
+    return _pool_instance
+
+
+def get_http_session(url: str) -> requests.Session:
+    """获取目标主机的共享 Session"""
+    return get_http_pool().get_session(url)
+
+
+def http_timeout(read_timeout: float, config: Optional[Dict[str, Any]] = None) -> Tuple[float, float]:
+    """
+    构造 (连接超时, 读取超时)
+
+    Args:
+        read_timeout: 默认读取超时（秒）
+        config: 服务商配置，可通过 connect_timeout / read_timeout 覆盖
+
+    Returns:
+        requests 使用的 timeout 元组
+    """
+    config = config or {}
+    return (
+        float(config.get('connect_timeout', HttpSessionPool.CONNECT_TIMEOUT)),
+        float(config.get('read_timeout', read_timeout))
+    )
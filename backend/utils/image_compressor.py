@@ -4,6 +4,111 @@ from PIL import Image
 from typing import Optional
 
 
+# 估算用的探测图最长边
+_PROBE_DIMENSION = 384
+# 缩小分辨率时的最小边长
+_MIN_DIMENSION = 512
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """转换为 RGB（透明背景填充为白色）"""
+    if img.mode in ('RGBA', 'LA', 'P'):
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        return background
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+
+def _open_scaled(image_data: bytes, max_dimension: int) -> Image.Image:
+    """
+    以尽量低的代价解码到不小于 max_dimension 的尺寸
+
+    - JPEG：使用 draft 让解码器直接按 1/2、1/4、1/8 缩放解码
+    - 其他格式：解码后先用 reduce 做整数倍快速缩小，再由调用方精确缩放
+    """
+    img = Image.open(io.BytesIO(image_data))
+    width, height = img.size
+
+    if max(width, height) > max_dimension:
+        ratio = max_dimension / max(width, height)
+        target = (max(1, int(width * ratio)), max(1, int(height * ratio)))
+        if img.format == 'JPEG':
+            img.draft('RGB', target)
+            img.load()
+        else:
+            img.load()
+            factor = int(max(width, height) // max_dimension)
+            if factor >= 2:
+                img = img.reduce(factor)
+
+    return _to_rgb(img)
+
+
+def _fit(img: Image.Image, max_dimension: int) -> Image.Image:
+    """缩放到最长边不超过 max_dimension"""
+    width, height = img.size
+    if max(width, height) <= max_dimension:
+        return img
+    ratio = max_dimension / max(width, height)
+    return img.resize((max(1, int(width * ratio)), max(1, int(height * ratio))), Image.Resampling.LANCZOS)
+
+
+def _encode(img: Image.Image, quality: int, optimize: bool = False) -> bytes:
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=optimize)
+    return output.getvalue()
+
+
+def _search_quality(
+    img: Image.Image,
+    max_size_bytes: int,
+    quality_min: int,
+    quality_max: int
+) -> Optional[bytes]:
+    """
+    二分查找满足大小限制的最高质量
+
+    查找阶段不开启 optimize（更快，且结果只会偏大），
+    最终结果再以 optimize=True 编码一次。
+
+    Returns:
+        满足限制的编码结果；quality_min 也超限时返回 None
+    """
+    low, high = quality_min, quality_max
+    best = None
+
+    while low <= high:
+        quality = (low + high) // 2
+        if len(_encode(img, quality)) <= max_size_bytes:
+            best = quality
+            low = quality + 1
+        else:
+            high = quality - 1
+
+    if best is None:
+        data = _encode(img, quality_min, optimize=True)
+        return data if len(data) <= max_size_bytes else None
+    return _encode(img, best, optimize=True)
+
+
+def _predict_dimension(img: Image.Image, max_size_bytes: int, quality: int) -> int:
+    """
+    根据探测图的每像素字节数，预测在给定质量下能放进大小限制的最长边
+    """
+    probe = _fit(img, _PROBE_DIMENSION)
+    bytes_per_pixel = len(_encode(probe, quality)) / (probe.size[0] * probe.size[1])
+
+    width, height = img.size
+    aspect = min(width, height) / max(width, height)
+    # 留 10% 余量：小图的压缩率通常比大图差，估算偏乐观
+    max_pixels = max_size_bytes * 0.9 / max(bytes_per_pixel, 1e-6)
+    return int((max_pixels / aspect) ** 0.5)
+
+
 def compress_image(
     image_data: bytes,
     max_size_kb: int = 200,  # 默认200KB
@@ -14,6 +119,11 @@ def compress_image(
     """
     压缩图片到指定大小以内
 
+    1. 低代价解码（JPEG draft / 整数倍 reduce）到不超过 max_dimension
+    2. 先用探测图估算所需分辨率，必要时一次缩放到位
+    3. 在 [quality_min, quality_start] 区间二分查找满足大小的最高质量
+    4. 估算不准时再按 10% 逐步缩小，直到满足大小或达到最小边长
+
     Args:
         image_data: 原始图片数据
         max_size_kb: 最大文件大小（KB）
@@ -31,52 +141,34 @@ def compress_image(
         return image_data
 
     try:
-        # 打开图片
-        img = Image.open(io.BytesIO(image_data))
-
-        # 转换为 RGB（处理 RGBA 等格式）
-        if img.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = background
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # 如果图片尺寸过大，先缩小
-        width, height = img.size
-        if width > max_dimension or height > max_dimension:
-            ratio = min(max_dimension / width, max_dimension / height)
-            new_width = int(width * ratio)
-            new_height = int(height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-
-        # 逐步降低质量直到满足大小要求
-        quality = quality_start
-        compressed_data = None
-
-        while quality >= quality_min:
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=quality, optimize=True)
-            compressed_data = output.getvalue()
-
-            if len(compressed_data) <= max_size_bytes:
-                break
-
-            quality -= 5
-
-        # 如果还是太大，进一步缩小尺寸
-        if len(compressed_data) > max_size_bytes:
-            width, height = img.size
-            while len(compressed_data) > max_size_bytes and max(width, height) > 512:
-                width = int(width * 0.9)
-                height = int(height * 0.9)
-                img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
-
-                output = io.BytesIO()
-                img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
-                compressed_data = output.getvalue()
+        img = _fit(_open_scaled(image_data, max_dimension), max_dimension)
+
+        # 预测最低质量下能放得下的分辨率，放不下时直接缩到预测尺寸
+        predicted = _predict_dimension(img, max_size_bytes, quality_min)
+        if predicted < max(img.size):
+            full = img
+            img = _fit(full, max(predicted, _MIN_DIMENSION))
+
+            # 用预测尺寸的实际编码大小校正一次（探测图细节密度高，估算通常偏小）
+            actual = len(_encode(img, quality_min))
+            corrected = int(max(img.size) * (max_size_bytes * 0.95 / actual) ** 0.5)
+            if corrected >= max(full.size) * 0.95:
+                img = full
+            elif corrected > max(img.size):
+                img = _fit(full, corrected)
+
+        compressed_data = _search_quality(img, max_size_bytes, quality_min, quality_start)
+
+        # 估算偏乐观时继续缩小尺寸
+        while compressed_data is None and max(img.size) > _MIN_DIMENSION:
+            img = _fit(img, max(int(max(img.size) * 0.9), _MIN_DIMENSION))
+            data = _encode(img, quality_min, optimize=True)
+            if len(data) <= max_size_bytes:
+                compressed_data = data
+
+        # 已到最小尺寸仍超限：返回能做到的最小结果
+        if compressed_data is None:
+            compressed_data = _encode(img, quality_min, optimize=True)
 
         original_size_kb = len(image_data) / 1024
         compressed_size_kb = len(compressed_data) / 1024
@@ -102,4 +194,6 @@ def compress_images(images: list[bytes], max_size_kb: int = 200) -> list[bytes]:
     Returns:
         压缩后的图片数据列表
     """
-    return [compress_image(img, max_size_kb) for img in images]
+    # 交给多进程图片处理引擎并行压缩
+    from .image_engine import get_image_engine
+    return get_image_engine().compress_many(images, max_size_kb=max_size_kb)
@@ -0,0 +1,224 @@
+"""
+图片处理引擎（多进程）
+
+图片压缩、缩略图生成是 CPU 密集型任务，放在请求线程里执行会与 SSE 推送、
+服务商调用等 I/O 线程争抢 GIL。这里把这些任务交给独立的进程池：
+- 输入可以是图片二进制数据或文件路径，输出可以是二进制数据或写入指定路径
+- 提交数受有界队列限制，队列满时调用方等待，避免积压大量图片占用内存
+- 进程池无法创建或意外崩溃时自动降级为在当前进程内执行
+"""
+
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Union
+
+from .image_compressor import compress_image
+
+logger = logging.getLogger(__name__)
+
+ImageSource = Union[bytes, str]
+
+
+def _read_source(source: ImageSource) -> bytes:
+    """读取图片数据（bytes 原样返回，str 视为文件路径）"""
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """原子写入文件"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _compress_task(source: ImageSource, max_size_kb: int, output_path: Optional[str] = None) -> Union[bytes, str]:
+    """
+    压缩任务（在工作进程中执行，必须是模块级函数以便序列化）
+
+    Returns:
+        指定 output_path 时写入文件并返回路径，否则返回压缩后的数据
+    """
+    data = compress_image(_read_source(source), max_size_kb=max_size_kb)
+    if output_path:
+        _write_atomic(output_path, data)
+        return output_path
+    return data
+
+
+class ImageProcessingEngine:
+    """多进程图片处理引擎"""
+
+    def __init__(self, max_workers: int = None, max_pending: int = None):
+        """
+        初始化引擎
+
+        Args:
+            max_workers: 工作进程数（0 表示不使用进程池，在当前进程内执行）
+            max_pending: 同时提交（执行中 + 排队中）的任务上限
+        """
+        if max_workers is None:
+            max_workers = int(os.getenv('IMAGE_PROCESS_WORKERS', min(4, os.cpu_count() or 1)))
+        if max_pending is None:
+            max_pending = int(os.getenv('IMAGE_PROCESS_QUEUE_SIZE', max(1, max_workers) * 4))
+
+        self.max_workers = max_workers
+        self.max_pending = max(1, max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._disabled = max_workers <= 0
+
+        if self._disabled:
+            logger.info("图片处理引擎: 进程池已关闭，在当前进程内执行")
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """获取进程池（按需创建，创建失败时降级）"""
+        if self._disabled:
+            return None
+        with self._lock:
+            if self._pool is None:
+                try:
+                    # 使用 spawn 启动，避免在多线程进程中 fork 带来的死锁风险
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context("spawn")
+                    )
+                    logger.info(f"图片处理进程池已创建: workers={self.max_workers}, queue={self.max_pending}")
+                except Exception as e:
+                    logger.warning(f"⚠️ 图片处理进程池创建失败，降级为进程内执行: {e}")
+                    self._disabled = True
+                    return None
+            return self._pool
+
+    def _reset_broken_pool(self) -> None:
+        """丢弃已损坏的进程池，下次调用时重建"""
+        with self._lock:
+            pool = self._pool
+            if pool is None or not getattr(pool, '_broken', False):
+                return
+            self._pool = None
+        pool.shutdown(wait=False)
+
+    def submit(self, source: ImageSource, max_size_kb: int, output_path: Optional[str] = None) -> Future:
+        """
+        提交压缩任务（队列满时阻塞等待）
+
+        Args:
+            source: 图片数据或文件路径
+            max_size_kb: 目标大小（KB）
+            output_path: 结果写入的文件路径（可选）
+
+        Returns:
+            Future，结果为压缩后的数据或 output_path
+        """
+        pool = self._get_pool()
+        if pool is None:
+            future: Future = Future()
+            try:
+                future.set_result(_compress_task(source, max_size_kb, output_path))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        self._slots.acquire()
+        try:
+            future = pool.submit(_compress_task, source, max_size_kb, output_path)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def compress(self, source: ImageSource, max_size_kb: int = 200, output_path: Optional[str] = None) -> Union[bytes, str]:
+        """
+        压缩图片并等待结果
+
+        已经小于目标大小的 bytes 输入直接返回，不经过进程池。
+
+        Args:
+            source: 图片数据或文件路径
+            max_size_kb: 目标大小（KB）
+            output_path: 结果写入的文件路径（可选）
+
+        Returns:
+            压缩后的数据，或指定 output_path 时返回该路径
+        """
+        if isinstance(source, bytes) and not output_path and len(source) <= max_size_kb * 1024:
+            return source
+
+        # 进程池损坏可能在提交时（已有工作进程退出）或等待结果时暴露，两种情况都重建后降级
+        try:
+            return self.submit(source, max_size_kb, output_path).result()
+        except BrokenProcessPool as e:
+            return self._fallback(source, max_size_kb, output_path, e)
+
+    def _fallback(
+        self,
+        source: ImageSource,
+        max_size_kb: int,
+        output_path: Optional[str],
+        error: BrokenProcessPool
+    ) -> Union[bytes, str]:
+        """丢弃已损坏的进程池，在当前进程内完成这次压缩"""
+        logger.warning(f"⚠️ 图片处理进程池异常，重建后在当前进程内重试: {error}")
+        self._reset_broken_pool()
+        return _compress_task(source, max_size_kb, output_path)
+
+    def compress_many(self, sources: List[ImageSource], max_size_kb: int = 200) -> List[bytes]:
+        """并行压缩多张图片，按输入顺序返回"""
+        if not sources:
+            return []
+
+        futures = []
+        for source in sources:
+            if isinstance(source, bytes) and len(source) <= max_size_kb * 1024:
+                futures.append(source)
+                continue
+            try:
+                futures.append(self.submit(source, max_size_kb))
+            except BrokenProcessPool as e:
+                futures.append(self._fallback(source, max_size_kb, None, e))
+
+        results = []
+        for source, item in zip(sources, futures):
+            if isinstance(item, Future):
+                try:
+                    item = item.result()
+                except BrokenProcessPool as e:
+                    item = self._fallback(source, max_size_kb, None, e)
+            results.append(item)
+        return results
+
+    def thumbnail(self, source: ImageSource, output_path: str, max_size_kb: int = 50) -> str:
+        """生成缩略图并写入 output_path"""
+        return self.compress(source, max_size_kb=max_size_kb, output_path=output_path)
+
+    def shutdown(self) -> None:
+        """关闭进程池"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# 全局引擎实例
+_engine_instance = None
+_engine_lock = threading.Lock()
+
+
+def get_image_engine() -> ImageProcessingEngine:
+    """获取全局图片处理引擎"""
+    global _engine_instance
+    if _engine_instance is None:
+        with _engine_lock:
+            if _engine_instance is None:
+                _engine_instance = ImageProcessingEngine()
+    return _engine_instance
@@ -0,0 +1,136 @@
+"""
+参考图预处理缓存
+
+同一个任务里封面图、用户上传图会作为参考图传给每一页。
+这里按内容哈希缓存压缩后的数据和 base64 / data URI 字符串，
+一个任务内每张参考图只压缩、编码一次。
+"""
+
+import base64
+import hashlib
+import threading
+from typing import Dict, List, Optional, Union
+
+from .disk_cache import SingleFlight
+from .image_engine import get_image_engine
+
+
+def _detect_mime_type(data: bytes) -> str:
+    """根据文件头判断图片类型"""
+    if data.startswith(b'\xff\xd8'):
+        return "image/jpeg"
+    if data.startswith(b'\x89PNG'):
+        return "image/png"
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return "image/webp"
+    if data[:3] == b'GIF':
+        return "image/gif"
+    return "image/png"
+
+
+class PreparedReference:
+    """预处理好的参考图：压缩后的数据，base64 和 data URI 按需计算并缓存"""
+
+    def __init__(self, data: bytes, digest: str = None):
+        self.data = data
+        self.digest = digest or hashlib.sha256(data).hexdigest()
+        self.mime_type = _detect_mime_type(data)
+        self._base64: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def base64(self) -> str:
+        """base64 编码字符串"""
+        if self._base64 is None:
+            with self._lock:
+                if self._base64 is None:
+                    self._base64 = base64.b64encode(self.data).decode('utf-8')
+        return self._base64
+
+    @property
+    def data_uri(self) -> str:
+        """data URI（data:image/...;base64,...）"""
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PreparedReference) and other.digest == self.digest
+
+    def __hash__(self) -> int:
+        return hash(self.digest)
+
+
+ReferenceInput = Union[bytes, PreparedReference]
+
+
+class ReferenceStore:
+    """
+    参考图预处理缓存（每个任务一个）
+
+    以原始数据的哈希为键，缓存压缩后的 PreparedReference；
+    并发请求同一张参考图时只压缩一次。
+    """
+
+    def __init__(self, max_size_kb: int = 200):
+        self.max_size_kb = max_size_kb
+        self._lock = threading.Lock()
+        self._refs: Dict[str, PreparedReference] = {}
+        self._flights = SingleFlight()
+
+    def prepare(self, image: Optional[ReferenceInput]) -> Optional[PreparedReference]:
+        """
+        获取参考图的预处理结果（首次使用时压缩）
+
+        Args:
+            image: 原始图片数据或已预处理的参考图
+
+        Returns:
+            PreparedReference，输入为空时返回 None
+        """
+        if image is None:
+            return None
+        if isinstance(image, PreparedReference):
+            return image
+
+        key = hashlib.sha256(image).hexdigest()
+        with self._lock:
+            ref = self._refs.get(key)
+        if ref is not None:
+            return ref
+
+        def build() -> PreparedReference:
+            data = get_image_engine().compress(image, max_size_kb=self.max_size_kb)
+            digest = key if data is image else None
+            return PreparedReference(data, digest)
+
+        ref, _ = self._flights.do(key, build)
+        with self._lock:
+            self._refs.setdefault(key, ref)
+        return ref
+
+    def prepare_many(self, images: Optional[List[ReferenceInput]]) -> Optional[List[PreparedReference]]:
+        """批量获取参考图的预处理结果"""
+        if not images:
+            return None
+        return [self.prepare(img) for img in images]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._refs)
+
+
+def as_prepared_reference(image: Optional[ReferenceInput], max_size_kb: int = 200) -> Optional[PreparedReference]:
+    """
+    把参考图统一为 PreparedReference
+
+    生成器对外同时接受 bytes 和 PreparedReference：
+    传入 bytes 时就地压缩（兼容直接调用生成器的场景），
+    传入 PreparedReference 时直接复用，不再重复压缩和编码。
+    """
+    if image is None:
+        return None
+    if isinstance(image, PreparedReference):
+        return image
+    return PreparedReference(get_image_engine().compress(image, max_size_kb=max_size_kb))
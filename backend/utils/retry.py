@@ -0,0 +1,55 @@
+"""流式接口重试装饰器（文本客户端与 GenAI 客户端共用）"""
+import time
+import random
+from functools import wraps
+from typing import Callable, Optional
+
+
+def _is_rate_limited(error_str: str) -> bool:
+    """默认的可重试判断：只重试限流错误"""
+    return "429" in error_str or "rate" in error_str or "resource_exhausted" in error_str
+
+
+def retry_stream_on_429(
+    max_retries: int = 3,
+    base_delay: float = 2,
+    is_retryable: Optional[Callable[[str], bool]] = None,
+    wrap_error: Optional[Callable[[Exception], Exception]] = None
+):
+    """
+    流式接口的 429 重试装饰器：只在尚未输出任何内容时重试，避免重复输出
+
+    Args:
+        max_retries: 最多尝试次数
+        base_delay: 限流时的退避基数（第 n 次重试等待 base_delay ** n 秒）
+        is_retryable: 根据小写的错误信息判断是否重试（默认只重试限流错误）
+        wrap_error: 放弃重试时把原始异常转换为要抛出的异常（默认原样抛出）
+    """
+    should_retry = is_retryable or _is_rate_limited
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_retries):
+                started = False
+                try:
+                    for chunk in func(*args, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    error_str = str(e).lower()
+                    if started or not should_retry(error_str) or attempt >= max_retries - 1:
+                        if wrap_error is None:
+                            raise
+                        raise wrap_error(e)
+
+                    if _is_rate_limited(error_str):
+                        wait_time = (base_delay ** attempt) + random.uniform(0, 1)
+                        print(f"[重试] 遇到限流，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
+                    else:
+                        wait_time = min(2 ** attempt, 10) + random.uniform(0, 1)
+                        print(f"[重试] 请求失败，{wait_time:.1f}秒后重试 (尝试 {attempt + 2}/{max_retries})")
+                    time.sleep(wait_time)
+        return wrapper
+    return decorator
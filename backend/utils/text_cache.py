@@ -0,0 +1,390 @@
+"""
+文本生成结果缓存
+
+大纲、文案的 LLM 调用按"服务商 + 模型 + 参数 + 完整提示词 + 参考图"缓存生成结果：
+- 内存层：LRU，保存最近使用的结果，命中时不读磁盘
+- 磁盘层：DiskCache，进程重启后仍可复用，按总大小淘汰
+- 两层都按写入时间计算 TTL，过期条目视为未命中
+- 同时进行中的相同请求合并为一次服务商调用（流式请求由后台线程调用服务商，
+  每个请求先回放已输出的片段，之后实时接收新片段）
+
+默认关闭，TEXT_CACHE_ENABLED=true 时启用。
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backend.utils.disk_cache import DiskCache, SingleFlight, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+def text_cache_key(
+    kind: str,
+    provider_config: Dict[str, Any],
+    params: Dict[str, Any],
+    prompt: str,
+    images: Optional[List[bytes]] = None
+) -> str:
+    """
+    计算文本生成缓存键
+
+    Args:
+        kind: 调用类型（outline / content）
+        provider_config: 当前服务商配置（取 type 和 base_url）
+        params: 模型参数（model / temperature / max_output_tokens）
+        prompt: 渲染后的完整提示词
+        images: 随提示词发送的参考图
+
+    Returns:
+        缓存键
+    """
+    return make_cache_key(
+        "text", kind,
+        provider_config.get('type'),
+        provider_config.get('base_url'),
+        params.get('model'),
+        params.get('temperature'),
+        params.get('max_output_tokens'),
+        prompt,
+        *(images or [])
+    )
+
+
+class _StreamFlight:
+    """
+    进行中的流式请求
+
+    后台线程逐段写入服务商输出的文本，请求方可随时加入：先回放已输出的片段，
+    再实时接收新片段，直到输出结束（或失败）。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+
+    def append(self, chunk: str) -> None:
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        with self._cond:
+            self._done = True
+            self._error = error
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        """按顺序产出全部片段；生成失败时抛出同样的异常"""
+        cursor = 0
+        while True:
+            with self._cond:
+                while cursor >= len(self._chunks) and not self._done:
+                    self._cond.wait()
+                pending = self._chunks[cursor:]
+                cursor = len(self._chunks)
+                done, error = self._done, self._error
+
+            yield from pending
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class TextResponseCache:
+    """文本生成结果缓存（内存 LRU + 磁盘持久化 + 请求合并）"""
+
+    def __init__(self, directory: str, max_bytes: int, max_entries: int = 128, ttl: int = 86400):
+        """
+        初始化文本缓存
+
+        Args:
+            directory: 磁盘缓存目录
+            max_bytes: 磁盘缓存总大小上限（字节）
+            max_entries: 内存中最多保留的条目数
+            ttl: 条目有效期（秒，按写入时间计算，0 表示不过期）
+        """
+        self.disk = DiskCache(directory, max_bytes, suffix=".json")
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        # 键 -> (写入时间, 文本)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._flights = SingleFlight()
+        # 键 -> 进行中的流式请求
+        self._stream_flights: Dict[str, _StreamFlight] = {}
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._shared = 0
+        self._bypassed = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, text: str) -> None:
+        """放入内存层并淘汰超量条目（调用方需持有锁）"""
+        self._memory[key] = (created_at, text)
+        self._memory.move_to_end(key)
+        while len(self._memory) > max(1, self.max_entries):
+            self._memory.popitem(last=False)
+
+    def _load_disk(self, key: str) -> Optional[Tuple[float, str]]:
+        """从磁盘读取条目，损坏或过期时删除"""
+        data = self.disk.get(key)
+        if data is None:
+            return None
+
+        try:
+            entry = json.loads(data.decode("utf-8"))
+            created_at, text = float(entry["created_at"]), entry["text"]
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"文本缓存条目损坏，已删除: {key[:12]}, {e}")
+            self.disk.delete(key)
+            return None
+
+        if self._expired(created_at):
+            self.disk.delete(key)
+            return None
+        return created_at, text
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，未命中或已过期时返回 None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self._memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+        entry = self._load_disk(key)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._remember(key, *entry)
+            self._disk_hits += 1
+        return entry[1]
+
+    def set(self, key: str, text: str) -> None:
+        """写入缓存（内存和磁盘）"""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, text)
+
+        payload = json.dumps({"created_at": created_at, "text": text}, ensure_ascii=False)
+        try:
+            self.disk.set(key, payload.encode("utf-8"))
+        except OSError as e:
+            logger.warning(f"文本缓存写入磁盘失败: {e}")
+
+    def get_or_generate(self, key: str, generate: Callable[[], str], use_cache: bool = True) -> str:
+        """
+        读取缓存，未命中时调用 generate 生成并写入
+
+        generate 抛出异常或返回空文本时不写入缓存。
+
+        Args:
+            key: 缓存键
+            generate: 实际调用服务商的函数
+            use_cache: 为 False 时跳过缓存读取和请求合并，但仍会刷新缓存
+
+        Returns:
+            生成的文本
+        """
+        if not use_cache:
+            with self._lock:
+                self._bypassed += 1
+            text = generate()
+            if text:
+                self.set(key, text)
+            return text
+
+        text = self.get(key)
+        if text is not None:
+            logger.info(f"♻️ 文本缓存命中: {key[:12]}")
+            return text
+
+        def produce() -> str:
+            # 等待锁期间其他请求可能已经写入
+            with self._lock:
+                entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0]):
+                return entry[1]
+
+            result = generate()
+            if result:
+                self.set(key, result)
+            return result
+
+        text, shared = self._flights.do(key, produce)
+        if shared:
+            with self._lock:
+                self._shared += 1
+            logger.info(f"♻️ 复用进行中的相同文本请求: {key[:12]}")
+        return text
+
+    def stream_or_generate(
+        self,
+        key: str,
+        generate_stream: Callable[[], Iterable[str]],
+        use_cache: bool = True,
+        validate: Optional[Callable[[str], Any]] = None
+    ) -> Iterator[str]:
+        """
+        流式版本的 get_or_generate
+
+        命中缓存时整段文本作为一个片段输出。未命中时由后台线程调用服务商，
+        同键的并发请求共用这一次调用：每个请求先回放已输出的片段，再实时接收新片段。
+        请求方中途断开不影响其他请求，生成仍会完成并写入缓存。
+
+        Args:
+            key: 缓存键
+            generate_stream: 实际调用服务商的流式函数
+            use_cache: 为 False 时跳过缓存读取和请求合并，但仍会刷新缓存
+            validate: 写入缓存前校验完整文本，抛出异常时不写入（可选）
+
+        Yields:
+            文本片段
+        """
+        if not use_cache:
+            with self._lock:
+                self._bypassed += 1
+            yield from self._stream_and_store(key, generate_stream, validate)
+            return
+
+        text = self.get(key)
+        if text is not None:
+            logger.info(f"♻️ 文本缓存命中: {key[:12]}")
+            yield text
+            return
+
+        with self._lock:
+            flight = self._stream_flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._stream_flights[key] = _StreamFlight()
+            else:
+                self._shared += 1
+
+        if leader:
+            threading.Thread(
+                target=self._produce_stream,
+                args=(key, flight, generate_stream, validate),
+                name=f"text-stream-{key[:8]}",
+                daemon=True
+            ).start()
+        else:
+            logger.info(f"♻️ 复用进行中的相同文本请求（流式）: {key[:12]}")
+
+        yield from flight.follow()
+
+    def _produce_stream(
+        self,
+        key: str,
+        flight: _StreamFlight,
+        generate_stream: Callable[[], Iterable[str]],
+        validate: Optional[Callable[[str], Any]]
+    ) -> None:
+        """后台线程：把服务商的输出写入进行中的流式请求"""
+        error: Optional[BaseException] = None
+        try:
+            for chunk in self._stream_and_store(key, generate_stream, validate):
+                flight.append(chunk)
+        except Exception as e:
+            error = e
+        finally:
+            # 结果已写入缓存后才移除，之后的相同请求直接命中缓存
+            with self._lock:
+                self._stream_flights.pop(key, None)
+            flight.finish(error)
+
+    def _stream_and_store(
+        self,
+        key: str,
+        generate_stream: Callable[[], Iterable[str]],
+        validate: Optional[Callable[[str], Any]]
+    ) -> Iterator[str]:
+        """转发服务商的流式输出，完整输出后写入缓存"""
+        chunks = []
+        for chunk in generate_stream():
+            chunks.append(chunk)
+            yield chunk
+
+        text = "".join(chunks)
+        if not text:
+            return
+        if validate is not None:
+            try:
+                validate(text)
+            except Exception as e:
+                logger.warning(f"文本生成结果校验失败，不写入缓存: {key[:12]}, {e}")
+                return
+        self.set(key, text)
+
+    def clear_memory(self) -> None:
+        """清空内存层（磁盘条目保留）"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": hits,
+                "memory_hits": self._memory_hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "shared": self._shared,
+                "bypassed": self._bypassed,
+                "in_flight": self._flights.in_flight() + len(self._stream_flights),
+                "disk": self.disk.stats()
+            }
+
+
+# 全局缓存实例（未启用时为 None）
+_cache_instance: Optional[TextResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> Optional[TextResponseCache]:
+    """获取文本生成结果缓存（未启用时返回 None）"""
+    global _cache_instance
+    if os.getenv('TEXT_CACHE_ENABLED', 'false').lower() != 'true':
+        return None
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                cache_dir = os.getenv('TEXT_CACHE_DIR') or os.path.join(
+                    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+                    "cache", "text"
+                )
+                max_mb = int(os.getenv('TEXT_CACHE_MAX_MB', 64))
+                max_entries = int(os.getenv('TEXT_CACHE_MAX_ENTRIES', 128))
+                ttl = int(os.getenv('TEXT_CACHE_TTL', 86400))
+                _cache_instance = TextResponseCache(
+                    cache_dir, max_mb * 1024 * 1024, max_entries=max_entries, ttl=ttl
+                )
+                logger.info(
+                    f"文本生成缓存已启用: {cache_dir}, 上限 {max_mb}MB, "
+                    f"内存 {max_entries} 条, TTL {ttl}s"
+                )
+    return _cache_instance
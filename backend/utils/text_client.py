@@ -1,11 +1,13 @@
 """Text API 客户端封装"""
+import json
 import time
 import random
 import base64
-import requests
 from functools import wraps
-from typing import List, Optional, Union
-from .image_compressor import compress_image
+from typing import Iterator, List, Optional, Union
+from .image_engine import get_image_engine
+from .http_pool import get_http_session, http_timeout
+from .retry import retry_stream_on_429
 
 
 def retry_on_429(max_retries=3, base_delay=2):
@@ -84,7 +86,7 @@ class TextChatClient:
         for img in images:
             if isinstance(img, bytes):
                 # 压缩图片到 200KB 以内
-                compressed_img = compress_image(img, max_size_kb=200)
+                compressed_img = get_image_engine().compress(img, max_size_kb=200)
                 # 图片数据，转为 base64 data URL
                 base64_data = self._encode_image_to_base64(compressed_img)
                 image_url = f"data:image/png;base64,{base64_data}"
@@ -99,31 +101,17 @@ class TextChatClient:
 
         return content
 
-    @retry_on_429(max_retries=3, base_delay=2)
-    def generate_text(
+    def _build_payload(
         self,
         prompt: str,
-        model: str = "gemini-3-pro-preview",
-        temperature: float = 1.0,
-        max_output_tokens: int = 8000,
+        model: str,
+        temperature: float,
+        max_output_tokens: int,
         images: List[Union[bytes, str]] = None,
         system_prompt: str = None,
-        **kwargs
-    ) -> str:
-        """
-        生成文本（支持图片输入）
-
-        Args:
-            prompt: 提示词
-            model: 模型名称
-            temperature: 温度
-            max_output_tokens: 最大输出 token
-            images: 图片列表（可选）
-            system_prompt: 系统提示词（可选）
-
-        Returns:
-            生成的文本
-        """
+        stream: bool = False
+    ) -> dict:
+        """构建 chat/completions 请求体"""
         messages = []
 
         # 添加系统提示词
@@ -140,97 +128,133 @@ class TextChatClient:
             "content": content
         })
 
-        payload = {
+        return {
             "model": model,
             "messages": messages,
             "temperature": temperature,
             "max_tokens": max_output_tokens,
-            "stream": False
+            "stream": stream
         }
 
+    def _raise_for_status(self, response, model: str) -> None:
+        """非 200 响应时抛出带解决方案的错误信息"""
+        if response.status_code == 200:
+            return
+
+        error_detail = response.text[:500]
+        status_code = response.status_code
+
+        # 根据状态码给出更详细的错误信息
+        if status_code == 401:
+            raise Exception(
+                "❌ API Key 认证失败\n\n"
+                "【可能原因】\n"
+                "1. API Key 无效或已过期\n"
+                "2. API Key 格式错误（复制时可能包含空格）\n"
+                "3. API Key 被禁用或删除\n\n"
+                "【解决方案】\n"
+                "1. 在系统设置页面检查 API Key 是否正确\n"
+                "2. 重新获取 API Key\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 403:
+            raise Exception(
+                "❌ 权限被拒绝\n\n"
+                "【可能原因】\n"
+                "1. API Key 没有访问该模型的权限\n"
+                "2. 账户配额已用尽\n"
+                "3. 区域限制\n\n"
+                "【解决方案】\n"
+                "1. 检查 API 权限配置\n"
+                "2. 尝试使用其他模型\n"
+                f"\n【原始错误】{error_detail[:200]}"
+            )
+        elif status_code == 404:
+            raise Exception(
+                "❌ 模型不存在或 API 端点错误\n\n"
+                "【可能原因】\n"
+                f"1. 模型 '{model}' 不存在或已下线\n"
+                "2. Base URL 配置错误\n\n"
+                "【解决方案】\n"
+                "1. 检查模型名称是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                f"\n【请求地址】{self.chat_endpoint}"
+            )
+        elif status_code == 429:
+            raise Exception(
+                "⏳ API 配额或速率限制\n\n"
+                "【说明】\n"
+                "请求频率过高或配额已用尽。\n\n"
+                "【解决方案】\n"
+                "1. 稍后再试（等待 1-2 分钟）\n"
+                "2. 检查 API 配额使用情况\n"
+                "3. 考虑升级计划获取更多配额"
+            )
+        elif status_code >= 500:
+            raise Exception(
+                f"⚠️ API 服务器错误 ({status_code})\n\n"
+                "【说明】\n"
+                "这是服务端的临时故障，与您的配置无关。\n\n"
+                "【解决方案】\n"
+                "1. 稍等几分钟后重试\n"
+                "2. 如果持续出现，检查服务商状态页"
+            )
+        else:
+            raise Exception(
+                f"❌ API 请求失败 (状态码: {status_code})\n\n"
+                f"【原始错误】\n{error_detail}\n\n"
+                f"【请求地址】{self.chat_endpoint}\n"
+                f"【模型】{model}\n\n"
+                "【通用解决方案】\n"
+                "1. 检查 API Key 是否正确\n"
+                "2. 检查 Base URL 配置\n"
+                "3. 检查模型名称是否正确"
+            )
+
+    @retry_on_429(max_retries=3, base_delay=2)
+    def generate_text(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> str:
+        """
+        生成文本（支持图片输入）
+
+        Args:
+            prompt: 提示词
+            model: 模型名称
+            temperature: 温度
+            max_output_tokens: 最大输出 token
+            images: 图片列表（可选）
+            system_prompt: 系统提示词（可选）
+
+        Returns:
+            生成的文本
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens,
+            images=images, system_prompt=system_prompt, stream=False
+        )
+
         headers = {
             "Content-Type": "application/json",
             "Accept": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
 
-        response = requests.post(
+        response = get_http_session(self.chat_endpoint).post(
             self.chat_endpoint,
             json=payload,
             headers=headers,
-            timeout=300  # 5分钟超时
+            timeout=http_timeout(300)  # 5分钟读取超时
         )
 
-        if response.status_code != 200:
-            error_detail = response.text[:500]
-            status_code = response.status_code
-
-            # 根据状态码给出更详细的错误信息
-            if status_code == 401:
-                raise Exception(
-                    "❌ API Key 认证失败\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 无效或已过期\n"
-                    "2. API Key 格式错误（复制时可能包含空格）\n"
-                    "3. API Key 被禁用或删除\n\n"
-                    "【解决方案】\n"
-                    "1. 在系统设置页面检查 API Key 是否正确\n"
-                    "2. 重新获取 API Key\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 403:
-                raise Exception(
-                    "❌ 权限被拒绝\n\n"
-                    "【可能原因】\n"
-                    "1. API Key 没有访问该模型的权限\n"
-                    "2. 账户配额已用尽\n"
-                    "3. 区域限制\n\n"
-                    "【解决方案】\n"
-                    "1. 检查 API 权限配置\n"
-                    "2. 尝试使用其他模型\n"
-                    f"\n【原始错误】{error_detail[:200]}"
-                )
-            elif status_code == 404:
-                raise Exception(
-                    "❌ 模型不存在或 API 端点错误\n\n"
-                    "【可能原因】\n"
-                    f"1. 模型 '{model}' 不存在或已下线\n"
-                    "2. Base URL 配置错误\n\n"
-                    "【解决方案】\n"
-                    "1. 检查模型名称是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    f"\n【请求地址】{self.chat_endpoint}"
-                )
-            elif status_code == 429:
-                raise Exception(
-                    "⏳ API 配额或速率限制\n\n"
-                    "【说明】\n"
-                    "请求频率过高或配额已用尽。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍后再试（等待 1-2 分钟）\n"
-                    "2. 检查 API 配额使用情况\n"
-                    "3. 考虑升级计划获取更多配额"
-                )
-            elif status_code >= 500:
-                raise Exception(
-                    f"⚠️ API 服务器错误 ({status_code})\n\n"
-                    "【说明】\n"
-                    "这是服务端的临时故障，与您的配置无关。\n\n"
-                    "【解决方案】\n"
-                    "1. 稍等几分钟后重试\n"
-                    "2. 如果持续出现，检查服务商状态页"
-                )
-            else:
-                raise Exception(
-                    f"❌ API 请求失败 (状态码: {status_code})\n\n"
-                    f"【原始错误】\n{error_detail}\n\n"
-                    f"【请求地址】{self.chat_endpoint}\n"
-                    f"【模型】{model}\n\n"
-                    "【通用解决方案】\n"
-                    "1. 检查 API Key 是否正确\n"
-                    "2. 检查 Base URL 配置\n"
-                    "3. 检查模型名称是否正确"
-                )
+        self._raise_for_status(response, model)
 
         result = response.json()
 
@@ -249,6 +273,72 @@ class TextChatClient:
             )
 
 
+    @retry_stream_on_429(max_retries=3, base_delay=2)
+    def generate_text_stream(
+        self,
+        prompt: str,
+        model: str = "gemini-3-pro-preview",
+        temperature: float = 1.0,
+        max_output_tokens: int = 8000,
+        images: List[Union[bytes, str]] = None,
+        system_prompt: str = None,
+        **kwargs
+    ) -> Iterator[str]:
+        """
+        流式生成文本，按服务端推送的顺序逐段产出
+
+        参数同 generate_text。
+
+        Yields:
+            文本片段
+        """
+        payload = self._build_payload(
+            prompt, model, temperature, max_output_tokens,
+            images=images, system_prompt=system_prompt, stream=True
+        )
+
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "text/event-stream",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        response = get_http_session(self.chat_endpoint).post(
+            self.chat_endpoint,
+            json=payload,
+            headers=headers,
+            stream=True,
+            timeout=http_timeout(300)  # 两次数据之间的最长等待
+        )
+
+        try:
+            self._raise_for_status(response, model)
+
+            # 逐行解析 SSE；按 UTF-8 解码，服务端通常不声明 charset
+            for raw_line in response.iter_lines():
+                if not raw_line:
+                    continue
+                line = raw_line.decode('utf-8', errors='replace')
+                if not line.startswith('data:'):
+                    continue
+                data = line[5:].strip()
+                if data == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    continue
+
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+        finally:
+            response.close()
+
+
 def get_text_chat_client(provider_config: dict):
     """
     获取 Text Chat 客户端实例（根据 type 返回对应客户端）
@@ -373,16 +373,18 @@ export async function getHistoryList(
  * 获取指定 ID 的历史记录完整信息，包括大纲和图片数据
  *
  * @param recordId - 历史记录 ID
+ * @param fields - 只返回指定字段（可选，如 ['title', 'status', 'images.generated']）
  *
  * @returns Promise 包含历史记录详细信息
  */
-export async function getHistory(recordId: string): Promise<{
+export async function getHistory(recordId: string, fields?: string[]): Promise<{
   success: boolean
   record?: HistoryDetail
   error?: string
 }> {
   try {
     const response = await axios.get(`${API_BASE_URL}/history/${recordId}`, {
+      params: fields && fields.length > 0 ? { fields: fields.join(',') } : undefined,
       timeout: 10000 // 10秒超时
     })
     return response.data
@@ -404,6 +406,44 @@ export async function getHistory(recordId: string): Promise<{
   }
 }
 
+/**
+ * 批量获取历史记录
+ *
+ * 一次请求获取多条记录，替代逐条调用 getHistory
+ *
+ * @param recordIds - 历史记录 ID 列表（最多 100 个）
+ * @param fields - 只返回指定字段（可选）
+ *
+ * @returns Promise 包含按 ID 顺序排列的记录和不存在的 ID
+ */
+export async function getHistoryBatch(recordIds: string[], fields?: string[]): Promise<{
+  success: boolean
+  records: Partial<HistoryDetail>[]
+  missing?: string[]
+  error?: string
+}> {
+  try {
+    const response = await axios.post(
+      `${API_BASE_URL}/history/batch`,
+      { ids: recordIds, fields },
+      { timeout: 10000 } // 10秒超时
+    )
+    return response.data
+  } catch (error: any) {
+    if (axios.isAxiosError(error)) {
+      if (error.code === 'ECONNABORTED') {
+        return { success: false, records: [], error: '请求超时，请检查网络连接' }
+      }
+      if (!error.response) {
+        return { success: false, records: [], error: '网络连接失败，请检查网络设置' }
+      }
+      const errorMessage = error.response?.data?.error || error.message || '批量获取历史记录失败'
+      return { success: false, records: [], error: errorMessage }
+    }
+    return { success: false, records: [], error: '未知错误，请稍后重试' }
+  }
+}
+
 /**
  * 更新历史记录
  *
@@ -543,20 +583,24 @@ export async function deleteHistory(recordId: string): Promise<{
 /**
  * 搜索历史记录
  *
- * 根据关键词搜索历史记录标题
+ * 全文搜索标题、原始输入、大纲、文案和标签，按相关度排序
  *
  * @param keyword - 搜索关键词
+ * @param page - 页码（默认 1）
+ * @param pageSize - 每页数量（默认 20）
  *
- * @returns Promise 包含匹配的历史记录列表
+ * @returns Promise 包含当前页的匹配记录和分页信息
  */
-export async function searchHistory(keyword: string): Promise<{
+export async function searchHistory(keyword: string, page: number = 1, pageSize: number = 20): Promise<{
   success: boolean
   records: HistoryRecord[]
+  total?: number
+  total_pages?: number
   error?: string
 }> {
   try {
     const response = await axios.get(`${API_BASE_URL}/history/search`, {
-      params: { keyword },
+      params: { keyword, page, page_size: pageSize },
       timeout: 10000 // 10秒超时
     })
     return response.data
@@ -713,6 +757,7 @@ export async function scanAllTasks(): Promise<{
   success: boolean
   total_tasks?: number
   synced?: number
+  unchanged?: number
   failed?: number
   orphan_tasks?: string[]
   results?: any[]
@@ -0,0 +1,139 @@
+"""
+图片压缩性能基准
+
+对比旧版逐级降质量压缩与当前 compress_image（二分查找质量 + 分辨率预测 + 低代价解码）
+在相同目标大小下的 CPU 耗时和输出大小。
+
+用法：
+    python scripts/benchmark_image_compressor.py
+    python scripts/benchmark_image_compressor.py --sizes 50 200 --rounds 3 --image path/to/image.png
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.utils.image_compressor import compress_image  # noqa: E402
+
+
+def legacy_compress_image(
+    image_data: bytes,
+    max_size_kb: int = 200,
+    quality_start: int = 85,
+    quality_min: int = 20,
+    max_dimension: int = 2048
+) -> bytes:
+    """旧版算法：质量每次降 5，仍超限时每次缩小 10% 重新编码"""
+    max_size_bytes = max_size_kb * 1024
+    if len(image_data) <= max_size_bytes:
+        return image_data
+
+    img = Image.open(io.BytesIO(image_data))
+    if img.mode in ('RGBA', 'LA', 'P'):
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    width, height = img.size
+    if width > max_dimension or height > max_dimension:
+        ratio = min(max_dimension / width, max_dimension / height)
+        img = img.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+
+    quality = quality_start
+    compressed_data = None
+    while quality >= quality_min:
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        compressed_data = output.getvalue()
+        if len(compressed_data) <= max_size_bytes:
+            break
+        quality -= 5
+
+    if len(compressed_data) > max_size_bytes:
+        width, height = img.size
+        while len(compressed_data) > max_size_bytes and max(width, height) > 512:
+            width = int(width * 0.9)
+            height = int(height * 0.9)
+            img_resized = img.resize((width, height), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            img_resized.save(output, format='JPEG', quality=quality_min, optimize=True)
+            compressed_data = output.getvalue()
+
+    return compressed_data
+
+
+def make_sample_image(width: int = 3072, height: int = 4096, fmt: str = 'PNG') -> bytes:
+    """生成一张近似生成图的测试图片（渐变背景 + 色块 + 文字线条 + 噪点）"""
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    overlay = Image.effect_noise((width // 4, height // 4), 40).resize((width, height)).convert('RGB')
+    img = Image.blend(img, overlay, 0.35)
+
+    draw = ImageDraw.Draw(img)
+    for i in range(40):
+        x = (i * 997) % width
+        y = (i * 1531) % height
+        color = ((i * 53) % 256, (i * 97) % 256, (i * 151) % 256)
+        draw.ellipse([x, y, x + width // 6, y + height // 8], fill=color)
+    for y in range(0, height, 48):
+        draw.line([(width // 10, y), (width * 9 // 10, y)], fill=(20, 20, 20), width=3)
+    img = img.filter(ImageFilter.GaussianBlur(1))
+
+    output = io.BytesIO()
+    img.save(output, format=fmt)
+    return output.getvalue()
+
+
+def measure(fn, data: bytes, max_size_kb: int, rounds: int):
+    """返回 (平均 CPU 秒数, 输出字节数, 输出尺寸)"""
+    result = b""
+    start = time.process_time()
+    for _ in range(rounds):
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = fn(data, max_size_kb=max_size_kb)
+    elapsed = (time.process_time() - start) / rounds
+    size = Image.open(io.BytesIO(result)).size
+    return elapsed, len(result), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图片压缩性能基准")
+    parser.add_argument("--image", action="append", help="测试图片路径（可多次指定，默认使用生成的测试图）")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[50, 200], help="目标大小（KB）")
+    parser.add_argument("--rounds", type=int, default=2, help="每项重复次数")
+    args = parser.parse_args()
+
+    samples = []
+    if args.image:
+        for path in args.image:
+            with open(path, "rb") as f:
+                samples.append((os.path.basename(path), f.read()))
+    else:
+        samples.append(("generated-3072x4096.png", make_sample_image(fmt='PNG')))
+        samples.append(("generated-3072x4096.jpg", make_sample_image(fmt='JPEG')))
+
+    print(f"{'图片':<28}{'目标':>8}{'旧版CPU':>10}{'新版CPU':>10}{'加速':>8}{'旧版大小':>12}{'新版大小':>12}  新版尺寸")
+    for name, data in samples:
+        for max_size_kb in args.sizes:
+            old_time, old_bytes, _ = measure(legacy_compress_image, data, max_size_kb, args.rounds)
+            new_time, new_bytes, new_dim = measure(compress_image, data, max_size_kb, args.rounds)
+            within = "✅" if new_bytes <= max_size_kb * 1024 else "❌"
+            print(
+                f"{name:<28}{max_size_kb:>6}KB"
+                f"{old_time:>9.2f}s{new_time:>9.2f}s{old_time / max(new_time, 1e-6):>7.1f}x"
+                f"{old_bytes / 1024:>10.1f}KB{new_bytes / 1024:>10.1f}KB  {new_dim[0]}x{new_dim[1]} {within}"
+            )
+
+
+if __name__ == "__main__":
+    main()
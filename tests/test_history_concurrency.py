@@ -0,0 +1,221 @@
+"""
+历史记录并发写入压力测试
+
+覆盖多线程、多进程同时创建和更新记录时：
+- 索引不丢失条目和状态更新
+- 记录文件和索引始终是完整的 JSON
+- 进度类更新被合并为少量磁盘写入
+"""
+import os
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.services import history as history_module
+from backend.services.history import HistoryService, RecordStatus
+
+
+WRITER_THREADS = 200
+PROCESS_COUNT = 4
+RECORDS_PER_PROCESS = 25
+
+
+def _load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _assert_store_consistent(history_dir):
+    """索引和所有记录文件都能完整解析，且索引与记录文件一一对应"""
+    index = _load_json(os.path.join(history_dir, "index.json"))
+    index_ids = [r["id"] for r in index["records"]]
+    assert len(index_ids) == len(set(index_ids))
+
+    record_ids = set()
+    for filename in os.listdir(history_dir):
+        if filename.endswith(".json") and filename != "index.json":
+            record = _load_json(os.path.join(history_dir, filename))
+            record_ids.add(record["id"])
+    assert set(index_ids) == record_ids
+
+    leftovers = [name for name in os.listdir(history_dir) if name.endswith(".tmp")]
+    assert leftovers == []
+    return index
+
+
+def _process_writer(history_dir, worker_id):
+    """子进程：创建记录并逐条标记完成"""
+    service = HistoryService(history_dir=history_dir)
+    for i in range(RECORDS_PER_PROCESS):
+        record_id = service.create_record(
+            f"进程{worker_id}-记录{i}", {"pages": [{"index": 0}]}, f"task_{worker_id}_{i}"
+        )
+        service.update_record(record_id, status=RecordStatus.COMPLETED, thumbnail="0.png")
+    service.flush()
+
+
+class TestHistoryConcurrency:
+    """历史记录并发写入"""
+
+    def test_concurrent_creates_and_updates_lose_nothing(self, temp_history_dir, sample_outline):
+        """数百个线程同时创建并更新记录，索引中的条目和状态都不丢失"""
+        service = HistoryService(history_dir=temp_history_dir)
+
+        def writer(i):
+            record_id = service.create_record(f"记录{i}", sample_outline, f"task_{i}")
+            service.update_record(
+                record_id,
+                images={"task_id": f"task_{i}", "generated": ["0.png"]},
+                status=RecordStatus.COMPLETED,
+                thumbnail="0.png"
+            )
+            return record_id
+
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            record_ids = list(pool.map(writer, range(WRITER_THREADS)))
+
+        index = _assert_store_consistent(temp_history_dir)
+        assert len(index["records"]) == WRITER_THREADS
+        assert {r["id"] for r in index["records"]} == set(record_ids)
+        assert all(r["status"] == RecordStatus.COMPLETED for r in index["records"])
+        assert all(r["thumbnail"] == "0.png" for r in index["records"])
+        assert service.get_statistics()["by_status"] == {RecordStatus.COMPLETED: WRITER_THREADS}
+
+    def test_concurrent_partial_updates_on_same_record_merge(self, temp_history_dir, sample_outline):
+        """多个标签页同时更新同一条记录的不同字段，所有字段都保留"""
+        service = HistoryService(history_dir=temp_history_dir)
+        record_id = service.create_record("同一条记录", sample_outline)
+        barrier = threading.Barrier(3)
+
+        def set_content():
+            barrier.wait()
+            service.update_record(record_id, content={"titles": ["标题"], "copywriting": "正文", "tags": []})
+
+        def set_thumbnail():
+            barrier.wait()
+            service.update_record(record_id, thumbnail="1.png", status=RecordStatus.PARTIAL)
+
+        def set_images():
+            barrier.wait()
+            service.update_record(record_id, images={"task_id": "task_x", "generated": ["1.png"]},
+                                  status=RecordStatus.PARTIAL)
+
+        threads = [threading.Thread(target=fn) for fn in (set_content, set_thumbnail, set_images)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        record = _load_json(os.path.join(temp_history_dir, f"{record_id}.json"))
+        assert record["content"]["titles"] == ["标题"]
+        assert record["thumbnail"] == "1.png"
+        assert record["images"]["task_id"] == "task_x"
+        _assert_store_consistent(temp_history_dir)
+
+    def test_multiple_processes_share_index(self, temp_history_dir):
+        """多个 worker 进程同时写入同一目录，索引包含所有进程的记录"""
+        ctx = multiprocessing.get_context("spawn")
+        processes = [
+            ctx.Process(target=_process_writer, args=(temp_history_dir, worker_id))
+            for worker_id in range(PROCESS_COUNT)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join(timeout=120)
+            assert p.exitcode == 0
+
+        index = _assert_store_consistent(temp_history_dir)
+        assert len(index["records"]) == PROCESS_COUNT * RECORDS_PER_PROCESS
+        assert all(r["status"] == RecordStatus.COMPLETED for r in index["records"])
+
+    def test_progress_updates_are_coalesced(self, temp_history_dir, sample_outline, monkeypatch):
+        """生成中的进度更新合并为一次写入，读取时仍能看到最新数据"""
+        monkeypatch.setenv("HISTORY_FLUSH_INTERVAL", "60")
+        service = HistoryService(history_dir=temp_history_dir)
+        record_ids = [service.create_record(f"记录{i}", sample_outline) for i in range(5)]
+
+        writes = []
+        original_write = history_module.atomic_write_json
+
+        def counting_write(path, data, indent=None):
+            writes.append(os.path.basename(path))
+            original_write(path, data, indent=indent)
+
+        monkeypatch.setattr(history_module, "atomic_write_json", counting_write)
+
+        def progress(record_id):
+            for n in range(1, 41):
+                generated = [f"{i}.png" for i in range(n)]
+                service.update_record(
+                    record_id,
+                    images={"task_id": "task_p", "generated": generated},
+                    status=RecordStatus.GENERATING
+                )
+
+        with ThreadPoolExecutor(max_workers=len(record_ids)) as pool:
+            list(pool.map(progress, record_ids))
+
+        # 尚未写盘，但读取能看到合并后的最新状态
+        assert writes == []
+        record = service.get_record(record_ids[0])
+        assert record["status"] == RecordStatus.GENERATING
+        assert len(record["images"]["generated"]) == 40
+
+        # 200 次更新 -> 每条记录一次写入 + 一次索引写入
+        assert service.flush() == len(record_ids)
+        assert sorted(writes) == sorted([f"{rid}.json" for rid in record_ids] + ["index.json"])
+
+        on_disk = _load_json(os.path.join(temp_history_dir, f"{record_ids[0]}.json"))
+        assert len(on_disk["images"]["generated"]) == 40
+        index = _assert_store_consistent(temp_history_dir)
+        assert all(r["status"] == RecordStatus.GENERATING for r in index["records"])
+
+    def test_final_status_flushes_pending_progress(self, temp_history_dir, sample_outline, monkeypatch):
+        """完成状态的更新立即写入，并带上之前合并在内存中的进度"""
+        monkeypatch.setenv("HISTORY_FLUSH_INTERVAL", "60")
+        service = HistoryService(history_dir=temp_history_dir)
+        record_id = service.create_record("记录", sample_outline)
+
+        service.update_record(record_id, images={"task_id": "task_f", "generated": ["0.png"]},
+                              status=RecordStatus.GENERATING)
+        service.update_record(record_id, status=RecordStatus.COMPLETED, thumbnail="0.png")
+
+        record = _load_json(os.path.join(temp_history_dir, f"{record_id}.json"))
+        assert record["status"] == RecordStatus.COMPLETED
+        assert record["images"]["generated"] == ["0.png"]
+        assert service.flush() == 0
+
+    def test_outline_and_content_edits_are_written_immediately(self, temp_history_dir, sample_outline, monkeypatch):
+        """大纲和文案的编辑不走延迟写入，返回时已经落盘，其他进程立即可见"""
+        monkeypatch.setenv("HISTORY_FLUSH_INTERVAL", "60")
+        service = HistoryService(history_dir=temp_history_dir)
+        record_id = service.create_record("记录", sample_outline)
+
+        edited_outline = {"raw": "新大纲", "pages": [{"index": 0, "type": "cover", "content": "新封面"}]}
+        assert service.update_record(record_id, outline=edited_outline)
+        assert service.update_record(record_id, content={"titles": ["标题"], "copywriting": "正文", "tags": []})
+
+        record = _load_json(os.path.join(temp_history_dir, f"{record_id}.json"))
+        assert record["outline"] == edited_outline
+        assert record["content"]["copywriting"] == "正文"
+        assert HistoryService(history_dir=temp_history_dir).get_record(record_id)["outline"] == edited_outline
+        assert service.flush() == 0
+
+    def test_corrupted_index_is_rebuilt_not_emptied(self, temp_history_dir, sample_outline):
+        """索引损坏时从记录文件重建，而不是被当成空索引覆盖"""
+        service = HistoryService(history_dir=temp_history_dir)
+        record_ids = {service.create_record(f"记录{i}", sample_outline) for i in range(3)}
+
+        with open(os.path.join(temp_history_dir, "index.json"), "w", encoding="utf-8") as f:
+            f.write('{"records": [')
+
+        assert service.get_statistics()["total"] == 3
+        service.create_record("新记录", sample_outline)
+
+        index = _assert_store_consistent(temp_history_dir)
+        assert record_ids < {r["id"] for r in index["records"]}
+        assert len(index["records"]) == 4
@@ -0,0 +1,94 @@
+"""
+历史记录游标分页与条件请求测试
+
+覆盖：
+- 大量记录的 updated_at 相同时，游标分页不重复、不遗漏（JSON 与 SQLite 两种存储）
+- 列表和详情接口在 If-None-Match 与当前版本一致时返回 304
+"""
+from datetime import datetime
+
+import pytest
+
+from backend.services import history as history_module
+from backend.services.history import HistoryService
+from backend.services.history_sqlite import SqliteHistoryService
+
+
+class _FrozenDatetime(datetime):
+    """所有记录使用同一个时间戳"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls(2025, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def service(request, temp_history_dir):
+    if request.param == "sqlite":
+        return SqliteHistoryService(history_dir=temp_history_dir)
+    return HistoryService(history_dir=temp_history_dir)
+
+
+class TestCursorPagination:
+    """游标（keyset）分页"""
+
+    def test_equal_updated_at_has_no_duplicates_or_gaps(self, service, sample_outline, monkeypatch):
+        """updated_at 完全相同的记录按 id 区分先后，逐页读取恰好覆盖全部记录"""
+        monkeypatch.setattr(history_module, "datetime", _FrozenDatetime)
+        record_ids = {service.create_record(f"记录{i}", sample_outline) for i in range(11)}
+
+        seen = []
+        cursor = None
+        for _ in range(len(record_ids)):
+            page = service.list_records_after(cursor, page_size=3)
+            seen.extend(r["id"] for r in page["records"])
+            assert all(r["updated_at"] == "2025-01-01T12:00:00" for r in page["records"])
+            cursor = page["next_cursor"]
+            if not page["has_more"]:
+                break
+
+        assert cursor is None
+        assert len(seen) == len(set(seen))
+        assert set(seen) == record_ids
+
+
+class TestConditionalGet:
+    """ETag 条件请求"""
+
+    @pytest.fixture
+    def client_with_history(self, client, temp_history_dir, sample_outline, monkeypatch):
+        service = HistoryService(history_dir=temp_history_dir)
+        monkeypatch.setattr(history_module, "_service_instance", service)
+        record_id = service.create_record("记录", sample_outline)
+        return client, service, record_id
+
+    def test_list_returns_304_for_matching_etag(self, client_with_history, sample_outline):
+        """列表未变化时返回 304，新建记录后 ETag 失效"""
+        client, service, _ = client_with_history
+
+        first = client.get('/api/history?page=1')
+        assert first.status_code == 200
+        etag = first.headers['ETag']
+
+        cached = client.get('/api/history?page=1', headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+        assert cached.headers['ETag'] == etag
+
+        service.create_record("新记录", sample_outline)
+        changed = client.get('/api/history?page=1', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+
+    def test_detail_returns_304_for_matching_etag(self, client_with_history):
+        """记录未修改时详情接口返回 304，更新后 ETag 失效"""
+        client, service, record_id = client_with_history
+
+        first = client.get(f'/api/history/{record_id}')
+        assert first.status_code == 200
+        etag = first.headers['ETag']
+
+        cached = client.get(f'/api/history/{record_id}', headers={'If-None-Match': etag})
+        assert cached.status_code == 304
+
+        service.update_record(record_id, content={"titles": ["标题"], "copywriting": "正文", "tags": []})
+        changed = client.get(f'/api/history/{record_id}', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
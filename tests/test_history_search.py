@@ -0,0 +1,69 @@
+"""
+历史记录全文搜索索引测试
+
+覆盖分词与匹配规则：
+- 中文按相邻双字做 AND 匹配
+- 英文单词按前缀匹配
+- 只有符号的查询无法分词
+- 并发对齐时读到的旧版本记录不会覆盖新版本
+"""
+from backend.services.history_search import HistorySearchIndex
+
+
+def _record(record_id, title, updated_at="2025-01-01T00:00:00", **fields):
+    return {"id": record_id, "title": title, "updated_at": updated_at, **fields}
+
+
+def _ids(results):
+    return [record_id for record_id, _ in results]
+
+
+class TestHistorySearchIndex:
+    """倒排索引"""
+
+    def test_cjk_bigrams_must_all_match(self):
+        """中文查询拆成双字后全部命中才返回，只含其中部分双字的记录不返回"""
+        index = HistorySearchIndex()
+        index.index_record(_record("a", "秋季穿搭指南"))
+        index.index_record(_record("b", "秋季旅行攻略"))
+        index.index_record(_record("c", "冬季穿搭"))
+
+        assert _ids(index.search("秋季穿搭")) == ["a"]
+        assert set(_ids(index.search("秋季"))) == {"a", "b"}
+        assert set(_ids(index.search("穿搭"))) == {"a", "c"}
+        # 两个字都出现但不相邻，双字不匹配
+        assert index.search("秋穿") == []
+
+    def test_english_words_match_by_prefix(self):
+        """英文单词按前缀匹配，不区分大小写"""
+        index = HistorySearchIndex()
+        index.index_record(_record("a", "Python Tutorial"))
+        index.index_record(_record("b", "Pythonic tips", content={"tags": ["coding"]}))
+        index.index_record(_record("c", "Java basics"))
+
+        assert set(_ids(index.search("pyth"))) == {"a", "b"}
+        assert _ids(index.search("PYTHON tut")) == ["a"]
+        assert _ids(index.search("cod")) == ["b"]
+        assert index.search("tutorials") == []
+
+    def test_symbol_only_query_returns_none(self):
+        """只有符号的关键词无法分词，返回 None 由调用方回退到普通列表"""
+        index = HistorySearchIndex()
+        index.index_record(_record("a", "秋季穿搭"))
+
+        assert index.search("!!! ---") is None
+        assert index.search("") is None
+
+    def test_stale_version_is_ignored(self):
+        """比已索引版本旧的记录不会覆盖索引"""
+        index = HistorySearchIndex()
+        index.index_record(_record("a", "新标题", updated_at="2025-01-02T00:00:00"))
+        index.index_record(_record("a", "旧标题", updated_at="2025-01-01T00:00:00"))
+
+        assert _ids(index.search("新标题")) == ["a"]
+        assert index.search("旧标题") == []
+
+        # 同一条记录的新版本正常替换
+        index.index_record(_record("a", "夏日清单", updated_at="2025-01-03T00:00:00"))
+        assert _ids(index.search("夏日")) == ["a"]
+        assert index.search("新标题") == []
@@ -0,0 +1,93 @@
+"""
+文本生成缓存的流式请求合并测试
+
+覆盖：
+- 同时进行中的相同流式请求只调用一次服务商，所有请求得到相同的完整输出
+- 某个请求中途断开不影响其他请求；服务商失败时所有请求都收到异常
+- 校验失败的结果不写入缓存
+"""
+import threading
+import time
+
+import pytest
+
+from backend.utils.text_cache import TextResponseCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return TextResponseCache(str(tmp_path), max_bytes=1024 * 1024)
+
+
+def _slow_stream(calls, chunks=("大纲", "第一页", "第二页"), delay=0.05):
+    def generate_stream():
+        calls.append(threading.current_thread().name)
+        for chunk in chunks:
+            time.sleep(delay)
+            yield chunk
+    return generate_stream
+
+
+class TestStreamSingleFlight:
+    """流式请求合并"""
+
+    def test_concurrent_identical_streams_call_provider_once(self, cache):
+        """领头请求实时输出，跟随者回放同一份输出，之后的请求命中缓存"""
+        calls = []
+        results = [None] * 5
+        barrier = threading.Barrier(len(results))
+
+        def consume(i):
+            barrier.wait()
+            results[i] = "".join(cache.stream_or_generate("key", _slow_stream(calls)))
+
+        threads = [threading.Thread(target=consume, args=(i,)) for i in range(len(results))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == ["大纲第一页第二页"] * len(results)
+        assert cache.stats()["shared"] == len(results) - 1
+        assert cache.stats()["in_flight"] == 0
+
+        assert list(cache.stream_or_generate("key", _slow_stream(calls))) == ["大纲第一页第二页"]
+        assert len(calls) == 1
+
+    def test_disconnected_request_does_not_break_others(self, cache):
+        """先到的请求中途断开，其他请求仍收到完整输出，结果照常写入缓存"""
+        calls = []
+        first = cache.stream_or_generate("key", _slow_stream(calls))
+        assert next(first) == "大纲"
+
+        second = cache.stream_or_generate("key", _slow_stream(calls))
+        assert next(second) == "大纲"
+        first.close()
+
+        assert "大纲" + "".join(second) == "大纲第一页第二页"
+        assert len(calls) == 1
+        assert cache.get("key") == "大纲第一页第二页"
+
+    def test_provider_error_reaches_every_request(self, cache):
+        """服务商调用失败时所有请求都收到异常，结果不写入缓存"""
+        def failing_stream():
+            time.sleep(0.05)
+            raise RuntimeError("429 rate limited")
+            yield  # pragma: no cover
+
+        streams = [cache.stream_or_generate("key", failing_stream) for _ in range(3)]
+        for stream in streams:
+            with pytest.raises(RuntimeError, match="429"):
+                list(stream)
+        assert cache.get("key") is None
+
+    def test_invalid_result_is_not_cached(self, cache):
+        """校验失败的结果照常输出，但不写入缓存"""
+        calls = []
+
+        def validate(text):
+            raise ValueError("无法解析")
+
+        assert "".join(cache.stream_or_generate("key", _slow_stream(calls, delay=0), validate=validate)) == "大纲第一页第二页"
+        assert cache.get("key") is None